@@ -1,22 +1,44 @@
 import logging
+import numpy as np
 import requests
 import pandas as pd
 from typing import Optional
 
+from cow_swap.apis.decoding import decode_pairs, enable_compression
+from cow_swap.price_sources.base import PriceSource
+from cow_swap.schema import PRICE_SCHEMA, apply_schema
 
-class CoinGeckoClient:
+
+class CoinGeckoClient(PriceSource):
     """
     A client for interacting with the CoinGecko API to fetch historical price data.
 
     Attributes:
         base_url (str): The base URL for the CoinGecko API.
+        session (requests.Session): The HTTP session whose connection pool is reused across requests and threads.
+            It requests compressed responses.
+        timeout (float): The timeout of each request, in seconds.
     """
 
-    def __init__(self) -> None:
+    name = "coingecko"
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        base_url: str = "https://api.coingecko.com/api/v3",
+        timeout: float = 30.0,
+    ) -> None:
         """
         Initializes the CoinGeckoClient with the base URL for the CoinGecko API.
+
+        Args:
+            session (Optional[requests.Session]): A shared HTTP session. A new session is created if None.
+            base_url (str): The base URL of the API, or of a mirror serving the same routes.
+            timeout (float): The timeout of each request, in seconds. Default is 30.
         """
-        self.base_url = "https://api.coingecko.com/api/v3"
+        self.base_url = base_url
+        self.session = enable_compression(session or requests.Session())
+        self.timeout = timeout
 
     def get_historical_prices(
         self,
@@ -38,15 +60,13 @@ class CoinGeckoClient:
             Optional[pd.DataFrame]: A DataFrame containing the historical prices with columns 'block_timestamp' and 'price'.
             Returns None if there is an error or if the token combination is unsupported.
         """
-        if buy_token.lower() == "weth" or sell_token.lower() == "weth":
-            vs_currency, coin_id = "usd", "ethereum"
-        elif buy_token.lower() == "usdc" or sell_token.lower() == "usdc":
-            vs_currency, coin_id = "usd", "usd"
-        else:
+        coin = self.resolve_coin(sell_token, buy_token)
+        if coin is None:
             logging.error(
                 f"Unsupported token combination: sell_token={sell_token}, buy_token={buy_token}. Only WETH and USDC are supported."
             )
             return None
+        vs_currency, coin_id = coin
 
         url = f"{self.base_url}/coins/{coin_id}/market_chart/range"
         params = {
@@ -56,18 +76,21 @@ class CoinGeckoClient:
         }
 
         try:
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             logging.info(f"API request URL: {response.url}")
             logging.info(f"Status Code: {response.status_code}")
 
             if response.status_code == 200:
-                data = response.json()
-                prices = data.get("prices", [])
-                if prices:
-                    df = pd.DataFrame(prices, columns=["block_timestamp", "price"])
-                    df["block_timestamp"] = (df["block_timestamp"] / 1000).astype(int)
-                    df["price"] = df["price"].apply(lambda x: round(x, 8))
-                    return df
+                # the [ms, price] pairs go straight from the body to two arrays
+                timestamps, prices = decode_pairs(response.content, "prices")
+                if len(prices):
+                    df = pd.DataFrame(
+                        {
+                            "block_timestamp": timestamps.astype(np.int64) // 1000,
+                            "price": prices.round(8),
+                        }
+                    )
+                    return apply_schema(df, PRICE_SCHEMA)
                 else:
                     logging.warning("No price data found.")
                     return None
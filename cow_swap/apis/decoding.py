@@ -0,0 +1,84 @@
+import json
+import logging
+import warnings
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import requests
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+try:
+    # optional, several times faster than the standard library on large payloads
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover
+    loads = json.loads
+
+# what requests can decode: gzip and deflate, plus br when a brotli package is installed
+ACCEPT_ENCODING = DEFAULT_ACCEPT_ENCODING
+
+
+def enable_compression(session: requests.Session) -> requests.Session:
+    """
+    Makes a session request every compressed transfer encoding it can decode.
+
+    Args:
+        session (requests.Session): The session to configure.
+
+    Returns:
+        requests.Session: The same session.
+    """
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return session
+
+
+def _scan_pairs(payload: bytes, key: str) -> Optional[np.ndarray]:
+    start = payload.find(f'"{key}"'.encode())
+    if start < 0:
+        return None
+    opening = payload.find(b"[", start)
+    if opening < 0 or payload[start + len(key) + 2 : opening].strip() != b":":
+        return None
+    closing = payload.find(b"]", opening + 1)
+    if payload[opening + 1 : closing].strip() == b"":
+        return np.empty((0, 2))
+    # the inner pairs hold no bracket, so the first ']]' closes the whole array
+    closing = payload.find(b"]]", opening)
+    if closing < 0:
+        return None
+    body = payload[opening + 1 : closing + 1].translate(None, b"[]")
+    expected = body.count(b",") + 1
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            values = np.fromstring(body, sep=",")
+    except (ValueError, DeprecationWarning):
+        # null values, nested objects or anything else than plain numbers
+        return None
+    if len(values) != expected or expected % 2:
+        return None
+    return values.reshape(-1, 2)
+
+
+def decode_pairs(payload: bytes, key: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes a top-level array of [x, y] number pairs from a JSON payload into two NumPy arrays.
+
+    The numbers are parsed straight from the bytes of the array, without building a Python object
+    per value. Payloads the scan does not recognise are decoded with the JSON parser instead.
+
+    Args:
+        payload (bytes): The raw JSON body, such as a CoinGecko market chart.
+        key (str): The key of the array, e.g. 'prices'.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The first and second members of the pairs, as float64, empty if the
+        key is missing.
+    """
+    pairs = _scan_pairs(payload, key)
+    if pairs is None:
+        logging.debug(f"Decoding '{key}' with the JSON parser.")
+        document: Any = loads(payload)
+        pairs = np.asarray(document.get(key) or [], dtype=np.float64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
@@ -0,0 +1,100 @@
+import logging
+import math
+import requests
+import pandas as pd
+from typing import Optional
+
+from cow_swap.apis.decoding import enable_compression, loads
+from cow_swap.price_sources.base import PriceSource
+from cow_swap.schema import PRICE_SCHEMA, apply_schema
+
+
+class DefiLlamaClient(PriceSource):
+    """
+    A client for the DefiLlama coins API, an independent source of historical prices keyed by CoinGecko IDs.
+
+    Attributes:
+        base_url (str): The base URL for the DefiLlama coins API.
+        session (requests.Session): The HTTP session whose connection pool is reused across requests and threads.
+        timeout (float): The timeout of each request, in seconds.
+        period_seconds (int): The spacing of the returned price points, in seconds.
+    """
+
+    name = "defillama"
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        base_url: str = "https://coins.llama.fi",
+        timeout: float = 30.0,
+        period_seconds: int = 300,
+    ) -> None:
+        """
+        Initializes the DefiLlamaClient.
+
+        Args:
+            session (Optional[requests.Session]): A shared HTTP session. A new session is created if None.
+            base_url (str): The base URL of the API, or of a local stand-in serving the same routes.
+            timeout (float): The timeout of each request, in seconds. Default is 30.
+            period_seconds (int): The spacing of the returned price points, in seconds. Default is 300.
+        """
+        self.base_url = base_url
+        self.session = enable_compression(session or requests.Session())
+        self.timeout = timeout
+        self.period_seconds = period_seconds
+
+    def get_historical_prices(
+        self,
+        min_block_time: float,
+        max_block_time: float,
+        sell_token: str = "weth",
+        buy_token: str = "usdc",
+    ) -> Optional[pd.DataFrame]:
+        """
+        Fetches historical USD prices for a specified token pair over a given time range from DefiLlama.
+
+        Args:
+            min_block_time (float): The start of the time range, in UNIX timestamp format (seconds since epoch).
+            max_block_time (float): The end of the time range, in UNIX timestamp format (seconds since epoch).
+            sell_token (str): The symbol of the sell token. Default is 'weth'.
+            buy_token (str): The symbol of the buy token. Default is 'usdc'.
+
+        Returns:
+            Optional[pd.DataFrame]: A DataFrame containing the historical prices with columns 'block_timestamp' and 'price'.
+            Returns None if there is an error or if the token combination is unsupported.
+        """
+        coin = self.resolve_coin(sell_token, buy_token)
+        if coin is None:
+            logging.error(
+                f"Unsupported token combination: sell_token={sell_token}, buy_token={buy_token}."
+            )
+            return None
+        key = f"coingecko:{coin[1]}"
+
+        url = f"{self.base_url}/chart/{key}"
+        params = {
+            "start": int(min_block_time),
+            "span": math.floor((max_block_time - min_block_time) / self.period_seconds)
+            + 1,
+            "period": f"{self.period_seconds // 60}m",
+        }
+
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code != 200:
+                logging.error(f"Failed to fetch data: {response.status_code}")
+                return None
+            prices = (
+                loads(response.content).get("coins", {}).get(key, {}).get("prices", [])
+            )
+            if not prices:
+                logging.warning("No price data found.")
+                return None
+            df = pd.DataFrame(prices, columns=["timestamp", "price"]).rename(
+                columns={"timestamp": "block_timestamp"}
+            )
+            df["price"] = df["price"].round(8)
+            return apply_schema(df, PRICE_SCHEMA)
+        except Exception as e:
+            logging.error(f"Error fetching price data: {e}")
+            return None
@@ -1,8 +1,65 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
 import logging
+from datetime import datetime
 from dune_client.client import DuneClient
-from cow_swap.utils import convert_to_unix_timestamp
-from typing import Optional, Tuple
+from dune_client.query import QueryBase
+from dune_client.types import QueryParameter
+from cow_swap.apis.decoding import enable_compression
+from cow_swap.digests import digest_frame
+from cow_swap.schema import apply_schema, fetched_trade_schema
+from cow_swap.utils import convert_to_unix_timestamps
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# the columns of the Dune query the pipeline stores, requested explicitly to drop any other column at the source
+TRADE_QUERY_COLUMNS = [
+    "block_time",
+    "block_number",
+    "tx_hash",
+    "evt_index",
+    "sell_token_address",
+    "sell_token",
+    "buy_token",
+    "token_pair",
+    "buy_price",
+    "sell_price",
+    "units_sold",
+]
+
+# read as text from CSV results, whatever they look like (hex hashes would otherwise be parsed as numbers)
+TEXT_COLUMNS = ["block_time", "tx_hash", "sell_token_address"]
+
+# the columns of a digest query, see Reconciler; sums of 60-bit hashes overflow bigint, so key_hash is text
+DIGEST_QUERY_COLUMNS = ["hour_start", "trade_count", "key_hash"]
+
+
+def build_query_parameters(parameters: Dict[str, Any]) -> List[QueryParameter]:
+    """
+    Converts plain values into Dune query parameters.
+
+    Datetimes become date parameters, numbers become number parameters, sequences become a comma-separated
+    text parameter (split again in the query) and anything else becomes a text parameter.
+
+    Args:
+        parameters (Dict[str, Any]): The parameter values, keyed by their name in the query.
+
+    Returns:
+        List[QueryParameter]: The Dune query parameters.
+    """
+    query_parameters = []
+    for name, value in parameters.items():
+        if isinstance(value, datetime):
+            query_parameters.append(QueryParameter.date_type(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            query_parameters.append(QueryParameter.number_type(name, value))
+        elif isinstance(value, (list, tuple)):
+            query_parameters.append(
+                QueryParameter.text_type(name, ",".join(map(str, value)))
+            )
+        else:
+            query_parameters.append(QueryParameter.text_type(name, str(value)))
+    return query_parameters
 
 
 class DuneDataFetcher:
@@ -11,43 +68,141 @@ class DuneDataFetcher:
 
     Attributes:
         dune (DuneClient): An instance of the DuneClient to interact with the Dune Analytics API.
+        columnar (bool): Whether results are downloaded as CSV and parsed column by column.
     """
 
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, columnar: bool = False) -> None:
         """
         Initializes the DuneDataFetcher with an API key.
 
         Args:
             api_key (str): The API key to authenticate with the Dune Analytics API.
+            columnar (bool): Whether to download results as CSV and parse them straight into columns with
+                pyarrow, instead of decoding JSON into one dictionary per row. Default is False.
         """
         self.dune = DuneClient(api_key)
+        enable_compression(self.dune.http)
+        self.columnar = columnar
+
+    def _fetch_rows(
+        self,
+        query_id: int,
+        parameters: Optional[Dict[str, Any]],
+        columns: Optional[List[str]],
+    ) -> Optional[pd.DataFrame]:
+        if parameters is None:
+            query_result = self.dune.get_latest_result(query_id, columns=columns)
+        else:
+            query = QueryBase(
+                query_id=query_id, params=build_query_parameters(parameters)
+            )
+            logging.info(f"Running Dune query {query_id} with {query.parameters()}.")
+            query_result = self.dune.run_query(query, columns=columns)
+        if not (query_result.result and query_result.result.rows):
+            return None
+        return pd.DataFrame(query_result.result.rows)
+
+    def _fetch_columns(
+        self,
+        query_id: int,
+        parameters: Optional[Dict[str, Any]],
+        columns: Optional[List[str]],
+        text_columns: Sequence[str] = TEXT_COLUMNS,
+    ) -> Optional[pd.DataFrame]:
+        if parameters is None:
+            csv_result = self.dune.download_csv(query_id, columns=columns)
+        else:
+            query = QueryBase(
+                query_id=query_id, params=build_query_parameters(parameters)
+            )
+            logging.info(f"Running Dune query {query_id} with {query.parameters()}.")
+            csv_result = self.dune.run_query_csv(query, columns=columns)
+        table = pv.read_csv(
+            csv_result.data,
+            convert_options=pv.ConvertOptions(
+                column_types={column: pa.string() for column in text_columns}
+            ),
+        )
+        if table.num_rows == 0:
+            return None
+        return table.to_pandas()
+
+    def get_trade_digests(
+        self, query_id: int, parameters: Dict[str, Any]
+    ) -> pd.DataFrame:
+        """
+        Runs a digest query, which returns the hourly trade counts and key hash sums of a time window.
+
+        Args:
+            query_id (int): The ID of the digest query.
+            parameters (Dict[str, Any]): The query parameters, as built by trade_query_parameters.
+
+        Returns:
+            pd.DataFrame: The digests, as built by digests.digest_frame, empty if the window holds no trade.
+        """
+        if self.columnar:
+            df = self._fetch_columns(
+                query_id, parameters, DIGEST_QUERY_COLUMNS, DIGEST_QUERY_COLUMNS
+            )
+        else:
+            df = self._fetch_rows(query_id, parameters, DIGEST_QUERY_COLUMNS)
+        if df is None:
+            return digest_frame([])
+        return digest_frame(
+            (int(hour), int(count), int(total))
+            for hour, count, total in zip(
+                df["hour_start"], df["trade_count"], df["key_hash"]
+            )
+        )
 
     def get_query_results_as_dataframe(
-        self, query_id: int
+        self,
+        query_id: int,
+        parameters: Optional[Dict[str, Any]] = None,
+        columns: Optional[Sequence[str]] = None,
     ) -> Tuple[Optional[pd.DataFrame], Optional[Tuple[int, int]]]:
         """
-        Fetches the latest results of a specified query from Dune Analytics and converts them into a DataFrame.
+        Fetches the results of a specified query from Dune Analytics and converts them into a DataFrame.
+
+        Without parameters, the latest stored results of the query are read. With parameters, the query is
+        executed with them, so that filters such as the token pair and time window are applied by Dune
+        and only the matching rows are downloaded. Responses are transferred compressed, and in columnar
+        mode they are parsed as CSV into column arrays, without a Python object per row.
 
         Args:
             query_id (int): The ID of the query to fetch results for.
+            parameters (Optional[Dict[str, Any]]): The query parameters, converted by build_query_parameters.
+            columns (Optional[Sequence[str]]): The columns to download. Every column of the query if None.
 
         Returns:
             Tuple[Optional[pd.DataFrame], Optional[Tuple[int, int]]]:
-                - A DataFrame containing the query results with an added 'block_timestamp' column in UNIX format.
+                - A DataFrame containing the query results with an added 'block_timestamp' column in UNIX format,
+                  cast to the TRADE_SCHEMA dtypes. Rows whose block_time cannot be parsed are kept with a
+                  null block_timestamp, see FETCHED_TRADE_SCHEMA, for the validation gate to reject and quarantine.
                 - A tuple containing the minimum and maximum block timestamps in UNIX format.
                 - Returns (None, None) if no results are found or if the query is still running.
         """
-        query_result = self.dune.get_latest_result(query_id)
-        if query_result.result and query_result.result.rows:
-            df = pd.DataFrame(query_result.result.rows)
-
+        columns = list(columns) if columns is not None else None
+        fetch = self._fetch_columns if self.columnar else self._fetch_rows
+        df = fetch(query_id, parameters, columns)
+        if df is not None:
             if df.empty or "block_time" not in df.columns:
                 logging.warning("No valid data found in query results.")
                 return None, None
 
-            df["block_timestamp"] = df["block_time"].apply(convert_to_unix_timestamp)
-            min_block_time = df["block_timestamp"].min()
-            max_block_time = df["block_timestamp"].max()
+            df["block_timestamp"] = convert_to_unix_timestamps(df["block_time"])
+            invalid = df["block_timestamp"].isna()
+            if invalid.all():
+                logging.warning("No row of the query results has a valid block_time.")
+                return None, None
+            if invalid.any():
+                logging.warning(
+                    f"{int(invalid.sum())} rows have an invalid block_time, left to validation."
+                )
+
+            df = apply_schema(df, fetched_trade_schema(df))
+            min_block_time = int(df["block_timestamp"].min())
+            max_block_time = int(df["block_timestamp"].max())
 
             return df, (min_block_time, max_block_time)
         else:
@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+
+from cow_swap.backends.base import ComputeBackend
+from cow_swap.backends.pandas_backend import PandasBackend
+from cow_swap.backends.sharded_backend import ShardedBackend
+
+
+def get_backend(
+    name: str = "pandas", options: Optional[Dict[str, Any]] = None
+) -> ComputeBackend:
+    """
+    Instantiates the compute backend selected in the configuration.
+
+    Args:
+        name (str): The backend name, 'pandas', 'polars' or 'sharded'. Default is 'pandas'.
+        options (Optional[Dict[str, Any]]): The ShardedBackend options, ignored by the other backends.
+
+    Returns:
+        ComputeBackend: The backend instance.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if name == "pandas":
+        return PandasBackend()
+    if name == "polars":
+        # imported lazily so that polars stays an optional dependency
+        from cow_swap.backends.polars_backend import PolarsBackend
+
+        return PolarsBackend()
+    if name == "sharded":
+        return ShardedBackend(**(options or {}))
+    raise ValueError(f"Unknown compute backend: {name}")
+
+
+__all__ = ["ComputeBackend", "PandasBackend", "ShardedBackend", "get_backend"]
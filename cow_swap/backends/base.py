@@ -0,0 +1,89 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+import pandas as pd
+
+
+class ComputeBackend(ABC):
+    """
+    The dataframe operations of the pipeline, implemented by interchangeable compute engines.
+
+    Every backend takes and returns pandas DataFrames, so backends can be swapped through
+    configuration without touching the callers, and must produce identical results.
+    """
+
+    name: str
+
+    @abstractmethod
+    def filter_tokens(self, df: pd.DataFrame, tokens: Sequence[str]) -> pd.DataFrame:
+        """
+        Keeps the trades whose buy and sell tokens are both in a token list.
+
+        Args:
+            df (pd.DataFrame): Trade data with 'buy_token' and 'sell_token' columns.
+            tokens (Sequence[str]): The lower-case token symbols to keep.
+
+        Returns:
+            pd.DataFrame: The matching trades.
+        """
+
+    @abstractmethod
+    def match_prices(
+        self, trades_df: pd.DataFrame, price_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Attaches to each trade the last price at or before its block timestamp.
+
+        Args:
+            trades_df (pd.DataFrame): Trade data with a 'block_timestamp' column.
+            price_df (pd.DataFrame): Price data with 'block_timestamp' and 'price' columns.
+
+        Returns:
+            pd.DataFrame: The trades sorted by block timestamp, with a 'price' column.
+        """
+
+    @abstractmethod
+    def calculate_price_improvement(self, matched_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds the 'trade_price' and 'price_improvement' columns to matched trades.
+
+        Args:
+            matched_df (pd.DataFrame): Trades with their matched 'price'.
+
+        Returns:
+            pd.DataFrame: The trades with the two additional columns.
+        """
+
+    def match_and_calculate(
+        self, trades_df: pd.DataFrame, price_df: pd.DataFrame
+    ) -> Optional[pd.DataFrame]:
+        """
+        Matches prices and calculates price improvements in one step.
+
+        Backends that split the work into partitions override it, so that each partition is matched
+        and calculated by the same worker instead of being shipped twice.
+
+        Args:
+            trades_df (pd.DataFrame): Trade data with a 'block_timestamp' column.
+            price_df (pd.DataFrame): Price data with 'block_timestamp' and 'price' columns.
+
+        Returns:
+            Optional[pd.DataFrame]: The result of calculate_price_improvement on the matched trades,
+            or None if the trades could not be matched.
+        """
+        matched_df = self.match_prices(trades_df, price_df)
+        if matched_df is None:
+            return None
+        return self.calculate_price_improvement(matched_df)
+
+    @abstractmethod
+    def average_improvement(self, df: pd.DataFrame) -> float:
+        """
+        Averages the 'price_improvement' column, ignoring missing values.
+
+        Args:
+            df (pd.DataFrame): Trades with a 'price_improvement' column.
+
+        Returns:
+            float: The average improvement, NaN if there is none.
+        """
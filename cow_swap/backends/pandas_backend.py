@@ -0,0 +1,35 @@
+from typing import Sequence
+
+import pandas as pd
+
+from cow_swap.backends.base import ComputeBackend
+from cow_swap.price_calculation import (
+    calculate_average_price_improvement,
+    calculate_price_improvement,
+    match_prices_with_trades,
+)
+
+
+class PandasBackend(ComputeBackend):
+    """
+    The reference, single-threaded backend built on the functions of price_calculation.
+    """
+
+    name = "pandas"
+
+    def filter_tokens(self, df: pd.DataFrame, tokens: Sequence[str]) -> pd.DataFrame:
+        return df[
+            (df["buy_token"].str.lower().isin(tokens))
+            & (df["sell_token"].str.lower().isin(tokens))
+        ]
+
+    def match_prices(
+        self, trades_df: pd.DataFrame, price_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        return match_prices_with_trades(trades_df, price_df)
+
+    def calculate_price_improvement(self, matched_df: pd.DataFrame) -> pd.DataFrame:
+        return calculate_price_improvement(matched_df)
+
+    def average_improvement(self, df: pd.DataFrame) -> float:
+        return calculate_average_price_improvement(df)
@@ -0,0 +1,112 @@
+import logging
+from typing import Sequence
+
+import pandas as pd
+import polars as pl
+
+from cow_swap.backends.base import ComputeBackend
+
+
+def _to_polars(df: pd.DataFrame) -> pl.DataFrame:
+    return pl.from_pandas(df)
+
+
+def _to_pandas(df: pl.DataFrame, like: pd.DataFrame) -> pd.DataFrame:
+    # restore the input dtypes (categories, string dtype) so results match the pandas backend
+    result = df.to_pandas()
+    for column, dtype in like.dtypes.items():
+        if column not in result.columns:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            # categorical dtypes compare equal whatever the category order, so always realign
+            result[column] = (
+                result[column].astype("category").cat.set_categories(dtype.categories)
+            )
+        elif result[column].dtype != dtype:
+            result[column] = result[column].astype(dtype)
+    return result
+
+
+def _lower(column: str) -> pl.Expr:
+    return pl.col(column).cast(pl.String).str.to_lowercase()
+
+
+class PolarsBackend(ComputeBackend):
+    """
+    A multi-threaded backend running the same operations on the Polars expression engine.
+    """
+
+    name = "polars"
+
+    def filter_tokens(self, df: pd.DataFrame, tokens: Sequence[str]) -> pd.DataFrame:
+        mask = (
+            _to_polars(df[["buy_token", "sell_token"]])
+            .select(
+                _lower("buy_token").is_in(list(tokens))
+                & _lower("sell_token").is_in(list(tokens))
+            )
+            .to_series()
+            .to_numpy()
+        )
+        return df[mask]
+
+    def match_prices(
+        self, trades_df: pd.DataFrame, price_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        trades = _to_polars(trades_df).with_columns(
+            pl.col("block_timestamp").cast(pl.Int64)
+        )
+        prices = _to_polars(price_df).with_columns(
+            pl.col("block_timestamp").cast(pl.Int64)
+        )
+        merged = trades.sort("block_timestamp", maintain_order=True).join_asof(
+            prices.sort("block_timestamp", maintain_order=True),
+            on="block_timestamp",
+            strategy="backward",
+        )
+        like = pd.concat(
+            [trades_df.iloc[:0], price_df.drop(columns="block_timestamp").iloc[:0]],
+            axis=1,
+        )
+        return _to_pandas(merged, like.astype({"block_timestamp": "int64"}))
+
+    def calculate_price_improvement(self, matched_df: pd.DataFrame) -> pd.DataFrame:
+        trade_price = (
+            pl.when(_lower("buy_token") == "weth")
+            .then(pl.col("buy_price"))
+            .when(_lower("sell_token") == "weth")
+            .then(pl.col("sell_price"))
+            .when(_lower("buy_token") == "usdc")
+            .then(1 / pl.col("buy_price"))
+            .when(_lower("sell_token") == "usdc")
+            .then(pl.col("sell_price"))
+            .otherwise(None)
+            .cast(pl.Float64)
+        )
+        result = (
+            _to_polars(matched_df)
+            .with_columns(trade_price.alias("trade_price"))
+            .with_columns(
+                pl.when(_lower("sell_token") == "weth")
+                .then(-(pl.col("trade_price") - pl.col("price")))
+                .otherwise(pl.col("trade_price") - pl.col("price"))
+                .cast(pl.Float64)
+                .alias("price_improvement")
+            )
+        )
+        unexpected = result["trade_price"].null_count()
+        if unexpected:
+            logging.error(f"Unexpected token combination in {unexpected} trades")
+        return _to_pandas(result, matched_df).set_axis(matched_df.index)
+
+    def average_improvement(self, df: pd.DataFrame) -> float:
+        average_improvement = (
+            _to_polars(df[["price_improvement"]])
+            .select(pl.col("price_improvement").fill_nan(None).mean())
+            .item()
+        )
+        average_improvement = (
+            float("nan") if average_improvement is None else float(average_improvement)
+        )
+        logging.info(f"Average price improvement calculated: {average_improvement}")
+        return average_improvement
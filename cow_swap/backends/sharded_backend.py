@@ -0,0 +1,167 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cow_swap.backends.pandas_backend import PandasBackend
+from cow_swap.price_calculation import calculate_price_improvement
+
+SHARD_KEYS = ("time", "token_pair")
+
+# worker-side cache of the memory-mapped price arrays of the current run, keyed by directory
+_mapped_prices: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _load_prices(directory: str) -> Tuple[np.ndarray, np.ndarray]:
+    if directory not in _mapped_prices:
+        _mapped_prices.clear()
+        _mapped_prices[directory] = (
+            np.load(os.path.join(directory, "block_timestamp.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "price.npy"), mmap_mode="r"),
+        )
+    return _mapped_prices[directory]
+
+
+def _match_shard(
+    shard_df: pd.DataFrame, timestamps: np.ndarray, prices: np.ndarray
+) -> pd.DataFrame:
+    # the backward as-of join of match_prices_with_trades, on trades already sorted by block_timestamp
+    lower, upper = np.searchsorted(
+        timestamps,
+        [shard_df["block_timestamp"].min(), shard_df["block_timestamp"].max()],
+        side="right",
+    )
+    # only the slice of the series covering the shard (plus the price before it) is paged in
+    lower = max(lower - 1, 0)
+    window_ts, window_px = timestamps[lower:upper], prices[lower:upper]
+    indices = (
+        np.searchsorted(window_ts, shard_df["block_timestamp"].to_numpy(), side="right")
+        - 1
+    )
+    matched = np.full(len(shard_df), np.nan)
+    matched[indices >= 0] = window_px[indices[indices >= 0]]
+    return shard_df.assign(price=matched)
+
+
+def _process_shard(shard_df: pd.DataFrame, prices_directory: str) -> pd.DataFrame:
+    timestamps, prices = _load_prices(prices_directory)
+    matched_df = _match_shard(shard_df.reset_index(drop=True), timestamps, prices)
+    return calculate_price_improvement(matched_df)
+
+
+class ShardedBackend(PandasBackend):
+    """
+    Runs the price matching and improvement calculations of large days on a pool of processes.
+
+    The trades are sorted by block timestamp and partitioned by time range or by token pair. The
+    price series is written once to a memory-mapped file that every worker maps, so only the
+    trades of a shard are sent to its worker. The shard results are then reduced back into a single
+    frame, in the order the pandas backend produces. Small inputs are processed in-process.
+
+    Attributes:
+        workers (int): The number of worker processes.
+        shard_by (str): 'time' for contiguous time ranges, or 'token_pair'.
+        min_shard_rows (int): The minimum number of trades per shard.
+    """
+
+    name = "sharded"
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        shard_by: str = "time",
+        min_shard_rows: int = 250_000,
+    ) -> None:
+        """
+        Initializes the ShardedBackend. The process pool is started on first use.
+
+        Args:
+            workers (Optional[int]): The number of worker processes. Defaults to the number of CPUs.
+            shard_by (str): 'time' for contiguous time ranges, or 'token_pair'. Default is 'time'.
+            min_shard_rows (int): The minimum number of trades per shard. Default is 250000.
+
+        Raises:
+            ValueError: If shard_by is unknown.
+        """
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key: {shard_by}")
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_by = shard_by
+        self.min_shard_rows = min_shard_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawned workers do not inherit the threads of the chains being ingested
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def close(self) -> None:
+        """
+        Shuts the process pool down.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _shard_positions(self, trades_df: pd.DataFrame) -> List[np.ndarray]:
+        count = min(self.workers, max(len(trades_df) // self.min_shard_rows, 1))
+        if self.shard_by == "time":
+            return np.array_split(np.arange(len(trades_df)), count)
+
+        # whole token pairs, spread over the shards from the largest pair down
+        groups = sorted(
+            trades_df.groupby("token_pair", observed=True, sort=False).indices.values(),
+            key=len,
+            reverse=True,
+        )
+        shards: List[List[np.ndarray]] = [[] for _ in range(count)]
+        sizes = np.zeros(count, dtype=np.int64)
+        for positions in groups:
+            smallest = int(sizes.argmin())
+            shards[smallest].append(positions)
+            sizes[smallest] += len(positions)
+        return [np.sort(np.concatenate(shard)) for shard in shards if shard]
+
+    def match_and_calculate(
+        self, trades_df: pd.DataFrame, price_df: pd.DataFrame
+    ) -> Optional[pd.DataFrame]:
+        trades_df = trades_df.sort_values("block_timestamp", kind="stable")
+        shards = self._shard_positions(trades_df)
+        if len(shards) < 2:
+            return super().match_and_calculate(trades_df, price_df)
+
+        prices = price_df.sort_values("block_timestamp", kind="stable")
+        with tempfile.TemporaryDirectory(prefix="cow_swap_prices_") as directory:
+            np.save(
+                os.path.join(directory, "block_timestamp.npy"),
+                prices["block_timestamp"].to_numpy(dtype=np.int64),
+            )
+            np.save(
+                os.path.join(directory, "price.npy"),
+                prices["price"].to_numpy(dtype=np.float64),
+            )
+            executor = self._get_executor()
+            futures = [
+                executor.submit(_process_shard, trades_df.iloc[positions], directory)
+                for positions in shards
+            ]
+            results = [future.result() for future in futures]
+
+        logging.info(
+            f"Processed {len(trades_df)} trades in {len(shards)} shards by {self.shard_by}."
+        )
+        matched_df = pd.concat(results, ignore_index=True)
+        if self.shard_by == "token_pair":
+            # restore the block_timestamp order of the unsharded result
+            order = np.argsort(np.concatenate(shards), kind="stable")
+            matched_df = matched_df.iloc[order].reset_index(drop=True)
+        return matched_df
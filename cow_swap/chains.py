@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+DEFAULT_CHAIN = "ethereum"
+
+DEFAULT_CURRENCIES = {"currency_1": "weth", "currency_2": "usdc"}
+
+
+def resolve_chains(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Lists the chains to ingest, each with its Dune query and the token pair its prices are fetched for.
+
+    Configurations without a 'chains' section ingest a single Ethereum chain from dune_api.query_id,
+    as before multi-chain support.
+
+    Args:
+        config (Dict[str, Any]): The loaded configuration.
+
+    Returns:
+        List[Dict[str, Any]]: One dictionary per chain with 'name', 'query_id' and 'currencies' keys.
+
+    Raises:
+        ValueError: If a chain has no query_id or two chains share a name.
+    """
+    default_currencies = {**DEFAULT_CURRENCIES, **config.get("currencies", {})}
+    entries = config.get("chains") or [
+        {"name": DEFAULT_CHAIN, "query_id": config["dune_api"]["query_id"]}
+    ]
+
+    chains = []
+    for entry in entries:
+        if entry.get("query_id") is None:
+            raise ValueError(f"Chain {entry.get('name')} has no query_id.")
+        chains.append(
+            {
+                "name": entry.get("name", DEFAULT_CHAIN),
+                "query_id": entry["query_id"],
+                "currencies": {
+                    **default_currencies,
+                    **entry.get("currencies", {}),
+                },
+            }
+        )
+
+    names = [chain["name"] for chain in chains]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate chain names in configuration: {names}.")
+    return chains
+
+
+def token_pair_name(currencies: Dict[str, str]) -> str:
+    """
+    Names a pair of currencies the way Dune fills the 'token_pair' column of trades.
+
+    Args:
+        currencies (Dict[str, str]): The 'currency_1' and 'currency_2' symbols.
+
+    Returns:
+        str: The upper-case symbols in alphabetical order, e.g. 'USDC-WETH'.
+    """
+    return "-".join(
+        sorted([currencies["currency_1"].upper(), currencies["currency_2"].upper()])
+    )
+
+
+def trade_query_parameters(
+    chain: Dict[str, Any], start_time: datetime, end_time: datetime
+) -> Dict[str, Any]:
+    """
+    Builds the parameters of a parameterised Dune trades query for a chain and a time window.
+
+    Args:
+        chain (Dict[str, Any]): The chain, as returned by resolve_chains.
+        start_time (datetime): The inclusive start of the window, in UTC.
+        end_time (datetime): The exclusive end of the window, in UTC.
+
+    Returns:
+        Dict[str, Any]: The 'token_pair' (e.g. 'USDC-WETH'), 'tokens', 'start_time' and 'end_time' parameters.
+    """
+    tokens = [
+        chain["currencies"]["currency_1"].lower(),
+        chain["currencies"]["currency_2"].lower(),
+    ]
+    return {
+        "token_pair": token_pair_name(chain["currencies"]),
+        "tokens": tokens,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+
+def hash_inputs(*inputs: Any) -> str:
+    """
+    Hashes the inputs of a stage into a stable hex digest.
+
+    Args:
+        *inputs (Any): JSON-serializable values identifying the stage inputs.
+
+    Returns:
+        str: The SHA-256 hex digest of the inputs.
+    """
+    return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    """
+    Hashes the content of a DataFrame, independently of its index.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to hash.
+
+    Returns:
+        str: The SHA-256 hex digest of the column names and row values.
+    """
+    digest = hashlib.sha256(json.dumps(list(map(str, df.columns))).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """
+    Persists the output of each Processor stage so that a retried run can resume where it failed.
+
+    A run is identified by a run key (query ID and target day). Each stage of a run is stored as a
+    Parquet file next to a JSON manifest holding the hash of the stage inputs, the content hash of
+    the output frame, and the file hash used to detect corrupted checkpoints.
+
+    Attributes:
+        directory (str): The root directory of the checkpoints.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initializes the CheckpointStore.
+
+        Args:
+            directory (str): The root directory of the checkpoints.
+        """
+        self.directory = directory
+
+    def _paths(self, run_key: str, stage: str) -> Tuple[str, str]:
+        run_directory = os.path.join(self.directory, run_key)
+        return (
+            os.path.join(run_directory, f"{stage}.parquet"),
+            os.path.join(run_directory, f"{stage}.json"),
+        )
+
+    def load(
+        self, run_key: str, stage: str, input_hash: str
+    ) -> Optional[Tuple[pd.DataFrame, Dict[str, Any], str]]:
+        """
+        Loads the checkpoint of a stage if it was produced from the same inputs.
+
+        Args:
+            run_key (str): The run the stage belongs to.
+            stage (str): The name of the stage.
+            input_hash (str): The hash of the current stage inputs.
+
+        Returns:
+            Optional[Tuple[pd.DataFrame, Dict[str, Any], str]]: The stage output, its metadata and its
+            content hash, or None if there is no valid checkpoint for these inputs.
+        """
+        data_path, manifest_path = self._paths(run_key, stage)
+        try:
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+            if manifest["input_hash"] != input_hash:
+                return None
+            if _hash_file(data_path) != manifest["file_hash"]:
+                logging.warning(f"Checkpoint {data_path} is corrupted, recomputing.")
+                return None
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+        return pd.read_parquet(data_path), manifest["meta"], manifest["content_hash"]
+
+    def save(
+        self,
+        run_key: str,
+        stage: str,
+        input_hash: str,
+        df: pd.DataFrame,
+        meta: Dict[str, Any],
+    ) -> str:
+        """
+        Saves the output of a stage, replacing any previous checkpoint atomically.
+
+        Args:
+            run_key (str): The run the stage belongs to.
+            stage (str): The name of the stage.
+            input_hash (str): The hash of the stage inputs.
+            df (pd.DataFrame): The stage output.
+            meta (Dict[str, Any]): JSON-serializable metadata returned alongside the output.
+
+        Returns:
+            str: The content hash of the output frame.
+        """
+        data_path, manifest_path = self._paths(run_key, stage)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+        df.to_parquet(f"{data_path}.tmp", compression="zstd", index=False)
+        os.replace(f"{data_path}.tmp", data_path)
+
+        content_hash = hash_frame(df)
+        manifest = {
+            "input_hash": input_hash,
+            "content_hash": content_hash,
+            "file_hash": _hash_file(data_path),
+            "meta": meta,
+            "created_at": time.time(),
+        }
+        with open(f"{manifest_path}.tmp", "w") as file:
+            json.dump(manifest, file)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        return content_hash
+
+    def run_stage(
+        self,
+        run_key: str,
+        stage: str,
+        inputs: Tuple[Any, ...],
+        compute: Callable[[], Tuple[pd.DataFrame, Dict[str, Any]]],
+    ) -> Tuple[pd.DataFrame, Dict[str, Any], str]:
+        """
+        Returns the checkpointed output of a stage, computing and saving it if its inputs changed.
+
+        Args:
+            run_key (str): The run the stage belongs to.
+            stage (str): The name of the stage.
+            inputs (Tuple[Any, ...]): The values the stage output depends on.
+            compute (Callable[[], Tuple[pd.DataFrame, Dict[str, Any]]]): Produces the stage output and metadata.
+
+        Returns:
+            Tuple[pd.DataFrame, Dict[str, Any], str]: The stage output, its metadata and its content hash.
+        """
+        input_hash = hash_inputs(*inputs)
+        checkpoint = self.load(run_key, stage, input_hash)
+        if checkpoint is not None:
+            logging.info(f"Resuming stage '{stage}' of {run_key} from checkpoint.")
+            return checkpoint
+
+        df, meta = compute()
+        content_hash = self.save(run_key, stage, input_hash, df, meta)
+        return df, meta, content_hash
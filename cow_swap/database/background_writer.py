@@ -0,0 +1,157 @@
+import logging
+import queue
+import threading
+from typing import Any, List, Optional, Set
+
+import pandas as pd
+
+# tells a writer thread that no more chunks will come
+_STOP = object()
+
+
+class BackgroundWriter:
+    """
+    Loads chunks of matched trades into PostgreSQL on background threads, while the caller computes the next ones.
+
+    Chunks go through a bounded queue: once max_pending chunks are waiting, submit blocks until a writer
+    thread takes one, so a slow database holds compute back instead of piling frames up in memory. Each
+    writer thread loads its chunks through its own connection borrowed from the provider pool, in its own
+    transaction. The chunks of a day share rollup buckets, so the threads insert their trades concurrently
+    but merge their rollups one at a time. The first failure stops the writers and is raised by close,
+    after which the caller can spool the whole batch: loading is idempotent, so chunks committed before
+    the failure are skipped on replay. A caller that does not keep its chunks spools the chunks that were
+    never loaded instead, see unwritten.
+
+    Attributes:
+        provider (PostgreSQLProvider): The provider the chunks are loaded with.
+        workers (int): The number of writer threads.
+        max_pending (int): The maximum number of chunks waiting in the queue.
+        submitted_rows (int): The number of rows submitted so far.
+    """
+
+    def __init__(self, provider: Any, workers: int = 1, max_pending: int = 4) -> None:
+        """
+        Initializes the BackgroundWriter and starts its threads.
+
+        Args:
+            provider (PostgreSQLProvider): The provider the chunks are loaded with. Its pool_size must leave
+                a connection for every writer thread.
+            workers (int): The number of writer threads. Default is 1.
+            max_pending (int): The maximum number of chunks waiting in the queue. Default is 4.
+        """
+        self.provider = provider
+        self.workers = workers
+        self.max_pending = max_pending
+        self.submitted_rows = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._unwritten: List[pd.DataFrame] = []
+        self._lock = threading.Lock()
+        self._rollup_lock = threading.Lock()
+        self._prepared_months: Set[int] = set()
+        self._closed = False
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"db-writer-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _prepare(self, trades_df: pd.DataFrame) -> None:
+        # the schema and the monthly partitions must exist before the first insert into them
+        with self._lock:
+            self.provider.migrate()
+            for batch_id in trades_df["batch_id"].unique().tolist():
+                if batch_id // 100 not in self._prepared_months:
+                    self.provider.create_upcoming_partitions(int(batch_id))
+                    self._prepared_months.add(batch_id // 100)
+
+    def _run(self) -> None:
+        while True:
+            trades_df = self._queue.get()
+            try:
+                if trades_df is _STOP:
+                    return
+                # after a failure, the remaining chunks are only drained
+                if self._error is None:
+                    self._prepare(trades_df)
+                    self.provider.insert_trade_data_batch(
+                        trades_df, rollup_lock=self._rollup_lock
+                    )
+                else:
+                    with self._lock:
+                        self._unwritten.append(trades_df)
+            except Exception as e:
+                logging.error(f"Background write of {len(trades_df)} rows failed: {e}")
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+                    self._unwritten.append(trades_df)
+            finally:
+                self._queue.task_done()
+
+    @property
+    def failed(self) -> bool:
+        """
+        Whether a chunk failed to load.
+        """
+        return self._error is not None
+
+    def submit(self, trades_df: pd.DataFrame) -> bool:
+        """
+        Queues a chunk of matched trades, blocking while max_pending chunks are already waiting.
+
+        Chunks submitted after a failure are dropped; the failure is raised by close.
+
+        Args:
+            trades_df (pd.DataFrame): The matched trades, with a 'batch_id' column.
+
+        Returns:
+            bool: False if the chunk was dropped because a previous chunk failed.
+
+        Raises:
+            RuntimeError: If the writer is closed.
+        """
+        if self._closed:
+            raise RuntimeError("The background writer is closed.")
+        if self._error is not None:
+            return False
+        if not trades_df.empty:
+            self._queue.put(trades_df)
+            self.submitted_rows += len(trades_df)
+        return True
+
+    def unwritten(self) -> List[pd.DataFrame]:
+        """
+        Returns the queued chunks that were not loaded because of a failure, once the writer is closed.
+
+        Returns:
+            List[pd.DataFrame]: The failed chunk and the chunks drained after it.
+        """
+        with self._lock:
+            return list(self._unwritten)
+
+    def close(self, raise_error: bool = True) -> None:
+        """
+        Waits until every submitted chunk is committed and stops the writer threads.
+
+        The batch aggregates should only be written once close returns, so that they never describe
+        trades that are not stored.
+
+        Args:
+            raise_error (bool): Whether to raise the first load error. Default is True.
+
+        Raises:
+            Exception: The first error raised while loading a chunk.
+        """
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+            logging.info(
+                f"Background writer loaded {self.submitted_rows} rows on {self.workers} threads."
+            )
+        if raise_error and self._error is not None:
+            raise self._error
@@ -1,7 +1,219 @@
+import itertools
+
+import numpy as np
+import pandas as pd
 import psycopg2
-from psycopg2 import extras
+from psycopg2 import extras, pool, sql
 import logging
-from typing import Callable, List, Dict, Any, Optional
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from cow_swap.chains import DEFAULT_CHAIN
+from cow_swap.database.migrations import SCHEMA_VERSION, apply_migrations
+from cow_swap.database.notifications import BatchListener
+from cow_swap.digests import digest_frame
+from cow_swap.price_calculation import calculate_rollup_deltas
+
+T = TypeVar("T")
+
+_migrated_databases: Set[Tuple[str, int, str]] = set()
+
+PARTITION_PREFIX = "cow_swap_trades_p"
+
+TRADE_KEY_COLUMNS = ["batch_id", "tx_hash", "evt_index"]
+
+TRADE_COLUMNS = [
+    "batch_id",
+    "chain",
+    "tx_hash",
+    "evt_index",
+    "block_number",
+    "block_time",
+    "buy_price",
+    "buy_token",
+    "sell_price",
+    "sell_token",
+    "sell_token_address",
+    "token_pair",
+    "units_sold",
+    "block_timestamp",
+    "price",
+    "trade_price",
+    "price_improvement",
+]
+ROLLUP_TABLES = {"trade_rollups_hourly": 3600, "trade_rollups_daily": 86400}
+
+ROLLUP_COLUMNS = [
+    "bucket_start",
+    "token_pair",
+    "trade_count",
+    "improvement_sum",
+    "volume_sum",
+    "weighted_improvement_sum",
+    "weighted_price_sum",
+    "min_improvement",
+    "max_improvement",
+]
+
+# the rules of price_calculation.calculate_trade_price, as a SQL expression over a cow_swap_trades row
+TRADE_PRICE_SQL = """
+CASE
+    WHEN lower(t.buy_token) = 'weth' THEN t.buy_price
+    WHEN lower(t.sell_token) = 'weth' THEN t.sell_price
+    WHEN lower(t.buy_token) = 'usdc' THEN 1 / NULLIF(t.buy_price, 0)
+    WHEN lower(t.sell_token) = 'usdc' THEN t.sell_price
+END
+"""
+
+# digests.trade_key_hash of a cow_swap_trades row: the first 60 bits of md5('<tx_hash>:<evt_index>')
+TRADE_KEY_HASH_SQL = (
+    "('x' || substr(md5(lower(tx_hash) || ':' || evt_index), 1, 15))::bit(60)::bigint"
+)
+
+# NUMERIC columns are cast on the server so psycopg2 returns floats instead of Decimals
+TRADE_READ_COLUMNS = {
+    "batch_id": "int64",
+    "chain": "object",
+    "tx_hash": "object",
+    "evt_index": "int64",
+    "block_number": "int64",
+    "block_time": "datetime64[ns, UTC]",
+    "buy_price": "float64",
+    "buy_token": "object",
+    "sell_price": "float64",
+    "sell_token": "object",
+    "sell_token_address": "object",
+    "token_pair": "object",
+    "units_sold": "float64",
+    "block_timestamp": "int64",
+    "price": "float64",
+    "trade_price": "float64",
+    "price_improvement": "float64",
+}
+
+
+class WorkUnit(NamedTuple):
+    """
+    A (chain, token pair, day) unit of a backfill, claimed from the work_units table.
+
+    Attributes:
+        chain (str): The chain to ingest.
+        token_pair (str): The pair of the chain, e.g. 'USDC-WETH'.
+        day (date): The UTC day to ingest.
+        attempts (int): The number of times the unit was claimed, this claim included.
+    """
+
+    chain: str
+    token_pair: str
+    day: date
+    attempts: int
+
+
+def today_batch_id() -> int:
+    """
+    Returns the batch ID of the current UTC day, the only batch that may still receive trades.
+
+    Returns:
+        int: Today's batch ID in the format YYYYMMDD.
+    """
+    return int(datetime.now(timezone.utc).date().strftime("%Y%m%d"))
+
+
+def _select_list(columns: dict) -> sql.Composed:
+    return sql.SQL(", ").join(
+        sql.SQL("{}::double precision AS {}").format(
+            sql.Identifier(name), sql.Identifier(name)
+        )
+        if dtype == "float64"
+        else sql.Identifier(name)
+        for name, dtype in columns.items()
+    )
+
+
+def _typed_frame(rows: List[tuple], columns: dict) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=list(columns))
+    return df.astype(
+        {name: dtype for name, dtype in columns.items() if dtype != "object"}
+    )
+
+
+def partition_bounds(batch_id: int) -> Tuple[str, int, int]:
+    """
+    Computes the monthly partition that holds a given batch ID.
+
+    Args:
+        batch_id (int): A batch ID in the format YYYYMMDD.
+
+    Returns:
+        Tuple[str, int, int]: The partition name and its inclusive lower / exclusive upper batch_id bounds.
+    """
+    year, month = divmod(batch_id // 100, 100)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    name = f"{PARTITION_PREFIX}{year:04d}{month:02d}"
+    return (
+        name,
+        year * 10000 + month * 100 + 1,
+        next_year * 10000 + next_month * 100 + 1,
+    )
+
+
+def timestamp_batch_id(timestamp: int) -> int:
+    """
+    Returns the batch ID of the UTC day of a timestamp.
+
+    Args:
+        timestamp (int): A UNIX timestamp in seconds.
+
+    Returns:
+        int: The batch ID in the format YYYYMMDD.
+    """
+    return int(datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%d"))
+
+
+def batch_start_timestamp(batch_id: int) -> int:
+    """
+    Returns the UNIX timestamp of the start of the UTC day of a batch.
+
+    Args:
+        batch_id (int): A batch ID in the format YYYYMMDD.
+
+    Returns:
+        int: The timestamp in seconds.
+    """
+    year, rest = divmod(batch_id, 10000)
+    month, day = divmod(rest, 100)
+    return int(datetime(year, month, day, tzinfo=timezone.utc).timestamp())
+
+
+def add_months(batch_id: int, months: int) -> int:
+    """
+    Shifts a batch ID by a number of months, pinned to the first day of the resulting month.
+
+    Args:
+        batch_id (int): A batch ID in the format YYYYMMDD.
+        months (int): The number of months to shift by, may be negative.
+
+    Returns:
+        int: The batch ID of the first day of the shifted month.
+    """
+    year, month = divmod(batch_id // 100, 100)
+    year, month = divmod(year * 12 + month - 1 + months, 12)
+    return year * 10000 + (month + 1) * 100 + 1
 
 
 class PostgreSQLProvider:
@@ -13,6 +225,9 @@ class PostgreSQLProvider:
         host: str,
         port: int,
         batch_size: int,
+        itersize: int = 10000,
+        cache_size: int = 32,
+        pool_size: Optional[int] = None,
     ) -> None:
         """
         Initializes the PostgreSQLProvider with database connection parameters and batch size.
@@ -24,6 +239,10 @@ class PostgreSQLProvider:
             host (str): The hostname or IP address of the PostgreSQL database.
             port (int): The port number of the PostgreSQL database.
             batch_size (int): The size of batches for batch operations.
+            itersize (int): The number of rows fetched per round trip by server-side cursors. Default is 10000.
+            cache_size (int): The number of closed batches kept in the read cache. Default is 32.
+            pool_size (Optional[int]): The maximum number of pooled connections shared by concurrent callers.
+                Each operation opens its own connection if None. Default is None.
         """
         self.dbname = dbname
         self.user = user
@@ -31,141 +250,1159 @@ class PostgreSQLProvider:
         self.host = host
         self.port = port
         self.batch_size = batch_size
+        self.itersize = itersize
+        self._known_partitions: Set[str] = set()
+        self._read_closed_batch = lru_cache(maxsize=cache_size)(self._read_batch)
+        self.pool_size = pool_size
+        self._pool: Optional[pool.ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+
+    def _connection_params(self) -> dict:
+        return {
+            "dbname": self.dbname,
+            "user": self.user,
+            "password": self.password,
+            "host": self.host,
+            "port": self.port,
+        }
 
     def _get_connection(self) -> psycopg2.extensions.connection:
         """
-        Establishes a connection to the PostgreSQL database.
+        Establishes a connection to the PostgreSQL database, or borrows one from the pool.
+
+        The pool is created on first use, so a provider can be built while the database is down.
 
         Returns:
             psycopg2.extensions.connection: A connection object for the PostgreSQL database.
         """
-        return psycopg2.connect(
-            dbname=self.dbname,
-            user=self.user,
-            password=self.password,
-            host=self.host,
-            port=self.port,
-        )
+        if self.pool_size is None:
+            return psycopg2.connect(**self._connection_params())
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = pool.ThreadedConnectionPool(
+                    1, self.pool_size, **self._connection_params()
+                )
+        return self._pool.getconn()
 
-    def execute(self, operation: Callable[[psycopg2.extensions.cursor], None]) -> None:
+    def _release_connection(self, connection: psycopg2.extensions.connection) -> None:
+        """
+        Closes a connection, or returns it to the pool it was borrowed from.
+
+        Args:
+            connection (psycopg2.extensions.connection): The connection to release.
+        """
+        if self._pool is None:
+            connection.close()
+        else:
+            self._pool.putconn(connection, close=bool(connection.closed))
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def listen(self) -> BatchListener:
+        """
+        Opens a listener for the batch_completed notifications, sent in the transaction of every
+        batch improvement write (see migration 6).
+
+        Returns:
+            BatchListener: A listener on its own connection, to be closed by the caller.
+        """
+        return BatchListener(**self._connection_params())
+
+    def execute(
+        self,
+        operation: Callable[[psycopg2.extensions.cursor], T],
+        autocommit: bool = True,
+    ) -> Optional[T]:
         """
         Manages the connection and executes a provided database operation.
 
         Args:
-            operation (Callable[[psycopg2.extensions.cursor], None]): A function that accepts a cursor and performs the database operation.
+            operation (Callable[[psycopg2.extensions.cursor], T]): A function that accepts a cursor and performs the database operation.
+            autocommit (bool): Whether each statement commits on its own. When False, the whole operation runs
+                in one transaction that commits on success and rolls back on error. Default is True.
+
+        Returns:
+            Optional[T]: The value returned by the operation.
+
+        Raises:
+            psycopg2.Error: If the operation or the connection fails. The error is logged first.
         """
         connection: Optional[psycopg2.extensions.connection] = None
         try:
             with self._get_connection() as connection:
-                connection.autocommit = True
+                connection.autocommit = autocommit
                 with connection.cursor() as cursor:
-                    operation(cursor)
+                    return operation(cursor)
         except psycopg2.Error as e:
             logging.error(f"Database error: {e}")
+            raise
         finally:
             if connection:
-                connection.close()
+                self._release_connection(connection)
+
+    def stream(
+        self,
+        query: sql.Composable,
+        params: tuple = (),
+        itersize: Optional[int] = None,
+    ) -> Iterator[List[tuple]]:
+        """
+        Streams the rows of a query through a named (server-side) cursor.
+
+        The result set stays on the server and is fetched itersize rows at a time,
+        so memory use is bounded by one chunk regardless of the result size.
 
-    def create_table_cow_swap_if_not_exists(self) -> None:
+        Args:
+            query (sql.Composable): The SELECT statement to run.
+            params (tuple): The query parameters.
+            itersize (Optional[int]): The number of rows per chunk. Defaults to the provider's itersize.
+
+        Yields:
+            List[tuple]: The next non-empty chunk of rows.
+        """
+        itersize = itersize or self.itersize
+        connection = self._get_connection()
+        try:
+            # named cursors need a transaction, and a pooled connection keeps the mode of its last user
+            connection.autocommit = False
+            with connection:
+                with connection.cursor(name=f"cow_swap_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = itersize
+                    cursor.execute(query, params)
+                    while True:
+                        rows = cursor.fetchmany(itersize)
+                        if not rows:
+                            break
+                        yield rows
+        finally:
+            self._release_connection(connection)
+
+    def stream_trades(
+        self,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        token_pair: Optional[str] = None,
+        batch_id: Optional[int] = None,
+        itersize: Optional[int] = None,
+        chain: Optional[str] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Streams stored trades as typed DataFrame chunks, ordered by block_timestamp.
+
+        Args:
+            start_timestamp (Optional[int]): The inclusive lower block_timestamp bound, in UNIX seconds.
+            end_timestamp (Optional[int]): The exclusive upper block_timestamp bound, in UNIX seconds.
+            token_pair (Optional[str]): Restricts the trades to a single token pair.
+            batch_id (Optional[int]): Restricts the trades to a single batch.
+            itersize (Optional[int]): The number of rows per chunk. Defaults to the provider's itersize.
+            chain (Optional[str]): Restricts the trades to a single chain.
+
+        Yields:
+            pd.DataFrame: The next chunk of trades, with the dtypes of TRADE_READ_COLUMNS.
         """
-        Creates the cow_swap_trades table if it doesn't exist.
+        conditions, params = [], []
+        for column, operator, value in (
+            ("block_timestamp", ">=", start_timestamp),
+            ("block_timestamp", "<", end_timestamp),
+            ("token_pair", "=", token_pair),
+            ("batch_id", "=", batch_id),
+            ("chain", "=", chain),
+        ):
+            if value is not None:
+                conditions.append(
+                    sql.SQL("{} {} %s").format(
+                        sql.Identifier(column), sql.SQL(operator)
+                    )
+                )
+                params.append(value)
+
+        query = sql.SQL(
+            "SELECT {} FROM cow_swap_trades WHERE {} ORDER BY block_timestamp"
+        ).format(
+            _select_list(TRADE_READ_COLUMNS),
+            sql.SQL(" AND ").join(conditions) if conditions else sql.SQL("TRUE"),
+        )
+        for rows in self.stream(query, tuple(params), itersize):
+            yield _typed_frame(rows, TRADE_READ_COLUMNS)
+
+    def _read_batch(self, batch_id: int) -> pd.DataFrame:
+        chunks = list(self.stream_trades(batch_id=batch_id))
+        if not chunks:
+            return _typed_frame([], TRADE_READ_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+
+    def get_batch_trades(self, batch_id: int) -> pd.DataFrame:
+        """
+        Reads all the trades of a batch, served from an LRU cache once the batch is closed.
+
+        Batches before the current UTC day are immutable, so repeated reads never hit the database.
+
+        Args:
+            batch_id (int): A batch ID in the format YYYYMMDD.
+
+        Returns:
+            pd.DataFrame: The trades of the batch, with the dtypes of TRADE_READ_COLUMNS.
         """
+        if batch_id < today_batch_id():
+            return self._read_closed_batch(batch_id).copy()
+        return self._read_batch(batch_id)
+
+    def clear_read_cache(self) -> None:
+        """
+        Empties the closed-batch read cache, e.g. after a backfill rewrote past batches.
+        """
+        self._read_closed_batch.cache_clear()
+
+    def fetch_batch_improvements(
+        self, start_batch_id: Optional[int] = None, end_batch_id: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Fetches the average improvement of every batch in an inclusive batch ID range.
+
+        Args:
+            start_batch_id (Optional[int]): The first batch ID of the range. Unbounded if None.
+            end_batch_id (Optional[int]): The last batch ID of the range. Unbounded if None.
+
+        Returns:
+            pd.DataFrame: A DataFrame with 'batch_id', 'chain' and 'average_improvement' columns,
+            ordered by batch_id and chain.
+        """
+        columns = {
+            "batch_id": "int64",
+            "chain": "object",
+            "average_improvement": "float64",
+        }
+
+        def operation(cursor: psycopg2.extensions.cursor) -> pd.DataFrame:
+            select_query = sql.SQL(
+                "SELECT {} FROM batch_improvements "
+                "WHERE (%s IS NULL OR batch_id >= %s) AND (%s IS NULL OR batch_id <= %s) "
+                "ORDER BY batch_id, chain;"
+            ).format(_select_list(columns))
+            cursor.execute(
+                select_query,
+                (start_batch_id, start_batch_id, end_batch_id, end_batch_id),
+            )
+            return _typed_frame(cursor.fetchall(), columns)
+
+        return self.execute(operation)
+
+    def migrate(self) -> int:
+        """
+        Applies pending schema migrations once per process and database.
+
+        Later calls return immediately, so the load path never issues schema DDL.
+
+        Returns:
+            int: The schema version of the database.
+        """
+        database = (self.host, self.port, self.dbname)
+        if database in _migrated_databases:
+            return SCHEMA_VERSION
+
+        version = self.execute(apply_migrations, autocommit=False)
+        if version == SCHEMA_VERSION:
+            _migrated_databases.add(database)
+            logging.info(f"Database schema is at version {version}.")
+        return version
+
+    def create_partition(self, batch_id: int) -> None:
+        """
+        Creates the monthly cow_swap_trades partition holding the given batch ID if it doesn't exist.
+
+        The trades table itself is created by the migrations, see migrate.
+
+        Args:
+            batch_id (int): A batch ID in the format YYYYMMDD.
+        """
+        name, lower, upper = partition_bounds(batch_id)
+        if name in self._known_partitions:
+            return
 
         def operation(cursor: psycopg2.extensions.cursor) -> None:
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS cow_swap_trades (
-                batch_id BIGINT NOT NULL,
-                block_number BIGINT NOT NULL,
-                block_time TIMESTAMP WITH TIME ZONE NOT NULL,
-                buy_price NUMERIC(18, 8),
-                buy_token VARCHAR(10) NOT NULL,
-                sell_price NUMERIC(18, 8),
-                sell_token VARCHAR(10) NOT NULL,
-                sell_token_address VARCHAR(50),
-                token_pair VARCHAR(20) NOT NULL,
-                units_sold NUMERIC(30, 10) NOT NULL,
-                block_timestamp BIGINT NOT NULL,
-                price NUMERIC(18, 8),
-                trade_price NUMERIC(18, 8),
-                price_improvement NUMERIC(18, 8),
-                PRIMARY KEY (batch_id, block_number)
-            );
-            """
-            cursor.execute(create_table_query)
-            logging.info("Table cow_swap_trades created or verified successfully.")
+            create_partition_query = sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {} PARTITION OF cow_swap_trades "
+                "FOR VALUES FROM (%s) TO (%s);"
+            ).format(sql.Identifier(name))
+            cursor.execute(create_partition_query, (lower, upper))
+            logging.info(f"Partition {name} created or verified successfully.")
+            self._known_partitions.add(name)
 
         self.execute(operation)
 
-    def create_table_for_average_improvement(self) -> None:
+    def create_upcoming_partitions(self, batch_id: int, months_ahead: int = 1) -> None:
         """
-        Creates the batch_improvements table if it doesn't exist, with batch_id as the primary key.
+        Creates the partition holding the given batch ID and the partitions for the following months.
+
+        Existing partitions are read once from the catalog, so DDL is only issued for missing months.
+
+        Args:
+            batch_id (int): A batch ID in the format YYYYMMDD.
+            months_ahead (int): The number of upcoming monthly partitions to create. Default is 1.
         """
+        if not self._known_partitions:
+            self._known_partitions.update(self.list_partitions())
+        for months in range(months_ahead + 1):
+            self.create_partition(add_months(batch_id, months))
 
-        def operation(cursor: psycopg2.extensions.cursor) -> None:
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS batch_improvements (
-                batch_id BIGINT PRIMARY KEY,
-                average_improvement NUMERIC(18, 8) NOT NULL
-            );
+    def list_partitions(self) -> List[str]:
+        """
+        Lists the partitions currently attached to the cow_swap_trades table.
+
+        Returns:
+            List[str]: The partition names, oldest first.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> List[str]:
+            list_partitions_query = """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'cow_swap_trades'
+            ORDER BY child.relname;
             """
-            cursor.execute(create_table_query)
-            logging.info("Table batch_improvements created or verified successfully.")
+            cursor.execute(list_partitions_query)
+            return [row[0] for row in cursor.fetchall()]
+
+        return self.execute(operation)
+
+    def detach_partition(self, batch_id: int, drop: bool = False) -> None:
+        """
+        Detaches the monthly partition holding the given batch ID, and optionally drops it.
+
+        Args:
+            batch_id (int): A batch ID in the format YYYYMMDD.
+            drop (bool): Whether to drop the detached partition. Default is False.
+        """
+        name, _, _ = partition_bounds(batch_id)
+
+        def operation(cursor: psycopg2.extensions.cursor) -> None:
+            cursor.execute(
+                sql.SQL("ALTER TABLE cow_swap_trades DETACH PARTITION {};").format(
+                    sql.Identifier(name)
+                )
+            )
+            if drop:
+                cursor.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(name)))
+            self._known_partitions.discard(name)
+            logging.info(f"Partition {name} {'dropped' if drop else 'detached'}.")
 
         self.execute(operation)
 
-    def insert_trade_data_batch(self, trade_data_list: List[Dict[str, Any]]) -> None:
+    def apply_retention(
+        self,
+        keep_months: int,
+        reference_batch_id: Optional[int] = None,
+        drop: bool = True,
+    ) -> List[str]:
         """
-        Inserts a batch of trade data into the cow_swap_trades table.
+        Detaches (and by default drops) every partition older than the retention window.
+
+        Args:
+            keep_months (int): The number of months to keep, including the reference month.
+            reference_batch_id (Optional[int]): The batch ID the window is anchored to. Defaults to today.
+            drop (bool): Whether to drop the expired partitions instead of only detaching them. Default is True.
+
+        Returns:
+            List[str]: The names of the expired partitions.
+        """
+        if reference_batch_id is None:
+            reference_batch_id = today_batch_id()
+        oldest_kept, _, _ = partition_bounds(
+            add_months(reference_batch_id, 1 - keep_months)
+        )
+
+        expired = [name for name in self.list_partitions() if name < oldest_kept]
+        for name in expired:
+            self.detach_partition(
+                int(name[len(PARTITION_PREFIX) :]) * 100 + 1, drop=drop
+            )
+        return expired
+
+    def fetch_existing_trade_keys(self, keys_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Fetches which of the given trade keys are already stored.
+
+        The keys are joined against the table on the server, so the lookup costs the size of the frame,
+        not of the batches it belongs to.
+
+        Args:
+            keys_df (pd.DataFrame): The TRADE_KEY_COLUMNS of the trades to look up.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the TRADE_KEY_COLUMNS of the keys already stored.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> pd.DataFrame:
+            select_query = """
+            SELECT t.batch_id, t.tx_hash, t.evt_index
+            FROM cow_swap_trades t
+            JOIN unnest(%s::bigint[], %s::varchar[], %s::integer[]) AS k(batch_id, tx_hash, evt_index)
+                ON t.batch_id = k.batch_id AND t.tx_hash = k.tx_hash AND t.evt_index = k.evt_index
+            WHERE t.batch_id = ANY(%s);
+            """
+            batch_ids = keys_df["batch_id"].astype("int64").tolist()
+            cursor.execute(
+                select_query,
+                (
+                    batch_ids,
+                    keys_df["tx_hash"].astype(str).tolist(),
+                    keys_df["evt_index"].astype("int64").tolist(),
+                    # prunes the partitions the keys cannot be in
+                    sorted(set(batch_ids)),
+                ),
+            )
+            return pd.DataFrame(cursor.fetchall(), columns=TRADE_KEY_COLUMNS)
+
+        return self.execute(operation)
+
+    def remove_known_trades(self, trades_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drops duplicated trades within the frame and trades already stored in the database.
+
+        Args:
+            trades_df (pd.DataFrame): The trade data, including the TRADE_KEY_COLUMNS.
+
+        Returns:
+            pd.DataFrame: The trades that are not yet stored, one row per trade key.
+        """
+        trades_df = trades_df.drop_duplicates(subset=TRADE_KEY_COLUMNS, keep="last")
+
+        existing_keys = self.fetch_existing_trade_keys(trades_df[TRADE_KEY_COLUMNS])
+        if existing_keys.empty:
+            return trades_df
+
+        existing_keys = existing_keys.astype(
+            trades_df[TRADE_KEY_COLUMNS].dtypes.to_dict()
+        )
+        known = pd.MultiIndex.from_frame(trades_df[TRADE_KEY_COLUMNS]).isin(
+            pd.MultiIndex.from_frame(existing_keys)
+        )
+        return trades_df[~known]
+
+    def insert_trade_data_batch(
+        self,
+        trades_df: pd.DataFrame,
+        rollup_lock: Optional[threading.Lock] = None,
+    ) -> None:
+        """
+        Inserts a batch of trade data into the cow_swap_trades table and updates the rollup tables.
+
+        Duplicates within the frame and trades already stored are removed before anything is sent to the server.
+        The rollups are merged from the rows actually inserted, in the same transaction as the insert.
+
+        Concurrent loads of the same day upsert the same rollup buckets, and the bucket rows stay locked
+        until commit. With a rollup_lock, the trades are inserted concurrently, but the rollup merge and
+        the commit are taken one load at a time, so the loads queue on the lock instead of on row locks.
 
         Args:
-            trade_data_list (List[Dict[str, Any]]): A list of dictionaries, each representing a row of trade data.
+            trades_df (pd.DataFrame): The trade data, one row per trade, with the TRADE_COLUMNS.
+                Frames without a 'chain' column, such as batches spooled before multi-chain support,
+                are stored as Ethereum trades.
+            rollup_lock (Optional[threading.Lock]): The lock shared by concurrent loads. Default is None.
         """
+        if "chain" not in trades_df.columns:
+            trades_df = trades_df.assign(chain=DEFAULT_CHAIN)
+        new_trades_df = self.remove_known_trades(trades_df)
+        skipped = len(trades_df) - len(new_trades_df)
+        if new_trades_df.empty:
+            logging.info(f"No new trades to insert, {skipped} rows already stored.")
+            return
+
+        rows = new_trades_df[TRADE_COLUMNS].astype(object)
+        rows = rows.where(rows.notna(), None)
 
         def operation(cursor: psycopg2.extensions.cursor) -> None:
-            insert_query = """
-            INSERT INTO cow_swap_trades (
-                batch_id, block_number, block_time, buy_price, buy_token, sell_price, sell_token, 
-                sell_token_address, token_pair, units_sold, block_timestamp, price, trade_price, price_improvement
-            ) VALUES (
-                %(batch_id)s, %(block_number)s, %(block_time)s, %(buy_price)s, %(buy_token)s, %(sell_price)s, %(sell_token)s, 
-                %(sell_token_address)s, %(token_pair)s, %(units_sold)s, %(block_timestamp)s, %(price)s, %(trade_price)s, %(price_improvement)s
-            )
-            ON CONFLICT (batch_id, block_number) DO NOTHING;
+            insert_query = f"""
+            INSERT INTO cow_swap_trades ({", ".join(TRADE_COLUMNS)})
+            VALUES %s
+            ON CONFLICT ({", ".join(TRADE_KEY_COLUMNS)}) DO NOTHING
+            RETURNING {", ".join(TRADE_KEY_COLUMNS)};
             """
-            extras.execute_batch(
-                cursor, insert_query, trade_data_list, page_size=self.batch_size
+            inserted_keys = extras.execute_values(
+                cursor,
+                insert_query,
+                rows.itertuples(index=False, name=None),
+                page_size=self.batch_size,
+                fetch=True,
+            )
+            inserted = pd.MultiIndex.from_frame(new_trades_df[TRADE_KEY_COLUMNS]).isin(
+                inserted_keys
             )
+            with rollup_lock or nullcontext():
+                self._merge_rollups(cursor, new_trades_df[inserted])
+                # released once the bucket rows are unlocked
+                cursor.connection.commit()
             logging.info(
-                f"Batch insert of {len(trade_data_list)} rows completed successfully."
+                f"Batch insert of {int(inserted.sum())} rows completed successfully, "
+                f"{len(trades_df) - int(inserted.sum())} duplicates skipped."
             )
 
-        self.execute(operation)
+        self.execute(operation, autocommit=False)
+        self.clear_read_cache()
+
+    def replace_trades(
+        self,
+        trades_df: pd.DataFrame,
+        chain: str,
+        token_pair: str,
+        start_timestamp: int,
+        end_timestamp: int,
+    ) -> int:
+        """
+        Replaces the stored trades of a chain and token pair over a time range, in one transaction.
+
+        Unlike insert_trade_data_batch, trades missing from the frame are deleted, so a range refetched
+        from the source ends up holding exactly the source trades. The rollups are not merged; rebuild
+        them over the range afterwards.
+
+        Args:
+            trades_df (pd.DataFrame): The trades of the range, with the TRADE_COLUMNS. May be empty.
+            chain (str): The chain of the range.
+            token_pair (str): The token pair of the range.
+            start_timestamp (int): The start of the range, in UNIX seconds.
+            end_timestamp (int): The end of the range (exclusive), in UNIX seconds.
+
+        Returns:
+            int: The number of stored trades deleted before the insert.
+        """
+        rows = trades_df[TRADE_COLUMNS].astype(object)
+        rows = rows.where(rows.notna(), None)
+
+        def operation(cursor: psycopg2.extensions.cursor) -> int:
+            cursor.execute(
+                """
+                DELETE FROM cow_swap_trades
+                WHERE batch_id >= %(start_batch)s AND batch_id <= %(end_batch)s
+                    AND chain = %(chain)s AND token_pair = %(token_pair)s
+                    AND block_timestamp >= %(start)s AND block_timestamp < %(end)s;
+                """,
+                {
+                    # batch bounds let the planner prune the monthly partitions
+                    "start_batch": timestamp_batch_id(start_timestamp),
+                    "end_batch": timestamp_batch_id(end_timestamp - 1),
+                    "chain": chain,
+                    "token_pair": token_pair,
+                    "start": start_timestamp,
+                    "end": end_timestamp,
+                },
+            )
+            deleted = cursor.rowcount
+            if len(rows):
+                extras.execute_values(
+                    cursor,
+                    f"""
+                    INSERT INTO cow_swap_trades ({", ".join(TRADE_COLUMNS)}) VALUES %s
+                    ON CONFLICT ({", ".join(TRADE_KEY_COLUMNS)}) DO NOTHING;
+                    """,
+                    rows.itertuples(index=False, name=None),
+                    page_size=self.batch_size,
+                )
+            logging.info(
+                f"Replaced {deleted} stored {token_pair} trades of {chain} by {len(rows)} trades "
+                f"between {start_timestamp} and {end_timestamp}."
+            )
+            return deleted
+
+        deleted = self.execute(operation, autocommit=False)
+        self.clear_read_cache()
+        return deleted
+
+    def trade_digests(self, batch_id: int, chain: str, token_pair: str) -> pd.DataFrame:
+        """
+        Computes the hourly digests of the stored trades of a batch, inside PostgreSQL.
+
+        A digest is the number of trades of an hour and the sum of their key hashes, see
+        digests.trade_key_hash, so only one row per hour leaves the server.
+
+        Args:
+            batch_id (int): The batch ID in the format YYYYMMDD.
+            chain (str): The chain of the trades.
+            token_pair (str): The token pair of the trades.
+
+        Returns:
+            pd.DataFrame: One row per hour holding trades, indexed by 'hour_start' (UNIX seconds), with
+            'trade_count' and 'key_hash' (Python int) columns.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> pd.DataFrame:
+            cursor.execute(
+                f"""
+                SELECT block_timestamp / 3600 * 3600, COUNT(*), SUM({TRADE_KEY_HASH_SQL})
+                FROM cow_swap_trades
+                WHERE batch_id = %s AND chain = %s AND token_pair = %s
+                GROUP BY 1
+                ORDER BY 1;
+                """,
+                (batch_id, chain, token_pair),
+            )
+            return digest_frame(
+                [(int(hour), int(count), int(total)) for hour, count, total in cursor]
+            )
+
+        return self.execute(operation)
+
+    def daily_trade_counts(
+        self, chain: str, token_pair: str, start_batch: int, end_batch: int
+    ) -> Dict[int, int]:
+        """
+        Counts the stored trades of each batch of a chain and token pair.
+
+        Args:
+            chain (str): The chain of the trades.
+            token_pair (str): The token pair of the trades.
+            start_batch (int): The first batch ID, in the format YYYYMMDD.
+            end_batch (int): The last batch ID, included.
+
+        Returns:
+            Dict[int, int]: The number of trades of each batch holding trades.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> Dict[int, int]:
+            cursor.execute(
+                """
+                SELECT batch_id, COUNT(*)
+                FROM cow_swap_trades
+                WHERE batch_id >= %s AND batch_id <= %s AND chain = %s AND token_pair = %s
+                GROUP BY batch_id;
+                """,
+                (start_batch, end_batch, chain, token_pair),
+            )
+            return {int(batch_id): int(count) for batch_id, count in cursor.fetchall()}
+
+        return self.execute(operation)
+
+    def _merge_rollups(
+        self, cursor: psycopg2.extensions.cursor, inserted_df: pd.DataFrame
+    ) -> None:
+        if inserted_df.empty:
+            return
+        for table, bucket_seconds in ROLLUP_TABLES.items():
+            deltas = calculate_rollup_deltas(inserted_df, bucket_seconds)
+            upsert_query = f"""
+            INSERT INTO {table} ({", ".join(ROLLUP_COLUMNS)}) VALUES %s
+            ON CONFLICT (bucket_start, token_pair) DO UPDATE SET
+                trade_count = {table}.trade_count + EXCLUDED.trade_count,
+                improvement_sum = {table}.improvement_sum + EXCLUDED.improvement_sum,
+                volume_sum = {table}.volume_sum + EXCLUDED.volume_sum,
+                weighted_improvement_sum = {table}.weighted_improvement_sum + EXCLUDED.weighted_improvement_sum,
+                weighted_price_sum = {table}.weighted_price_sum + EXCLUDED.weighted_price_sum,
+                min_improvement = LEAST({table}.min_improvement, EXCLUDED.min_improvement),
+                max_improvement = GREATEST({table}.max_improvement, EXCLUDED.max_improvement);
+            """
+            extras.execute_values(
+                cursor,
+                upsert_query,
+                deltas[ROLLUP_COLUMNS]
+                .astype(object)
+                .itertuples(index=False, name=None),
+                page_size=self.batch_size,
+            )
+            logging.info(f"Merged {len(deltas)} buckets into {table}.")
+
+    def rebuild_rollups(self, start_timestamp: int, end_timestamp: int) -> None:
+        """
+        Recomputes the rollup tables from cow_swap_trades over a time range, in one transaction.
+
+        The range is widened to whole days so that no hourly or daily bucket is left partially rebuilt.
+
+        Args:
+            start_timestamp (int): The start of the range, in UNIX seconds.
+            end_timestamp (int): The end of the range (exclusive), in UNIX seconds.
+        """
+        start = start_timestamp // 86400 * 86400
+        end = -(-end_timestamp // 86400) * 86400
+
+        def operation(cursor: psycopg2.extensions.cursor) -> None:
+            for table, bucket_seconds in ROLLUP_TABLES.items():
+                cursor.execute(
+                    sql.SQL(
+                        "DELETE FROM {} WHERE bucket_start >= %s AND bucket_start < %s;"
+                    ).format(sql.Identifier(table)),
+                    (start, end),
+                )
+                cursor.execute(
+                    sql.SQL(
+                        """
+                        INSERT INTO {table} ({columns})
+                        SELECT
+                            block_timestamp / %(bucket)s * %(bucket)s,
+                            token_pair,
+                            COUNT(*),
+                            SUM(price_improvement),
+                            SUM(units_sold),
+                            SUM(price_improvement * units_sold),
+                            SUM(trade_price * units_sold),
+                            MIN(price_improvement),
+                            MAX(price_improvement)
+                        FROM cow_swap_trades
+                        WHERE block_timestamp >= %(start)s AND block_timestamp < %(end)s
+                          AND price_improvement IS NOT NULL
+                        GROUP BY 1, 2;
+                        """
+                    ).format(
+                        table=sql.Identifier(table),
+                        columns=sql.SQL(", ").join(map(sql.Identifier, ROLLUP_COLUMNS)),
+                    ),
+                    {"bucket": bucket_seconds, "start": start, "end": end},
+                )
+                logging.info(f"Rebuilt {table} from {start} to {end}.")
+
+        self.execute(operation, autocommit=False)
+
+    def insert_reference_prices(
+        self, token_pair: str, timestamps: np.ndarray, prices: np.ndarray
+    ) -> int:
+        """
+        Upserts the reference price history of a token pair, the prices recompute_price_improvements joins on.
+
+        Args:
+            token_pair (str): The pair the prices are quoted for, as in the trades' token_pair column.
+            timestamps (np.ndarray): The UNIX timestamps of the prices, in seconds.
+            prices (np.ndarray): The prices.
+
+        Returns:
+            int: The number of prices sent.
+        """
+        rows = zip(
+            itertools.repeat(token_pair),
+            np.asarray(timestamps, dtype=np.int64).tolist(),
+            np.asarray(prices, dtype=np.float64).tolist(),
+        )
+
+        def operation(cursor: psycopg2.extensions.cursor) -> None:
+            extras.execute_values(
+                cursor,
+                """
+                INSERT INTO reference_prices (token_pair, block_timestamp, price) VALUES %s
+                ON CONFLICT (token_pair, block_timestamp) DO UPDATE SET price = EXCLUDED.price;
+                """,
+                rows,
+                page_size=self.batch_size,
+            )
+
+        self.execute(operation, autocommit=False)
+        logging.info(f"Upserted {len(timestamps)} reference prices of {token_pair}.")
+        return len(timestamps)
+
+    def recompute_price_improvements(
+        self, start_batch_id: int, end_batch_id: int
+    ) -> int:
+        """
+        Re-prices the stored trades of a batch range against reference_prices, entirely inside PostgreSQL.
+
+        Every trade is matched with the last reference price of its pair at or before its block
+        timestamp by a LATERAL join, and its price, trade_price and price_improvement are updated in
+        bulk, one monthly partition per transaction. Trades without a reference price are left as they
+        are. The batch averages and the rollups of the range are then rebuilt from the updated trades.
+
+        Args:
+            start_batch_id (int): The first batch ID of the range.
+            end_batch_id (int): The last batch ID of the range, included.
+
+        Returns:
+            int: The number of updated trades.
+        """
+        partitions = set(self.list_partitions())
+        updated = 0
+        month = add_months(start_batch_id, 0)
+        while month <= end_batch_id:
+            name, lower, upper = partition_bounds(month)
+            month = add_months(month, 1)
+            if name not in partitions:
+                continue
+
+            def operation(cursor: psycopg2.extensions.cursor) -> int:
+                cursor.execute(
+                    sql.SQL(
+                        """
+                        WITH repriced AS (
+                            SELECT
+                                t.batch_id,
+                                t.tx_hash,
+                                t.evt_index,
+                                p.price,
+                                {trade_price} AS trade_price
+                            FROM {partition} AS t
+                            CROSS JOIN LATERAL (
+                                SELECT r.price
+                                FROM reference_prices AS r
+                                WHERE r.token_pair = t.token_pair
+                                  AND r.block_timestamp <= t.block_timestamp
+                                ORDER BY r.block_timestamp DESC
+                                LIMIT 1
+                            ) AS p
+                            WHERE t.batch_id >= %(start)s AND t.batch_id < %(end)s
+                        )
+                        UPDATE {partition} AS t
+                        SET price = repriced.price,
+                            trade_price = repriced.trade_price,
+                            price_improvement = CASE
+                                WHEN lower(t.sell_token) = 'weth'
+                                THEN repriced.price - repriced.trade_price
+                                ELSE repriced.trade_price - repriced.price
+                            END
+                        FROM repriced
+                        WHERE t.batch_id = repriced.batch_id
+                          AND t.tx_hash = repriced.tx_hash
+                          AND t.evt_index = repriced.evt_index;
+                        """
+                    ).format(
+                        partition=sql.Identifier(name),
+                        trade_price=sql.SQL(TRADE_PRICE_SQL),
+                    ),
+                    {
+                        "start": max(start_batch_id, lower),
+                        "end": min(end_batch_id + 1, upper),
+                    },
+                )
+                return cursor.rowcount
+
+            rows = self.execute(operation, autocommit=False)
+            logging.info(f"Re-priced {rows} trades of {name}.")
+            updated += rows
+
+        self.refresh_batch_improvements(start_batch_id, end_batch_id)
+        self.rebuild_rollups(
+            batch_start_timestamp(start_batch_id),
+            batch_start_timestamp(end_batch_id) + 86400,
+        )
+        self.clear_read_cache()
+        return updated
+
+    def refresh_batch_improvements(
+        self, start_batch_id: int, end_batch_id: int
+    ) -> None:
+        """
+        Recomputes the average improvement of every batch and chain of a range from the stored trades.
+
+        Args:
+            start_batch_id (int): The first batch ID of the range.
+            end_batch_id (int): The last batch ID of the range, included.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> None:
+            cursor.execute(
+                """
+                INSERT INTO batch_improvements (batch_id, chain, average_improvement)
+                SELECT batch_id, chain, AVG(price_improvement)
+                FROM cow_swap_trades
+                WHERE batch_id >= %s AND batch_id <= %s AND price_improvement IS NOT NULL
+                GROUP BY batch_id, chain
+                ON CONFLICT (chain, batch_id) DO UPDATE
+                SET average_improvement = EXCLUDED.average_improvement;
+                """,
+                (start_batch_id, end_batch_id),
+            )
+            logging.info(
+                f"Refreshed {cursor.rowcount} batch improvements from {start_batch_id} to {end_batch_id}."
+            )
+
+        self.execute(operation, autocommit=False)
 
     def insert_batch_improvement(
-        self, batch_id: int, average_improvement: float
+        self, batch_id: int, average_improvement: float, chain: str = DEFAULT_CHAIN
     ) -> None:
         """
         Inserts a batch improvement record into the batch_improvements table.
 
+        The batch_completed trigger notifies listeners of the batch when this write commits.
+
         Args:
             batch_id (int): The ID of the batch.
             average_improvement (float): The calculated average price improvement for the batch.
+            chain (str): The chain the batch was ingested from. Default is 'ethereum'.
         """
 
         def operation(cursor: psycopg2.extensions.cursor) -> None:
             insert_query = """
-            INSERT INTO batch_improvements (batch_id, average_improvement)
-            VALUES (%s, %s)
-            ON CONFLICT (batch_id) DO UPDATE 
+            INSERT INTO batch_improvements (batch_id, chain, average_improvement)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (chain, batch_id) DO UPDATE 
             SET average_improvement = EXCLUDED.average_improvement;
             """
-            cursor.execute(insert_query, (batch_id, average_improvement))
+            cursor.execute(insert_query, (batch_id, chain, average_improvement))
             logging.info(
-                f"Inserted/Updated batch_improvement for batch_id {batch_id} with average_improvement {average_improvement}."
+                f"Inserted/Updated batch_improvement for batch_id {batch_id} on {chain} with average_improvement {average_improvement}."
             )
 
         self.execute(operation)
 
+    @contextmanager
+    def batch_lock(self, chain: str, batch_id: int, days: int = 1) -> Iterator[bool]:
+        """
+        Tries to take the advisory locks of a batch and the days after it, held until the block exits.
+
+        The locks are held by a session on its own connection rather than a pooled one, so a long run does
+        not take a connection away from its own writes. The locks do not wait: overlapping runs of the
+        same batch, such as the daily DAG and a backfill worker, learn that it is taken and back off. A
+        run loading several days takes the lock of each of them, and backs off if any one is taken.
+        If the database is unreachable, nothing can be written to it concurrently, so the run proceeds
+        unlocked, since its results are spooled.
+
+        Args:
+            chain (str): The chain of the batch.
+            batch_id (int): The batch ID in the format YYYYMMDD.
+            days (int): The number of consecutive daily batches to lock, starting at batch_id. Default is 1.
+
+        Yields:
+            bool: Whether every lock was acquired.
+        """
+        try:
+            connection = psycopg2.connect(**self._connection_params())
+        except psycopg2.OperationalError as e:
+            logging.warning(f"Batch {batch_id} on {chain} is not locked: {e}")
+            yield True
+            return
+        first_day = datetime.strptime(str(batch_id), "%Y%m%d").date()
+        try:
+            connection.autocommit = True
+            acquired = True
+            with connection.cursor() as cursor:
+                for offset in range(max(days, 1)):
+                    cursor.execute(
+                        "SELECT pg_try_advisory_lock(hashtext(%s), %s);",
+                        (
+                            chain,
+                            int(
+                                (first_day + timedelta(days=offset)).strftime("%Y%m%d")
+                            ),
+                        ),
+                    )
+                    if not cursor.fetchone()[0]:
+                        acquired = False
+                        break
+            yield acquired
+        finally:
+            # ending the session releases its advisory locks, including those of a partial acquisition
+            connection.close()
+
+    def enqueue_work(self, units: Iterable[Tuple[str, str, date]]) -> int:
+        """
+        Adds (chain, token pair, day) units to the work queue, skipping the units already queued.
+
+        Args:
+            units (Iterable[Tuple[str, str, date]]): The units to add.
+
+        Returns:
+            int: The number of units added.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> int:
+            added = extras.execute_values(
+                cursor,
+                """
+                INSERT INTO work_units (chain, token_pair, day) VALUES %s
+                ON CONFLICT (chain, token_pair, day) DO NOTHING
+                RETURNING 1;
+                """,
+                list(units),
+                page_size=self.batch_size,
+                fetch=True,
+            )
+            return len(added)
+
+        added = self.execute(operation, autocommit=False)
+        logging.info(f"Queued {added} work units.")
+        return added
+
+    def claim_work(
+        self, worker: str, lease_seconds: int, max_attempts: int
+    ) -> Optional[WorkUnit]:
+        """
+        Claims the earliest claimable work unit for a worker, for lease_seconds.
+
+        A unit is claimable when it is pending and due, or when the lease of the worker running it has
+        expired. Rows locked by concurrent claims are skipped (FOR UPDATE SKIP LOCKED), so any number of
+        workers can claim concurrently without waiting on each other or claiming the same unit. Units
+        whose lease expired after their last attempt are marked failed.
+
+        Args:
+            worker (str): The ID of the claiming worker.
+            lease_seconds (int): The lease duration; the worker must heartbeat before it expires.
+            max_attempts (int): The number of claims after which a unit is given up.
+
+        Returns:
+            Optional[WorkUnit]: The claimed unit, or None if no unit is claimable.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> Optional[tuple]:
+            cursor.execute(
+                """
+                UPDATE work_units
+                SET status = 'failed', last_error = 'lease expired', updated_at = now()
+                WHERE status = 'running' AND lease_expires_at < now()
+                    AND attempts >= %(max_attempts)s;
+                """,
+                {"max_attempts": max_attempts},
+            )
+            cursor.execute(
+                """
+                UPDATE work_units w
+                SET status = 'running', worker = %(worker)s, attempts = w.attempts + 1,
+                    lease_expires_at = now() + make_interval(secs => %(lease)s),
+                    updated_at = now()
+                FROM (
+                    SELECT chain, token_pair, day FROM work_units
+                    WHERE attempts < %(max_attempts)s
+                        AND (
+                            (status = 'pending' AND available_at <= now())
+                            OR (status = 'running' AND lease_expires_at < now())
+                        )
+                    ORDER BY day, chain, token_pair
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                ) claimable
+                WHERE (w.chain, w.token_pair, w.day)
+                    = (claimable.chain, claimable.token_pair, claimable.day)
+                RETURNING w.chain, w.token_pair, w.day, w.attempts;
+                """,
+                {
+                    "worker": worker,
+                    "lease": lease_seconds,
+                    "max_attempts": max_attempts,
+                },
+            )
+            return cursor.fetchone()
+
+        row = self.execute(operation, autocommit=False)
+        return WorkUnit(*row) if row else None
+
+    def _update_work(
+        self, unit: WorkUnit, worker: str, assignments: str, params: dict
+    ) -> bool:
+        # only the worker holding the lease may change a running unit
+        def operation(cursor: psycopg2.extensions.cursor) -> bool:
+            cursor.execute(
+                f"""
+                UPDATE work_units SET {assignments}, updated_at = now()
+                WHERE chain = %(chain)s AND token_pair = %(token_pair)s AND day = %(day)s
+                    AND status = 'running' AND worker = %(worker)s;
+                """,
+                {**unit._asdict(), "worker": worker, **params},
+            )
+            return cursor.rowcount == 1
+
+        return self.execute(operation)
+
+    def heartbeat_work(self, unit: WorkUnit, worker: str, lease_seconds: int) -> bool:
+        """
+        Extends the lease of a running work unit.
+
+        Args:
+            unit (WorkUnit): The claimed unit.
+            worker (str): The ID of the worker running it.
+            lease_seconds (int): The new lease duration, from now.
+
+        Returns:
+            bool: False if the lease was lost to another worker.
+        """
+        return self._update_work(
+            unit,
+            worker,
+            "lease_expires_at = now() + make_interval(secs => %(lease)s)",
+            {"lease": lease_seconds},
+        )
+
+    def complete_work(self, unit: WorkUnit, worker: str) -> bool:
+        """
+        Marks a running work unit as done.
+
+        Args:
+            unit (WorkUnit): The claimed unit.
+            worker (str): The ID of the worker running it.
+
+        Returns:
+            bool: False if the lease was lost to another worker.
+        """
+        return self._update_work(
+            unit,
+            worker,
+            "status = 'done', lease_expires_at = NULL, last_error = NULL",
+            {},
+        )
+
+    def fail_work(
+        self,
+        unit: WorkUnit,
+        worker: str,
+        error: str,
+        max_attempts: int,
+        retry_delay_seconds: int,
+    ) -> bool:
+        """
+        Records the failure of a running work unit, which is retried after a delay until max_attempts.
+
+        Args:
+            unit (WorkUnit): The claimed unit.
+            worker (str): The ID of the worker running it.
+            error (str): The error message.
+            max_attempts (int): The number of claims after which the unit is marked failed.
+            retry_delay_seconds (int): The delay before the unit can be claimed again.
+
+        Returns:
+            bool: False if the lease was lost to another worker.
+        """
+        return self._update_work(
+            unit,
+            worker,
+            """
+            status = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+            available_at = now() + make_interval(secs => %(delay)s),
+            lease_expires_at = NULL, last_error = %(error)s
+            """,
+            {
+                "error": error,
+                "max_attempts": max_attempts,
+                "delay": retry_delay_seconds,
+            },
+        )
+
+    def release_work(self, unit: WorkUnit, worker: str, delay_seconds: int) -> bool:
+        """
+        Hands a running work unit back to the queue without counting the attempt, e.g. when its batch is
+        locked by another run.
+
+        Args:
+            unit (WorkUnit): The claimed unit.
+            worker (str): The ID of the worker running it.
+            delay_seconds (int): The delay before the unit can be claimed again.
+
+        Returns:
+            bool: False if the lease was lost to another worker.
+        """
+        return self._update_work(
+            unit,
+            worker,
+            """
+            status = 'pending', attempts = attempts - 1, lease_expires_at = NULL,
+            available_at = now() + make_interval(secs => %(delay)s)
+            """,
+            {"delay": delay_seconds},
+        )
+
+    def work_queue_status(self) -> Dict[str, int]:
+        """
+        Counts the work units by status.
+
+        Returns:
+            Dict[str, int]: The number of 'pending', 'running', 'done' and 'failed' units.
+        """
+
+        def operation(cursor: psycopg2.extensions.cursor) -> Dict[str, int]:
+            cursor.execute("SELECT status, COUNT(*) FROM work_units GROUP BY status;")
+            return dict(cursor.fetchall())
+
+        return self.execute(operation)
+
     def truncate_table(self) -> None:
         """
         Truncates the cow_swap_trades table, removing all data.
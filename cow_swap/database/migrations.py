@@ -0,0 +1,285 @@
+import logging
+from typing import List, NamedTuple
+
+import psycopg2
+
+
+class Migration(NamedTuple):
+    """
+    A single, ordered schema change.
+
+    Attributes:
+        version (int): The schema version reached once the migration is applied.
+        description (str): A short human-readable description, stored in schema_migrations.
+        statements (str): The SQL applied, in the same transaction as the version bump.
+    """
+
+    version: int
+    description: str
+    statements: str
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "create partitioned cow_swap_trades",
+        """
+        DO $$
+        BEGIN
+            -- tables created before versioning were an unpartitioned heap without trade keys
+            IF EXISTS (
+                SELECT 1 FROM pg_class
+                WHERE relname = 'cow_swap_trades' AND relkind = 'r'
+            ) THEN
+                ALTER TABLE cow_swap_trades RENAME TO cow_swap_trades_legacy;
+            END IF;
+        END $$;
+        CREATE TABLE IF NOT EXISTS cow_swap_trades (
+            batch_id BIGINT NOT NULL,
+            tx_hash VARCHAR(66) NOT NULL,
+            evt_index INTEGER NOT NULL,
+            block_number BIGINT NOT NULL,
+            block_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            buy_price NUMERIC(18, 8),
+            buy_token VARCHAR(10) NOT NULL,
+            sell_price NUMERIC(18, 8),
+            sell_token VARCHAR(10) NOT NULL,
+            sell_token_address VARCHAR(50),
+            token_pair VARCHAR(20) NOT NULL,
+            units_sold NUMERIC(30, 10) NOT NULL,
+            block_timestamp BIGINT NOT NULL,
+            price NUMERIC(18, 8),
+            trade_price NUMERIC(18, 8),
+            price_improvement NUMERIC(18, 8),
+            PRIMARY KEY (batch_id, tx_hash, evt_index)
+        ) PARTITION BY RANGE (batch_id);
+        CREATE INDEX IF NOT EXISTS idx_cow_swap_trades_block_timestamp
+            ON cow_swap_trades USING BRIN (block_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_cow_swap_trades_token_pair
+            ON cow_swap_trades (token_pair, block_timestamp);
+        DO $$
+        DECLARE
+            month_start DATE;
+            copied BIGINT;
+        BEGIN
+            IF to_regclass('cow_swap_trades_legacy') IS NULL THEN
+                RETURN;
+            END IF;
+            FOR month_start IN
+                SELECT DISTINCT to_date((batch_id / 100)::text || '01', 'YYYYMMDD')
+                FROM cow_swap_trades_legacy
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF cow_swap_trades FOR VALUES FROM (%s) TO (%s)',
+                    'cow_swap_trades_p' || to_char(month_start, 'YYYYMM'),
+                    to_char(month_start, 'YYYYMMDD'),
+                    to_char(month_start + INTERVAL '1 month', 'YYYYMMDD')
+                );
+            END LOOP;
+            -- the legacy rows were keyed by (batch_id, block_number) and carry no transaction hash nor
+            -- log index, so the block number stands in for both
+            INSERT INTO cow_swap_trades (
+                batch_id, tx_hash, evt_index, block_number, block_time, buy_price, buy_token,
+                sell_price, sell_token, sell_token_address, token_pair, units_sold,
+                block_timestamp, price, trade_price, price_improvement
+            )
+            SELECT
+                batch_id, 'legacy:' || block_number, 0, block_number, block_time, buy_price,
+                buy_token, sell_price, sell_token, sell_token_address, token_pair, units_sold,
+                block_timestamp, price, trade_price, price_improvement
+            FROM cow_swap_trades_legacy
+            ON CONFLICT DO NOTHING;
+            GET DIAGNOSTICS copied = ROW_COUNT;
+            RAISE WARNING 'Copied % legacy trades with placeholder keys, see the Readme to replace them.',
+                copied;
+        END $$;
+        """,
+    ),
+    Migration(
+        2,
+        "create batch_improvements",
+        """
+        CREATE TABLE IF NOT EXISTS batch_improvements (
+            batch_id BIGINT PRIMARY KEY,
+            average_improvement NUMERIC(18, 8) NOT NULL
+        );
+        """,
+    ),
+    Migration(
+        3,
+        "create hourly and daily trade rollups",
+        """
+        CREATE TABLE IF NOT EXISTS trade_rollups_hourly (
+            bucket_start BIGINT NOT NULL,
+            token_pair VARCHAR(20) NOT NULL,
+            trade_count BIGINT NOT NULL,
+            improvement_sum NUMERIC(30, 8) NOT NULL,
+            volume_sum NUMERIC(38, 10) NOT NULL,
+            weighted_improvement_sum NUMERIC(38, 10) NOT NULL,
+            weighted_price_sum NUMERIC(38, 10) NOT NULL,
+            min_improvement NUMERIC(18, 8) NOT NULL,
+            max_improvement NUMERIC(18, 8) NOT NULL,
+            PRIMARY KEY (bucket_start, token_pair)
+        );
+        CREATE TABLE IF NOT EXISTS trade_rollups_daily (
+            bucket_start BIGINT NOT NULL,
+            token_pair VARCHAR(20) NOT NULL,
+            trade_count BIGINT NOT NULL,
+            improvement_sum NUMERIC(30, 8) NOT NULL,
+            volume_sum NUMERIC(38, 10) NOT NULL,
+            weighted_improvement_sum NUMERIC(38, 10) NOT NULL,
+            weighted_price_sum NUMERIC(38, 10) NOT NULL,
+            min_improvement NUMERIC(18, 8) NOT NULL,
+            max_improvement NUMERIC(18, 8) NOT NULL,
+            PRIMARY KEY (bucket_start, token_pair)
+        );
+        """,
+    ),
+    Migration(
+        4,
+        "add chain to trades and batch improvements",
+        """
+        -- a constant default is a catalog-only change, existing rows are not rewritten
+        ALTER TABLE cow_swap_trades
+            ADD COLUMN IF NOT EXISTS chain VARCHAR(16) NOT NULL DEFAULT 'ethereum';
+        CREATE INDEX IF NOT EXISTS idx_cow_swap_trades_chain
+            ON cow_swap_trades (chain, block_timestamp);
+        ALTER TABLE batch_improvements
+            ADD COLUMN IF NOT EXISTS chain VARCHAR(16) NOT NULL DEFAULT 'ethereum';
+        ALTER TABLE batch_improvements DROP CONSTRAINT IF EXISTS batch_improvements_pkey;
+        ALTER TABLE batch_improvements ADD PRIMARY KEY (chain, batch_id);
+        """,
+    ),
+    Migration(
+        5,
+        "create reference_prices",
+        """
+        -- the primary key doubles as the index of the as-of lookups of recompute_price_improvements
+        CREATE TABLE IF NOT EXISTS reference_prices (
+            token_pair VARCHAR(20) NOT NULL,
+            block_timestamp BIGINT NOT NULL,
+            price NUMERIC(18, 8) NOT NULL,
+            PRIMARY KEY (token_pair, block_timestamp)
+        );
+        """,
+    ),
+    Migration(
+        6,
+        "notify batch_completed on batch improvement writes",
+        """
+        -- NOTIFY is delivered when the writing transaction commits, and dropped if it rolls back
+        CREATE OR REPLACE FUNCTION notify_batch_completed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('batch_completed', json_build_object(
+                'batch_id', NEW.batch_id,
+                'chain', NEW.chain,
+                'average_improvement', NEW.average_improvement,
+                'row_count', (
+                    SELECT COUNT(*) FROM cow_swap_trades
+                    WHERE batch_id = NEW.batch_id AND chain = NEW.chain
+                )
+            )::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS batch_completed ON batch_improvements;
+        CREATE TRIGGER batch_completed
+            AFTER INSERT OR UPDATE ON batch_improvements
+            FOR EACH ROW EXECUTE FUNCTION notify_batch_completed();
+        """,
+    ),
+    Migration(
+        7,
+        "create work_units",
+        """
+        CREATE TABLE IF NOT EXISTS work_units (
+            chain VARCHAR(16) NOT NULL,
+            token_pair VARCHAR(20) NOT NULL,
+            day DATE NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker VARCHAR(100),
+            available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            lease_expires_at TIMESTAMP WITH TIME ZONE,
+            last_error TEXT,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (chain, token_pair, day)
+        );
+        -- only the units a worker may still claim are indexed
+        CREATE INDEX IF NOT EXISTS idx_work_units_claimable
+            ON work_units (day, chain) WHERE status IN ('pending', 'running');
+        """,
+    ),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+# the channel of the notifications sent by migration 6 for every written batch improvement
+BATCH_COMPLETED_CHANNEL = "batch_completed"
+
+# arbitrary application-wide key so concurrent deployments apply migrations one at a time
+MIGRATION_LOCK_ID = 7_268_361_001
+
+
+def get_schema_version(cursor: psycopg2.extensions.cursor) -> int:
+    """
+    Reads the current schema version without issuing any DDL.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): An open database cursor.
+
+    Returns:
+        int: The highest applied migration version, or 0 on an unversioned database.
+    """
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+    return cursor.fetchone()[0]
+
+
+def pending_migrations(current_version: int) -> List[Migration]:
+    """
+    Lists the migrations that still need to be applied, in order.
+
+    Args:
+        current_version (int): The schema version of the database.
+
+    Returns:
+        List[Migration]: The migrations with a version above current_version.
+    """
+    return [m for m in MIGRATIONS if m.version > current_version]
+
+
+def apply_migrations(cursor: psycopg2.extensions.cursor) -> int:
+    """
+    Brings the schema up to SCHEMA_VERSION. Must run inside a transaction.
+
+    An up-to-date database costs a single catalog lookup and a version read.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): An open cursor on a non-autocommit connection.
+
+    Returns:
+        int: The schema version after the migrations are applied.
+    """
+    if get_schema_version(cursor) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    cursor.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        );
+        """)
+    # another process may have migrated while we waited for the lock
+    for migration in pending_migrations(get_schema_version(cursor)):
+        cursor.execute(migration.statements)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+            (migration.version, migration.description),
+        )
+        logging.info(f"Applied migration {migration.version}: {migration.description}.")
+    return SCHEMA_VERSION
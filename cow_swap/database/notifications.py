@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import select
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+
+from cow_swap.database.migrations import BATCH_COMPLETED_CHANNEL
+
+
+class BatchEvent(NamedTuple):
+    """
+    A batch improvement committed to the database.
+
+    Attributes:
+        batch_id (int): The batch ID in the format YYYYMMDD.
+        chain (str): The chain of the batch.
+        average_improvement (Optional[float]): The average price improvement of the batch.
+        row_count (int): The number of trades stored for the batch when it was committed.
+    """
+
+    batch_id: int
+    chain: str
+    average_improvement: Optional[float]
+    row_count: int
+
+
+def parse_batch_event(payload: str) -> BatchEvent:
+    """
+    Parses the payload of a batch_completed notification.
+
+    Args:
+        payload (str): The JSON payload sent by the batch_completed trigger.
+
+    Returns:
+        BatchEvent: The committed batch.
+    """
+    document = json.loads(payload)
+    average = document.get("average_improvement")
+    return BatchEvent(
+        batch_id=int(document["batch_id"]),
+        chain=document["chain"],
+        average_improvement=None if average is None else float(average),
+        row_count=int(document["row_count"]),
+    )
+
+
+class BatchListener:
+    """
+    Waits for the batch_completed notifications that the database sends whenever a batch improvement is committed.
+
+    Notifications are only delivered to sessions listening at commit time, so events committed while no
+    listener is connected are lost; consumers that need every batch should reconcile against
+    batch_improvements on start. LISTEN is bound to a session, so the listener holds its own connection
+    instead of borrowing one from the provider pool.
+
+    Attributes:
+        connection (psycopg2.extensions.connection): The listening connection.
+        channel (str): The channel listened to.
+    """
+
+    def __init__(
+        self, channel: str = BATCH_COMPLETED_CHANNEL, **connection_params
+    ) -> None:
+        """
+        Initializes the BatchListener, connects and starts listening.
+
+        Args:
+            channel (str): The channel to listen to. Default is 'batch_completed'.
+            **connection_params: The psycopg2 connection parameters, see PostgreSQLProvider.listen.
+        """
+        self.channel = channel
+        self.connection = psycopg2.connect(**connection_params)
+        self.connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+
+    def _drain(self) -> List[BatchEvent]:
+        self.connection.poll()
+        events = []
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                events.append(parse_batch_event(notify.payload))
+            except (ValueError, KeyError, TypeError) as e:
+                logging.warning(
+                    f"Ignoring malformed notification {notify.payload!r}: {e}"
+                )
+        return events
+
+    def wait(self, timeout: Optional[float] = None) -> List[BatchEvent]:
+        """
+        Waits until at least one batch is committed, or the timeout expires.
+
+        Args:
+            timeout (Optional[float]): The maximum number of seconds to wait. Waits forever if None.
+
+        Returns:
+            List[BatchEvent]: The committed batches, in commit order, empty on timeout.
+        """
+        events = self._drain()
+        if events:
+            return events
+        readable, _, _ = select.select([self.connection], [], [], timeout)
+        return self._drain() if readable else []
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[BatchEvent]:
+        """
+        Yields the committed batches as they come.
+
+        Args:
+            timeout (Optional[float]): Stops after this many seconds without any event. Runs forever if None.
+
+        Yields:
+            BatchEvent: The next committed batch.
+        """
+        while True:
+            events = self.wait(timeout)
+            if not events:
+                return
+            yield from events
+
+    async def events_async(self) -> AsyncIterator[BatchEvent]:
+        """
+        Yields the committed batches as they come, without blocking the event loop.
+
+        The connection socket is watched by the running loop, so an application can wait on batches
+        alongside its other coroutines.
+
+        Yields:
+            BatchEvent: The next committed batch.
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[BatchEvent]" = asyncio.Queue()
+
+        def on_readable() -> None:
+            for event in self._drain():
+                queue.put_nowait(event)
+
+        loop.add_reader(self.connection, on_readable)
+        try:
+            # notifications received before the reader was registered
+            on_readable()
+            while True:
+                yield await queue.get()
+        finally:
+            loop.remove_reader(self.connection)
+
+    def close(self) -> None:
+        """
+        Stops listening and closes the connection.
+        """
+        if not self.connection.closed:
+            self.connection.close()
+
+    def __enter__(self) -> "BatchListener":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,217 @@
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+import pyarrow.parquet as pq
+
+PARTITION_SCHEMA = pa.schema([("token_pair", pa.string()), ("date", pa.string())])
+
+
+class ParquetLakeSink:
+    """
+    Exports matched trades to a Hive-partitioned Parquet dataset for columnar analytics.
+
+    Files are laid out as <root>/token_pair=<pair>/date=<YYYY-MM-DD>/part-<chain>-<batch_id>.parquet, so
+    that rewriting a batch replaces its files instead of duplicating rows, and chains ingested on the
+    same day do not overwrite each other. Frames without a 'chain' column are written to part-<batch_id>.
+
+    Attributes:
+        root (str): The root directory of the dataset.
+        row_group_size (int): The maximum number of rows per Parquet row group.
+        compression (str): The Parquet compression codec.
+    """
+
+    def __init__(
+        self, root: str, row_group_size: int = 128_000, compression: str = "zstd"
+    ) -> None:
+        """
+        Initializes the ParquetLakeSink.
+
+        Args:
+            root (str): The root directory of the dataset.
+            row_group_size (int): The maximum number of rows per Parquet row group. Default is 128000.
+            compression (str): The Parquet compression codec. Default is 'zstd'.
+        """
+        self.root = root
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    def _partition_directory(self, token_pair: str, day: str) -> str:
+        return os.path.join(
+            self.root,
+            f"token_pair={quote(str(token_pair), safe='')}",
+            f"date={day}",
+        )
+
+    def open_writer(self) -> "LakeWriter":
+        """
+        Opens a writer that appends the chunks of a run to the lake files of their batches.
+
+        Returns:
+            LakeWriter: The writer, whose files only appear once it is closed.
+        """
+        return LakeWriter(self)
+
+    def write_batch(self, matched_df: pd.DataFrame, batch_id: int) -> List[str]:
+        """
+        Writes the matched trades of a batch, one file per (token_pair, date) partition and chain.
+
+        Each file is written to a temporary name in its partition directory and renamed into place,
+        so readers never see a partially written file.
+
+        Args:
+            matched_df (pd.DataFrame): The matched trades, with 'token_pair' and 'block_timestamp' columns.
+            batch_id (int): The ID of the batch, used to name the files.
+
+        Returns:
+            List[str]: The paths of the written files.
+        """
+        writer = self.open_writer()
+        try:
+            writer.write(matched_df, batch_id)
+        except Exception:
+            writer.abort()
+            raise
+        written = writer.close()
+        logging.info(
+            f"Exported {len(matched_df)} rows of batch {batch_id} to {len(written)} lake files."
+        )
+        return written
+
+
+class LakeWriter:
+    """
+    Appends chunks of matched trades to the lake files of their batches, for runs that never hold every trade.
+
+    Each (token_pair, date, chain, batch) file keeps a Parquet writer open on a temporary name, and every
+    chunk is appended as new row groups, so only the chunk being written is held in memory. The files are
+    renamed into place on close, with the names write_batch gives them, so a run writes the same files
+    whether it is chunked or not. Chunks must come in block_timestamp order for the files to stay sorted.
+
+    Attributes:
+        sink (ParquetLakeSink): The sink whose layout and settings are used.
+        rows (int): The number of rows written so far.
+    """
+
+    def __init__(self, sink: ParquetLakeSink) -> None:
+        """
+        Initializes the LakeWriter.
+
+        Args:
+            sink (ParquetLakeSink): The sink whose layout and settings are used.
+        """
+        self.sink = sink
+        self.rows = 0
+        self._files: Dict[str, Tuple[pq.ParquetWriter, str]] = {}
+
+    def write(self, matched_df: pd.DataFrame, batch_id: int) -> None:
+        """
+        Appends matched trades of a batch to its files.
+
+        Args:
+            matched_df (pd.DataFrame): The matched trades, with 'token_pair' and 'block_timestamp' columns.
+            batch_id (int): The ID of the batch, used to name the files.
+        """
+        days = pd.to_datetime(matched_df["block_timestamp"], unit="s", utc=True)
+        chains = (
+            matched_df["chain"].astype(str)
+            if "chain" in matched_df.columns
+            else pd.Series("", index=matched_df.index)
+        )
+        groups = matched_df.groupby(
+            [
+                matched_df["token_pair"].astype(str),
+                days.dt.strftime("%Y-%m-%d"),
+                chains,
+            ],
+            sort=True,
+        )
+
+        for (token_pair, day, chain), group in groups:
+            directory = self.sink._partition_directory(token_pair, day)
+            name = f"part-{chain}-{batch_id}" if chain else f"part-{batch_id}"
+            path = os.path.join(directory, f"{name}.parquet")
+            table = pa.Table.from_pandas(
+                group.drop(columns=["token_pair"]).sort_values("block_timestamp"),
+                preserve_index=False,
+            )
+            if path not in self._files:
+                os.makedirs(directory, exist_ok=True)
+                tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}.parquet")
+                file_writer = pq.ParquetWriter(
+                    tmp_path,
+                    table.schema,
+                    compression=self.sink.compression,
+                    write_statistics=True,
+                )
+                self._files[path] = (file_writer, tmp_path)
+            file_writer, _ = self._files[path]
+            if not table.schema.equals(file_writer.schema):
+                # a column that is entirely null in a chunk is inferred with another type
+                table = table.cast(file_writer.schema)
+            file_writer.write_table(table, row_group_size=self.sink.row_group_size)
+        self.rows += len(matched_df)
+
+    def close(self) -> List[str]:
+        """
+        Finishes every file and renames it into place.
+
+        Returns:
+            List[str]: The paths of the written files.
+        """
+        written = []
+        for path, (file_writer, tmp_path) in self._files.items():
+            file_writer.close()
+            os.replace(tmp_path, path)
+            written.append(path)
+        self._files = {}
+        return written
+
+    def abort(self) -> None:
+        """
+        Discards every file, leaving the files of a previous run in place.
+        """
+        for file_writer, tmp_path in self._files.values():
+            file_writer.close()
+            os.remove(tmp_path)
+        self._files = {}
+
+
+def read_lake(
+    root: str,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+) -> pd.DataFrame:
+    """
+    Reads matched trades from the lake, pushing filters down to partitions and row groups.
+
+    Partition filters on 'token_pair' and 'date' prune whole directories; filters on other columns
+    skip row groups using their statistics. Files are memory-mapped rather than read into buffers.
+
+    Args:
+        root (str): The root directory of the dataset.
+        columns (Optional[Sequence[str]]): The columns to read. Reads every column if None.
+        filters (Optional[List[Tuple[str, str, Any]]]): Conjunctive filters such as
+            [("token_pair", "=", "USDC-WETH"), ("date", ">=", "2023-01-01")].
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+        ignore_prefixes=[".tmp-"],
+    )
+    table = dataset.to_table(
+        columns=list(columns) if columns is not None else None,
+        filter=pq.filters_to_expression(filters) if filters else None,
+    )
+    return table.to_pandas()
@@ -0,0 +1,75 @@
+import logging
+import os
+import uuid
+from typing import List, Optional
+
+import pandas as pd
+
+
+class QuarantineSink:
+    """
+    Keeps the trades rejected by the data-quality gate, for inspection and later reprocessing.
+
+    Each run writes its rejected trades in bulk to <directory>/<run_key>/rejected.parquet, with the
+    'reject_reason' of every row, replacing the file of a previous attempt of the same run.
+
+    Attributes:
+        directory (str): The root directory of the quarantine.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initializes the QuarantineSink.
+
+        Args:
+            directory (str): The root directory of the quarantine.
+        """
+        self.directory = directory
+
+    def write(self, rejected_df: pd.DataFrame, run_key: str) -> Optional[str]:
+        """
+        Writes the rejected trades of a run.
+
+        Args:
+            rejected_df (pd.DataFrame): The rejected trades, with a 'reject_reason' column.
+            run_key (str): The run the trades were rejected by.
+
+        Returns:
+            Optional[str]: The path of the written file, or None if nothing was rejected.
+        """
+        path = os.path.join(self.directory, run_key, "rejected.parquet")
+        if rejected_df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        rejected_df.to_parquet(tmp_path, compression="zstd", index=False)
+        os.replace(tmp_path, path)
+        logging.warning(f"Quarantined {len(rejected_df)} rejected trades to {path}.")
+        return path
+
+    def read(self, prefix: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Reads the rejected trades of every run under a prefix, e.g. a day and its refills.
+
+        Args:
+            prefix (str): The run key, or a prefix of run keys.
+            columns (Optional[List[str]]): The columns to read. Every column if None.
+
+        Returns:
+            pd.DataFrame: The rejected trades, empty if none was quarantined.
+        """
+        root = os.path.join(self.directory, prefix)
+        paths = sorted(
+            os.path.join(directory, "rejected.parquet")
+            for directory, _, files in os.walk(root)
+            if "rejected.parquet" in files
+        )
+        if not paths:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(
+            [pd.read_parquet(path, columns=columns) for path in paths],
+            ignore_index=True,
+        )
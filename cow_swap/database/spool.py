@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from cow_swap.chains import DEFAULT_CHAIN
+
+MANIFEST_NAME = "manifest.json"
+
+
+class LocalSpool:
+    """
+    A durable local write-ahead spool for batches that could not be loaded into PostgreSQL.
+
+    Each spooled batch lives in its own directory holding zstd-compressed Parquet segments and a
+    manifest describing them, so that a later replay can load it without refetching or recomputing.
+
+    Attributes:
+        directory (str): The root directory of the spool.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initializes the spool, creating its root directory if needed.
+
+        Args:
+            directory (str): The root directory of the spool.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # chains ingested concurrently may spool the same batch
+        self._lock = threading.Lock()
+
+    def _batch_directory(self, batch_id: int) -> str:
+        return os.path.join(self.directory, f"batch={batch_id}")
+
+    @staticmethod
+    def _write_atomically(path: str, write: Any) -> None:
+        tmp_path = f"{path}.tmp"
+        write(tmp_path)
+        with open(tmp_path, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def read_manifest(self, batch_id: int) -> Dict[str, Any]:
+        """
+        Reads the manifest of a spooled batch.
+
+        Args:
+            batch_id (int): The ID of the spooled batch.
+
+        Returns:
+            Dict[str, Any]: The manifest, with the batch ID, its average improvement per chain and its segments.
+        """
+        with open(os.path.join(self._batch_directory(batch_id), MANIFEST_NAME)) as file:
+            return json.load(file)
+
+    def spool(
+        self,
+        batch_id: int,
+        trades_df: pd.DataFrame,
+        average_improvement: float,
+        chain: str = DEFAULT_CHAIN,
+    ) -> str:
+        """
+        Persists a batch that failed to load as a new Parquet segment.
+
+        The segment is fully written before the manifest references it, so a crash never leaves a
+        manifest pointing at a partial file.
+
+        Args:
+            batch_id (int): The ID of the batch.
+            trades_df (pd.DataFrame): The matched trades of the batch.
+            average_improvement (float): The average price improvement of the batch.
+            chain (str): The chain the batch was ingested from. Default is 'ethereum'.
+
+        Returns:
+            str: The path of the written segment.
+        """
+        batch_directory = self._batch_directory(batch_id)
+        os.makedirs(batch_directory, exist_ok=True)
+        with self._lock:
+            try:
+                manifest = self.read_manifest(batch_id)
+            except FileNotFoundError:
+                manifest = {
+                    "batch_id": batch_id,
+                    "created_at": time.time(),
+                    "segments": [],
+                }
+
+            segment = f"segment-{len(manifest['segments']):05d}.parquet"
+            segment_path = os.path.join(batch_directory, segment)
+            self._write_atomically(
+                segment_path,
+                lambda path: trades_df.to_parquet(
+                    path, compression="zstd", index=False
+                ),
+            )
+
+            manifest["segments"].append({"file": segment, "rows": len(trades_df)})
+            manifest.setdefault("average_improvements", {})[chain] = average_improvement
+
+            def write_manifest(path: str) -> None:
+                with open(path, "w") as file:
+                    json.dump(manifest, file)
+
+            self._write_atomically(
+                os.path.join(batch_directory, MANIFEST_NAME), write_manifest
+            )
+        logging.warning(
+            f"Spooled {len(trades_df)} rows of batch {batch_id} to {segment_path}."
+        )
+        return segment_path
+
+    def pending_batches(self) -> List[int]:
+        """
+        Lists the spooled batches waiting to be replayed, oldest batch first.
+
+        Returns:
+            List[int]: The IDs of the batches with a manifest.
+        """
+        batch_ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith("batch=") and os.path.exists(
+                os.path.join(self.directory, name, MANIFEST_NAME)
+            ):
+                batch_ids.append(int(name[len("batch=") :]))
+        return sorted(batch_ids)
+
+    def read_batch(self, batch_id: int) -> pd.DataFrame:
+        """
+        Reads every segment of a spooled batch into a single DataFrame.
+
+        Args:
+            batch_id (int): The ID of the spooled batch.
+
+        Returns:
+            pd.DataFrame: The spooled trades, in segment order.
+        """
+        batch_directory = self._batch_directory(batch_id)
+        segments = self.read_manifest(batch_id)["segments"]
+        return pd.concat(
+            [
+                pd.read_parquet(os.path.join(batch_directory, segment["file"]))
+                for segment in segments
+            ],
+            ignore_index=True,
+        )
+
+    def replay(self, pgsql_provider: Any) -> List[int]:
+        """
+        Bulk-loads every spooled batch in order, removing each batch once it is committed.
+
+        Loading is idempotent: trades already stored are skipped by their key and the batch
+        improvement is upserted, so a replay interrupted half-way can simply be run again.
+
+        Args:
+            pgsql_provider (PostgreSQLProvider): The provider used to load the batches.
+
+        Returns:
+            List[int]: The IDs of the replayed batches.
+        """
+        replayed = []
+        for batch_id in self.pending_batches():
+            manifest = self.read_manifest(batch_id)
+            trades_df = self.read_batch(batch_id)
+            pgsql_provider.create_upcoming_partitions(batch_id)
+            pgsql_provider.insert_trade_data_batch(trades_df)
+            # manifests spooled before multi-chain support hold a single Ethereum improvement
+            improvements = manifest.get("average_improvements") or {
+                DEFAULT_CHAIN: manifest["average_improvement"]
+            }
+            for chain, average_improvement in improvements.items():
+                pgsql_provider.insert_batch_improvement(
+                    batch_id, average_improvement, chain
+                )
+            shutil.rmtree(self._batch_directory(batch_id))
+            replayed.append(batch_id)
+            logging.info(f"Replayed {len(trades_df)} spooled rows of batch {batch_id}.")
+        return replayed
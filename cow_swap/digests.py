@@ -0,0 +1,154 @@
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+
+HOUR_SECONDS = 3600
+
+# the number of hex digits of the md5 of a trade key kept by its hash, 60 bits
+KEY_HASH_DIGITS = 15
+
+
+def trade_key_hash(tx_hash: str, evt_index: int) -> int:
+    """
+    Hashes the key of a trade, the same way as TRADE_KEY_HASH_SQL and the Dune digest query.
+
+    Hashes are summed per hour, so a digest does not depend on the order of the trades and the digest
+    of a set of trades can be subtracted from another.
+
+    Args:
+        tx_hash (str): The transaction hash, '0x'-prefixed.
+        evt_index (int): The index of the trade event in the transaction.
+
+    Returns:
+        int: The first 60 bits of md5('<tx_hash>:<evt_index>'), with the hash lower-cased.
+    """
+    digest = hashlib.md5(f"{tx_hash.lower()}:{int(evt_index)}".encode()).hexdigest()
+    return int(digest[:KEY_HASH_DIGITS], 16)
+
+
+def digest_frame(rows: Iterable[Tuple[int, int, int]]) -> pd.DataFrame:
+    """
+    Builds a digest frame from (hour_start, trade_count, key_hash) rows.
+
+    Args:
+        rows (Iterable[Tuple[int, int, int]]): The digest of every hour.
+
+    Returns:
+        pd.DataFrame: The digests indexed by 'hour_start', with an int64 'trade_count' and a 'key_hash'
+        column of Python ints, whose sums cannot overflow.
+    """
+    rows = list(rows)
+    df = pd.DataFrame(
+        {
+            "hour_start": pd.Series([row[0] for row in rows], dtype="int64"),
+            "trade_count": pd.Series([row[1] for row in rows], dtype="int64"),
+            "key_hash": pd.Series([int(row[2]) for row in rows], dtype=object),
+        }
+    )
+    return df.set_index("hour_start")
+
+
+def digest_trades(trades_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes the hourly digests of a frame of trades.
+
+    Args:
+        trades_df (pd.DataFrame): Trades with 'block_timestamp', 'tx_hash' and 'evt_index' columns.
+
+    Returns:
+        pd.DataFrame: The digests, as built by digest_frame.
+    """
+    if trades_df is None or trades_df.empty:
+        return digest_frame([])
+    # a trade whose block_time could not be parsed belongs to no hour
+    trades_df = trades_df[trades_df["block_timestamp"].notna()]
+    frame = pd.DataFrame(
+        {
+            "hour_start": trades_df["block_timestamp"].to_numpy(dtype="int64")
+            // HOUR_SECONDS
+            * HOUR_SECONDS,
+            "key_hash": pd.Series(
+                [
+                    trade_key_hash(tx_hash, evt_index)
+                    for tx_hash, evt_index in zip(
+                        trades_df["tx_hash"].astype(str), trades_df["evt_index"]
+                    )
+                ],
+                dtype=object,
+            ),
+        }
+    )
+    grouped = frame.groupby("hour_start", sort=True)["key_hash"]
+    return digest_frame(
+        (int(hour), len(hashes), sum(hashes)) for hour, hashes in grouped
+    )
+
+
+def _as_dict(digests: pd.DataFrame) -> Dict[int, Tuple[int, int]]:
+    return {
+        int(hour): (int(count), int(total))
+        for hour, count, total in zip(
+            digests.index, digests["trade_count"], digests["key_hash"]
+        )
+    }
+
+
+def subtract_digests(digests: pd.DataFrame, other: pd.DataFrame) -> pd.DataFrame:
+    """
+    Removes the trades digested by other from digests, such as the quarantined trades of a day.
+
+    Args:
+        digests (pd.DataFrame): The digests to subtract from.
+        other (pd.DataFrame): The digests of a subset of the trades.
+
+    Returns:
+        pd.DataFrame: The digests of the remaining trades, without the hours left empty.
+    """
+    remaining = _as_dict(digests)
+    for hour, (count, total) in _as_dict(other).items():
+        kept_count, kept_total = remaining.get(hour, (0, 0))
+        remaining[hour] = (kept_count - count, kept_total - total)
+    return digest_frame(
+        (hour, count, total)
+        for hour, (count, total) in sorted(remaining.items())
+        if (count, total) != (0, 0)
+    )
+
+
+def mismatched_hours(expected: pd.DataFrame, stored: pd.DataFrame) -> List[int]:
+    """
+    Lists the hours whose digests differ, including the hours present on one side only.
+
+    Args:
+        expected (pd.DataFrame): The digests of the source.
+        stored (pd.DataFrame): The digests of the stored trades.
+
+    Returns:
+        List[int]: The sorted start timestamps of the mismatched hours.
+    """
+    expected, stored = _as_dict(expected), _as_dict(stored)
+    return sorted(
+        hour
+        for hour in expected.keys() | stored.keys()
+        if expected.get(hour) != stored.get(hour)
+    )
+
+
+def hour_ranges(hours: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    Merges hours into contiguous ranges, so that adjacent hours are refetched in one query.
+
+    Args:
+        hours (Iterable[int]): Hour start timestamps.
+
+    Returns:
+        List[Tuple[int, int]]: The sorted (start, exclusive end) ranges.
+    """
+    ranges: List[Tuple[int, int]] = []
+    for hour in sorted(hours):
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1] = (ranges[-1][0], hour + HOUR_SECONDS)
+        else:
+            ranges.append((hour, hour + HOUR_SECONDS))
+    return ranges
@@ -0,0 +1,128 @@
+from typing import NamedTuple, Optional
+
+# the fetched, validated and matched frames of a run, and the copy with batch IDs it is loaded from
+RESIDENT_COPIES = 4
+# a chunked run keeps its fetched and validated frames, and only running sums of its matched chunks
+STREAMED_RESIDENT_COPIES = 2
+
+
+class ExecutionPlan(NamedTuple):
+    """
+    How a run matches and loads its trades, chosen from the estimated input size and the memory budget.
+
+    Attributes:
+        strategy (str): 'in_memory', 'sharded' or 'chunked'.
+        estimated_rows (int): The estimated number of trades of the run.
+        estimate_source (str): Where the estimate comes from, e.g. 'count_query' or 'history'.
+        estimated_peak_bytes (int): The estimated peak memory of the run with this plan.
+        budget_bytes (int): The memory budget of the run.
+        chunk_rows (Optional[int]): The number of trades matched at a time, None for a single pass.
+        writer_workers (int): The number of BackgroundWriter threads, 0 to load after matching.
+        shard_workers (int): The number of processes of the sharded backend, 0 unless sharded.
+    """
+
+    strategy: str
+    estimated_rows: int
+    estimate_source: str
+    estimated_peak_bytes: int
+    budget_bytes: int
+    chunk_rows: Optional[int]
+    writer_workers: int
+    shard_workers: int
+
+    def describe(self) -> str:
+        """
+        Summarises the plan and its estimates for the run log.
+
+        Returns:
+            str: A one-line summary.
+        """
+        details = f"chunks of {self.chunk_rows} rows, " if self.chunk_rows else ""
+        return (
+            f"{self.strategy} plan for ~{self.estimated_rows} trades ({self.estimate_source}): "
+            f"{details}{self.writer_workers} writer threads, {self.shard_workers} shard processes, "
+            f"estimated peak {self.estimated_peak_bytes / 1e6:.0f} MB of a "
+            f"{self.budget_bytes / 1e6:.0f} MB budget."
+        )
+
+
+def plan_execution(
+    estimated_rows: int,
+    budget_bytes: int,
+    estimate_source: str = "count_query",
+    row_bytes: int = 400,
+    working_factor: float = 3.0,
+    min_chunk_rows: int = 10_000,
+    writer_workers: int = 2,
+    max_pending: int = 4,
+    cpu_count: int = 1,
+    min_shard_rows: int = 250_000,
+) -> ExecutionPlan:
+    """
+    Picks the execution strategy of a run from its estimated size and its memory budget.
+
+    A run matched in one pass holds RESIDENT_COPIES frames of its trades until it is loaded, plus the
+    working memory of the matching, about working_factor frames of the trades matched at once:
+
+    - 'in_memory' matches every trade in one pass, when that fits.
+    - 'sharded' also matches in one pass, on min(cpu_count, rows / min_shard_rows) processes, when the
+      run is large enough to be split and an extra copy of the trades, sent to the workers, still fits.
+    - 'chunked' otherwise streams chunks sized to fit the budget left by its STREAMED_RESIDENT_COPIES
+      frames: each matched chunk is handed to the writer and dropped while the next is matched. Up to
+      max_pending chunks queue in the writer and one per writer thread is being loaded, so they count
+      as well.
+
+    When even chunks of min_chunk_rows do not fit, the plan is chunked at min_chunk_rows and its peak
+    exceeds the budget.
+
+    Args:
+        estimated_rows (int): The estimated number of trades of the run.
+        budget_bytes (int): The memory budget of the run.
+        estimate_source (str): Where the estimate comes from, reported by the plan. Default is 'count_query'.
+        row_bytes (int): The memory used by a trade in a frame. Default is 400, see the 'matched' stage of
+            the memory report for the actual figure.
+        working_factor (float): The working memory of the matching, in frames of the matched trades.
+            Default is 3.0.
+        min_chunk_rows (int): The smallest chunk worth matching on its own. Default is 10000.
+        writer_workers (int): The number of writer threads of a chunked run. Default is 2.
+        max_pending (int): The number of chunks the writer queues. Default is 4.
+        cpu_count (int): The number of processes the sharded backend may use. Default is 1.
+        min_shard_rows (int): The minimum number of trades per shard. Default is 250000.
+
+    Returns:
+        ExecutionPlan: The chosen plan.
+    """
+    rows = max(int(estimated_rows), 0)
+    resident = rows * row_bytes * RESIDENT_COPIES
+    working = rows * row_bytes * working_factor
+
+    def plan(strategy, peak, chunk_rows=None, writers=0, shards=0) -> ExecutionPlan:
+        return ExecutionPlan(
+            strategy,
+            rows,
+            estimate_source,
+            int(peak),
+            int(budget_bytes),
+            chunk_rows,
+            writers,
+            shards,
+        )
+
+    shard_workers = min(cpu_count, rows // max(min_shard_rows, 1))
+    if shard_workers >= 2 and resident + working + rows * row_bytes <= budget_bytes:
+        return plan(
+            "sharded", resident + working + rows * row_bytes, shards=shard_workers
+        )
+    if resident + working <= budget_bytes:
+        return plan("in_memory", resident + working)
+
+    writers = max(min(writer_workers, max_pending), 1)
+    streamed = rows * row_bytes * STREAMED_RESIDENT_COPIES
+    chunk_bytes = row_bytes * (working_factor + max_pending + writers)
+    chunk_rows = max(int((budget_bytes - streamed) // chunk_bytes), min_chunk_rows)
+    return plan(
+        "chunked",
+        streamed + chunk_rows * chunk_bytes,
+        chunk_rows=chunk_rows,
+        writers=writers,
+    )
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 import logging
 
+# bump whenever the matching or improvement logic changes, to invalidate matched checkpoints
+CALCULATION_VERSION = 1
+
 
 def match_prices_with_trades(
     trades_df: pd.DataFrame, price_df: pd.DataFrame
@@ -17,8 +21,8 @@ def match_prices_with_trades(
     """
     trades_df["block_timestamp"] = trades_df["block_timestamp"].astype(int)
     merged_df = pd.merge_asof(
-        trades_df.sort_values("block_timestamp"),
-        price_df.sort_values("block_timestamp"),
+        trades_df.sort_values("block_timestamp", kind="stable"),
+        price_df.sort_values("block_timestamp", kind="stable"),
         on="block_timestamp",
         direction="backward",
     )
@@ -50,6 +54,46 @@ def calculate_trade_price(row: pd.Series) -> float:
         return None
 
 
+def _token_is(tokens: pd.Series, symbol: str) -> np.ndarray:
+    # categorical columns are compared through their few categories instead of one string per row
+    if isinstance(tokens.dtype, pd.CategoricalDtype):
+        # one extra False entry, which the -1 code of missing values indexes
+        lookup = np.append(
+            tokens.cat.categories.astype(str).str.lower() == symbol, False
+        )
+        return lookup[tokens.cat.codes.to_numpy()]
+    return (tokens.astype(str).str.lower() == symbol).to_numpy()
+
+
+def calculate_trade_prices(df: pd.DataFrame) -> pd.Series:
+    """
+    Calculates the trade price of every trade at once, with the same rules as calculate_trade_price.
+
+    Args:
+        df (pd.DataFrame): Trade data containing 'buy_token', 'sell_token', 'buy_price', and 'sell_price' columns.
+
+    Returns:
+        pd.Series: The trade prices, NaN for unexpected token combinations.
+    """
+    buy_price = df["buy_price"].to_numpy(dtype=float)
+    sell_price = df["sell_price"].to_numpy(dtype=float)
+
+    conditions = [
+        _token_is(df["buy_token"], "weth"),
+        _token_is(df["sell_token"], "weth"),
+        _token_is(df["buy_token"], "usdc"),
+        _token_is(df["sell_token"], "usdc"),
+    ]
+    with np.errstate(divide="ignore"):
+        choices = [buy_price, sell_price, 1 / buy_price, sell_price]
+    trade_prices = np.select(conditions, choices, default=np.nan)
+
+    unexpected = ~np.logical_or.reduce(conditions)
+    if unexpected.any():
+        logging.error(f"Unexpected token combination in {int(unexpected.sum())} trades")
+    return pd.Series(trade_prices, index=df.index)
+
+
 def calculate_price_improvement(matched_df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculates the price improvement for each trade by comparing the trade price to the historical price.
@@ -61,10 +105,10 @@ def calculate_price_improvement(matched_df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: The input DataFrame with additional columns for trade price and price improvement.
     """
-    matched_df["trade_price"] = matched_df.apply(calculate_trade_price, axis=1)
+    matched_df["trade_price"] = calculate_trade_prices(matched_df)
     matched_df["price_improvement"] = matched_df["trade_price"] - matched_df["price"]
 
-    matched_df.loc[matched_df["sell_token"].str.lower() == "weth", "price_improvement"] *= -1
+    matched_df.loc[_token_is(matched_df["sell_token"], "weth"), "price_improvement"] *= -1
 
     return matched_df
 
@@ -87,3 +131,47 @@ def calculate_average_price_improvement(
     logging.info(f"Average price improvement calculated: {average_improvement}")
 
     return float(average_improvement)
+
+
+def calculate_rollup_deltas(df: pd.DataFrame, bucket_seconds: int) -> pd.DataFrame:
+    """
+    Pre-aggregates trades into time buckets per token pair, ready to be merged into a rollup table.
+
+    Every column is additive (or a min / max), so the deltas of successive loads can be summed.
+
+    Args:
+        df (pd.DataFrame): Trade data with 'block_timestamp', 'token_pair', 'units_sold', 'trade_price'
+                           and 'price_improvement' columns.
+        bucket_seconds (int): The bucket width in seconds, e.g. 3600 for hourly rollups.
+
+    Returns:
+        pd.DataFrame: One row per (bucket_start, token_pair) with the trade count, improvement and volume sums,
+                      volume-weighted improvement and price sums, and the min / max improvement.
+    """
+    volume = df["units_sold"].astype(float)
+    improvement = df["price_improvement"].astype(float)
+    frame = pd.DataFrame(
+        {
+            "bucket_start": df["block_timestamp"].astype("int64")
+            // bucket_seconds
+            * bucket_seconds,
+            "token_pair": df["token_pair"],
+            "improvement": improvement,
+            "volume": volume,
+            "weighted_improvement": improvement * volume,
+            "weighted_price": df["trade_price"].astype(float) * volume,
+        }
+    )
+    return (
+        frame.groupby(["bucket_start", "token_pair"], sort=True, observed=True)
+        .agg(
+            trade_count=("improvement", "size"),
+            improvement_sum=("improvement", "sum"),
+            volume_sum=("volume", "sum"),
+            weighted_improvement_sum=("weighted_improvement", "sum"),
+            weighted_price_sum=("weighted_price", "sum"),
+            min_improvement=("improvement", "min"),
+            max_improvement=("improvement", "max"),
+        )
+        .reset_index()
+    )
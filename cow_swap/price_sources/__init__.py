@@ -0,0 +1,70 @@
+from typing import Any, Dict, Optional
+
+import requests
+
+from cow_swap.price_sources.base import PriceSource
+from cow_swap.price_sources.hedged import HedgedPriceSource, median_prices
+from cow_swap.price_sources.stored import StoredPriceSource
+from cow_swap.price_store import PriceTimeSeriesStore
+
+
+def build_price_source(
+    config: Dict[str, Any],
+    session: Optional[requests.Session] = None,
+    price_store: Optional[PriceTimeSeriesStore] = None,
+    max_concurrent_calls: int = 1,
+) -> PriceSource:
+    """
+    Builds the price source selected in the 'prices' section of the configuration.
+
+    A single listed source is used as is; several sources are composed with hedged requests.
+
+    Args:
+        config (Dict[str, Any]): The 'prices' section, with 'sources' and the HedgedPriceSource options.
+        session (Optional[requests.Session]): The HTTP session shared by the remote sources.
+        price_store (Optional[PriceTimeSeriesStore]): The store read by the 'stored' source.
+        max_concurrent_calls (int): The number of callers sharing the source, such as the chains ingested
+            concurrently. Default is 1.
+
+    Returns:
+        PriceSource: The price source.
+
+    Raises:
+        ValueError: If a source name is unknown, or 'stored' is listed without a price store.
+    """
+    # imported lazily, the API clients themselves depend on this package
+    from cow_swap.apis.api_client import CoinGeckoClient
+    from cow_swap.apis.defillama_client import DefiLlamaClient
+
+    sources = []
+    for name in config.get("sources", ["coingecko"]):
+        if name == "coingecko":
+            sources.append(CoinGeckoClient(session=session))
+        elif name == "defillama":
+            sources.append(DefiLlamaClient(session=session))
+        elif name == "stored":
+            if price_store is None:
+                raise ValueError("The 'stored' price source requires a price store.")
+            sources.append(StoredPriceSource(price_store))
+        else:
+            raise ValueError(f"Unknown price source: {name}")
+
+    if len(sources) == 1:
+        return sources[0]
+    return HedgedPriceSource(
+        sources,
+        hedge_after=config.get("hedge_after", 2.0),
+        timeout=config.get("timeout", 60.0),
+        reconcile=config.get("reconcile", "first"),
+        quorum=config.get("quorum", 2),
+        max_concurrent_calls=max_concurrent_calls,
+    )
+
+
+__all__ = [
+    "HedgedPriceSource",
+    "PriceSource",
+    "StoredPriceSource",
+    "build_price_source",
+    "median_prices",
+]
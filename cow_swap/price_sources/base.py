@@ -0,0 +1,55 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import pandas as pd
+
+
+class PriceSource(ABC):
+    """
+    A provider of historical prices for a token pair.
+
+    Every source returns the same frame layout, so sources can be swapped or composed through
+    configuration without touching the callers.
+    """
+
+    name: str
+
+    @staticmethod
+    def resolve_coin(sell_token: str, buy_token: str) -> Optional[Tuple[str, str]]:
+        """
+        Maps a token pair to the quote currency and coin ID its prices are fetched for.
+
+        Args:
+            sell_token (str): The symbol of the sell token.
+            buy_token (str): The symbol of the buy token.
+
+        Returns:
+            Optional[Tuple[str, str]]: The (vs_currency, coin_id) pair, or None if the combination is unsupported.
+        """
+        if buy_token.lower() == "weth" or sell_token.lower() == "weth":
+            return "usd", "ethereum"
+        elif buy_token.lower() == "usdc" or sell_token.lower() == "usdc":
+            return "usd", "usd"
+        return None
+
+    @abstractmethod
+    def get_historical_prices(
+        self,
+        min_block_time: float,
+        max_block_time: float,
+        sell_token: str = "weth",
+        buy_token: str = "usdc",
+    ) -> Optional[pd.DataFrame]:
+        """
+        Fetches historical prices for a token pair over a given time range.
+
+        Args:
+            min_block_time (float): The start of the time range, in UNIX timestamp format (seconds since epoch).
+            max_block_time (float): The end of the time range, in UNIX timestamp format (seconds since epoch).
+            sell_token (str): The symbol of the sell token. Default is 'weth'.
+            buy_token (str): The symbol of the buy token. Default is 'usdc'.
+
+        Returns:
+            Optional[pd.DataFrame]: A DataFrame with 'block_timestamp' and 'price' columns, or None if the
+            source has no prices for the range.
+        """
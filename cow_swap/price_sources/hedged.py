@@ -0,0 +1,167 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cow_swap.price_sources.base import PriceSource
+from cow_swap.schema import PRICE_SCHEMA, apply_schema
+
+RECONCILE_MODES = ("first", "median")
+
+
+def median_prices(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Reconciles the answers of several sources into their median price.
+
+    Sources sample prices at different times, so every answer is aligned to the timestamps of the
+    first one with a backward as-of lookup before the median is taken.
+
+    Args:
+        frames (Sequence[pd.DataFrame]): The answers, each with 'block_timestamp' and 'price' columns.
+
+    Returns:
+        pd.DataFrame: The timestamps of the first answer with the median price of all answers.
+    """
+    grid = np.sort(frames[0]["block_timestamp"].to_numpy(dtype=np.int64))
+    aligned = []
+    for df in frames:
+        df = df.sort_values("block_timestamp", kind="stable")
+        timestamps = df["block_timestamp"].to_numpy(dtype=np.int64)
+        prices = df["price"].to_numpy(dtype=np.float64)
+        indices = np.searchsorted(timestamps, grid, side="right") - 1
+        column = np.full(len(grid), np.nan)
+        column[indices >= 0] = prices[indices[indices >= 0]]
+        aligned.append(column)
+    return apply_schema(
+        pd.DataFrame(
+            {"block_timestamp": grid, "price": np.nanmedian(np.vstack(aligned), axis=0)}
+        ),
+        PRICE_SCHEMA,
+    )
+
+
+class HedgedPriceSource(PriceSource):
+    """
+    Composes several price sources with hedged requests.
+
+    The first source is called immediately. Each further source is called once the previous ones have
+    been outstanding for hedge_after seconds, or as soon as they have all failed. In 'first' mode, the
+    first non-empty answer wins; in 'median' mode, the call waits for quorum answers and returns their
+    median, so a single provider returning bad data is outvoted.
+
+    Attributes:
+        sources (List[PriceSource]): The sources, in the order they are called.
+        hedge_after (float): The latency, in seconds, after which the next source is called.
+        timeout (float): The overall deadline of a call, in seconds.
+        reconcile (str): 'first' or 'median'.
+        quorum (int): The number of answers awaited in 'median' mode.
+        max_concurrent_calls (int): The number of calls, e.g. chains ingested at once, sharing the source.
+    """
+
+    name = "hedged"
+
+    def __init__(
+        self,
+        sources: Sequence[PriceSource],
+        hedge_after: float = 2.0,
+        timeout: float = 60.0,
+        reconcile: str = "first",
+        quorum: int = 2,
+        max_concurrent_calls: int = 1,
+    ) -> None:
+        """
+        Initializes the HedgedPriceSource.
+
+        Args:
+            sources (Sequence[PriceSource]): The sources, in the order they are called.
+            hedge_after (float): The latency, in seconds, after which the next source is called. Default is 2.
+            timeout (float): The overall deadline of a call, in seconds. Default is 60.
+            reconcile (str): 'first' or 'median'. Default is 'first'.
+            quorum (int): The number of answers awaited in 'median' mode. Default is 2.
+            max_concurrent_calls (int): The number of calls made at once, e.g. by the chains ingested
+                concurrently. Default is 1.
+
+        Raises:
+            ValueError: If there is no source or the reconcile mode is unknown.
+        """
+        if not sources:
+            raise ValueError("At least one price source is required.")
+        if reconcile not in RECONCILE_MODES:
+            raise ValueError(f"Unknown reconcile mode: {reconcile}")
+        self.sources = list(sources)
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.reconcile = reconcile
+        self.quorum = min(quorum, len(self.sources)) if reconcile == "median" else 1
+        self.max_concurrent_calls = max(max_concurrent_calls, 1)
+        # slow calls keep running after a faster answer wins, so each source of each call gets its own
+        # worker, and a call is never hedged onto a source queued behind another call
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.sources) * self.max_concurrent_calls,
+            thread_name_prefix="price-source",
+        )
+
+    def get_historical_prices(
+        self,
+        min_block_time: float,
+        max_block_time: float,
+        sell_token: str = "weth",
+        buy_token: str = "usdc",
+    ) -> Optional[pd.DataFrame]:
+        deadline = time.monotonic() + self.timeout
+        waiting = list(self.sources)
+        pending: Dict[Future, str] = {}
+        answers: List[Tuple[str, pd.DataFrame]] = []
+        next_hedge = time.monotonic()
+
+        while (waiting or pending) and len(answers) < self.quorum:
+            now = time.monotonic()
+            if now >= deadline:
+                logging.warning(
+                    f"Price sources {sorted(pending.values())} did not answer within {self.timeout}s."
+                )
+                break
+            if waiting and (not pending or now >= next_hedge):
+                source = waiting.pop(0)
+                future = self._executor.submit(
+                    source.get_historical_prices,
+                    min_block_time,
+                    max_block_time,
+                    sell_token,
+                    buy_token,
+                )
+                pending[future] = source.name
+                next_hedge = now + self.hedge_after
+                continue
+
+            wake_up = min(deadline, next_hedge) if waiting else deadline
+            done, _ = wait(
+                pending, timeout=max(0.0, wake_up - now), return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    logging.error(f"Price source {name} failed: {e}")
+                    df = None
+                if df is None or df.empty:
+                    logging.warning(f"Price source {name} returned no prices.")
+                    # no reason to keep waiting before asking the next source
+                    next_hedge = time.monotonic()
+                    continue
+                answers.append((name, df))
+
+        if not answers:
+            return None
+        if len(answers) < self.quorum:
+            logging.warning(
+                f"Only {len(answers)} of {self.quorum} price sources answered, reconciling what is available."
+            )
+        logging.info(f"Prices answered by {[name for name, _ in answers]}.")
+        if len(answers) == 1:
+            return answers[0][1]
+        return median_prices([df for _, df in answers])
@@ -0,0 +1,69 @@
+import logging
+from typing import Optional
+
+import pandas as pd
+
+from cow_swap.price_sources.base import PriceSource
+from cow_swap.price_store import PriceTimeSeriesStore
+from cow_swap.schema import PRICE_SCHEMA, apply_schema
+
+
+class StoredPriceSource(PriceSource):
+    """
+    Serves prices from the local PriceTimeSeriesStore, without any network call.
+
+    The store only answers for ranges it fully covers: it must hold a price at or before the start of
+    the range, and its points must not leave a gap longer than max_gap_seconds up to the end of the
+    range. Otherwise it returns None, and a composed source falls through to a remote provider.
+
+    Attributes:
+        store (PriceTimeSeriesStore): The store prices are read from.
+        max_gap_seconds (int): The longest tolerated interval without a price, in seconds.
+    """
+
+    name = "stored"
+
+    def __init__(
+        self, store: PriceTimeSeriesStore, max_gap_seconds: int = 3600
+    ) -> None:
+        """
+        Initializes the StoredPriceSource.
+
+        Args:
+            store (PriceTimeSeriesStore): The store prices are read from.
+            max_gap_seconds (int): The longest tolerated interval without a price, in seconds. Default is 3600.
+        """
+        self.store = store
+        self.max_gap_seconds = max_gap_seconds
+
+    def get_historical_prices(
+        self,
+        min_block_time: float,
+        max_block_time: float,
+        sell_token: str = "weth",
+        buy_token: str = "usdc",
+    ) -> Optional[pd.DataFrame]:
+        coin = self.resolve_coin(sell_token, buy_token)
+        if coin is None:
+            return None
+
+        # include the last price before the range, which the as-of join matches the first trades with
+        df = self.store.range_frame(
+            coin[1], int(min_block_time) - self.max_gap_seconds, int(max_block_time)
+        )
+        timestamps = df["block_timestamp"].to_numpy()
+        covered = (
+            len(timestamps) > 0
+            and timestamps[0] <= min_block_time
+            and max_block_time - timestamps[-1] <= self.max_gap_seconds
+            and (
+                len(timestamps) < 2
+                or (timestamps[1:] - timestamps[:-1]).max() <= self.max_gap_seconds
+            )
+        )
+        if not covered:
+            logging.info(
+                f"Stored prices of {coin[1]} do not cover {min_block_time} to {max_block_time}."
+            )
+            return None
+        return apply_schema(df, PRICE_SCHEMA)
@@ -0,0 +1,198 @@
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class PriceTimeSeriesStore:
+    """
+    An append-only, memory-mapped store of price history, one pair of flat files per coin.
+
+    Each coin has a '<coin>.ts' file of sorted int64 UNIX timestamps and a '<coin>.px' file of the
+    matching float64 prices. Readers memory-map the files, so any number of processes share the
+    same pages, and lookups are binary searches over the timestamp array.
+
+    Attributes:
+        directory (str): The directory holding the price files.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initializes the store, creating its directory if needed.
+
+        Args:
+            directory (str): The directory holding the price files.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, coin: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, coin)
+        return f"{base}.ts", f"{base}.px"
+
+    @staticmethod
+    def _map(path: str, dtype: type, length: int) -> np.ndarray:
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+    def _read_arrays(self, coin: str) -> Tuple[np.ndarray, np.ndarray]:
+        ts_path, px_path = self._paths(coin)
+        try:
+            # prices are appended before timestamps, so the timestamp count bounds a consistent prefix
+            length = min(os.path.getsize(ts_path) // 8, os.path.getsize(px_path) // 8)
+        except FileNotFoundError:
+            length = 0
+        return self._map(ts_path, np.int64, length), self._map(
+            px_path, np.float64, length
+        )
+
+    def arrays(self, coin: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-maps the timestamps and prices of a coin, read-only.
+
+        A backfill replaces the two files one after the other, so the files are mapped under a shared
+        lock, which the writer takes exclusively; the maps keep the pages of the files they were made
+        from after a replacement.
+
+        Args:
+            coin (str): The coin identifier, e.g. 'ethereum'.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The sorted timestamps and their prices, empty if the coin is unknown.
+        """
+        with self._lock(coin, exclusive=False):
+            return self._read_arrays(coin)
+
+    @contextmanager
+    def _lock(self, coin: str, exclusive: bool = True) -> Iterator[None]:
+        with open(os.path.join(self.directory, f"{coin}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, coin: str, timestamps: np.ndarray, prices: np.ndarray) -> int:
+        """
+        Adds prices to the history of a coin, ignoring timestamps that are already stored.
+
+        Prices newer than the stored history are appended in place. Older prices (a backfill) are
+        merged by atomically rewriting the files, which keeps the timestamps sorted and unique.
+
+        Args:
+            coin (str): The coin identifier, e.g. 'ethereum'.
+            timestamps (np.ndarray): UNIX timestamps in seconds, in any order.
+            prices (np.ndarray): The prices at those timestamps.
+
+        Returns:
+            int: The number of new timestamps stored.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(timestamps) == 0:
+            return 0
+        # stable sort, then keep the last price given for each timestamp
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, prices = timestamps[order], prices[order]
+        last = np.append(timestamps[1:] != timestamps[:-1], True)
+        timestamps, prices = timestamps[last], prices[last]
+
+        ts_path, px_path = self._paths(coin)
+        with self._lock(coin):
+            stored_ts, stored_px = self._read_arrays(coin)
+            new = ~np.isin(timestamps, stored_ts, assume_unique=True)
+            timestamps, prices = timestamps[new], prices[new]
+            if len(timestamps) == 0:
+                return 0
+
+            if len(stored_ts) == 0 or timestamps[0] > stored_ts[-1]:
+                with open(px_path, "ab") as file:
+                    file.write(prices.tobytes())
+                with open(ts_path, "ab") as file:
+                    file.write(timestamps.tobytes())
+            else:
+                merged_ts = np.concatenate([stored_ts, timestamps])
+                merged_px = np.concatenate([stored_px, prices])
+                order = np.argsort(merged_ts, kind="stable")
+                for path, values in (
+                    (px_path, merged_px[order]),
+                    (ts_path, merged_ts[order]),
+                ):
+                    with open(f"{path}.tmp", "wb") as file:
+                        file.write(values.tobytes())
+                    os.replace(f"{path}.tmp", path)
+
+        logging.info(f"Stored {len(timestamps)} new prices for {coin}.")
+        return len(timestamps)
+
+    def lookup(self, coin: str, timestamp: int) -> Optional[float]:
+        """
+        Returns the last known price at or before a timestamp.
+
+        Args:
+            coin (str): The coin identifier, e.g. 'ethereum'.
+            timestamp (int): A UNIX timestamp in seconds.
+
+        Returns:
+            Optional[float]: The price, or None if the history starts after the timestamp.
+        """
+        timestamps, prices = self.arrays(coin)
+        index = np.searchsorted(timestamps, timestamp, side="right") - 1
+        return float(prices[index]) if index >= 0 else None
+
+    def lookup_many(self, coin: str, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Returns the last known price at or before each timestamp, in one vectorized search.
+
+        Args:
+            coin (str): The coin identifier, e.g. 'ethereum'.
+            timestamps (np.ndarray): UNIX timestamps in seconds.
+
+        Returns:
+            np.ndarray: The prices, NaN where the history starts after the timestamp.
+        """
+        stored_ts, stored_px = self.arrays(coin)
+        indices = np.searchsorted(stored_ts, timestamps, side="right") - 1
+        result = np.full(len(indices), np.nan)
+        found = indices >= 0
+        result[found] = stored_px[indices[found]]
+        return result
+
+    def range(self, coin: str, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Slices the history of a coin between two timestamps, without copying.
+
+        Args:
+            coin (str): The coin identifier, e.g. 'ethereum'.
+            start (int): The inclusive start of the range, in UNIX seconds.
+            end (int): The inclusive end of the range, in UNIX seconds.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Views of the timestamps and prices in the range.
+        """
+        timestamps, prices = self.arrays(coin)
+        lower = np.searchsorted(timestamps, start, side="left")
+        upper = np.searchsorted(timestamps, end, side="right")
+        return timestamps[lower:upper], prices[lower:upper]
+
+    def range_frame(self, coin: str, start: int, end: int) -> pd.DataFrame:
+        """
+        Returns the history of a coin between two timestamps as a price DataFrame.
+
+        Args:
+            coin (str): The coin identifier, e.g. 'ethereum'.
+            start (int): The inclusive start of the range, in UNIX seconds.
+            end (int): The inclusive end of the range, in UNIX seconds.
+
+        Returns:
+            pd.DataFrame: A DataFrame with 'block_timestamp' and 'price' columns.
+        """
+        timestamps, prices = self.range(coin, start, end)
+        return pd.DataFrame(
+            {"block_timestamp": np.array(timestamps), "price": np.array(prices)}
+        )
@@ -1,13 +1,32 @@
-from typing import Tuple
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 
 import pandas as pd
 
-from cow_swap.price_calculation import (
-    match_prices_with_trades,
-    calculate_price_improvement,
-    calculate_average_price_improvement,
+from cow_swap.backends import ComputeBackend, ShardedBackend, get_backend
+from cow_swap.apis.dune_fetcher import TRADE_QUERY_COLUMNS
+from cow_swap.chains import (
+    DEFAULT_CHAIN,
+    DEFAULT_CURRENCIES,
+    resolve_chains,
+    token_pair_name,
+    trade_query_parameters,
 )
-from cow_swap.utils import remove_nan_price_improvement, generate_batch_id
+from cow_swap.database.background_writer import BackgroundWriter
+from cow_swap.planner import ExecutionPlan, plan_execution
+from cow_swap.price_calculation import CALCULATION_VERSION
+from cow_swap.reference_prices import ReferencePriceEngine
+from cow_swap.schema import (
+    MATCHED_SCHEMA,
+    TRADE_SCHEMA,
+    apply_schema,
+    fetched_trade_schema,
+    log_memory_report,
+)
+from cow_swap.utils import remove_nan_price_improvement, generate_batch_ids
+from cow_swap.validation import validate_trades
 
 
 class NoTradesException(Exception):
@@ -22,27 +41,362 @@ class NoMatchedException(Exception):
     pass
 
 
+class BatchLockedException(Exception):
+    pass
+
+
 class Processor:
-    def __init__(self, dune_fetcher, coingecko_client, pgsql_provider, config, logger):
+    def __init__(
+        self,
+        dune_fetcher,
+        coingecko_client,
+        pgsql_provider,
+        config,
+        logger,
+        spool=None,
+        checkpoints=None,
+        lake_sink=None,
+        price_store=None,
+        quarantine=None,
+    ):
         self.dune_fetcher = dune_fetcher
         self.coingecko_client = coingecko_client
         self.pgsql_provider = pgsql_provider
         self.config = config
         self.logger = logger
+        self.spool = spool
+        self.checkpoints = checkpoints
+        self.lake_sink = lake_sink
+        self.price_store = price_store
+        self.quarantine = quarantine
+        compute = config.get("compute", {})
+        self.backend = get_backend(
+            compute.get("backend", "pandas"), compute.get("sharded")
+        )
+        # the chains of a run share the memory budget
+        self._concurrent_chains = 1
+
+    def _run_stage(
+        self,
+        run_key: str,
+        stage: str,
+        inputs: Tuple[Any, ...],
+        compute: Callable[[], Tuple[pd.DataFrame, Dict[str, Any]]],
+    ) -> Tuple[pd.DataFrame, Dict[str, Any], Optional[str]]:
+        if self.checkpoints is None:
+            df, meta = compute()
+            return df, meta, None
+        return self.checkpoints.run_stage(run_key, stage, inputs, compute)
+
+    def process(self, target_day: Optional[date] = None):
+        """
+        Runs the fetch, price, match and load stages of every configured chain for a target day.
+
+        Chains are ingested concurrently, at most ingestion.max_workers at a time, so a run lasts about as
+        long as its slowest chain. They share the database pool and the HTTP sessions of the clients.
+        A failing chain does not stop the others; the first failure is raised once every chain is done.
+
+        Args:
+            target_day (Optional[date]): The day the run is for. Defaults to the current UTC day.
+        """
+        target_day = target_day or datetime.now(timezone.utc).date()
+        chains = resolve_chains(self.config)
+        if len(chains) == 1:
+            self._concurrent_chains = 1
+            self.process_chain(chains[0], target_day)
+            return
+
+        max_workers = min(
+            len(chains),
+            self.config.get("ingestion", {}).get("max_workers", len(chains)),
+        )
+        self._concurrent_chains = max_workers
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chain"
+        ) as executor:
+            futures = {
+                chain["name"]: executor.submit(self.process_chain, chain, target_day)
+                for chain in chains
+            }
+
+        errors = []
+        for name, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                self.logger.error(f"Ingestion of chain {name} failed: {error}")
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def _start_writer(
+        self, plan: Optional[ExecutionPlan] = None
+    ) -> Optional[BackgroundWriter]:
+        writer_config = self.config.get("writer", {})
+        workers = (
+            writer_config.get("workers", 0) if plan is None else plan.writer_workers
+        )
+        if workers <= 0:
+            return None
+        return BackgroundWriter(
+            self.pgsql_provider,
+            workers=workers,
+            max_pending=writer_config.get("max_pending", 4),
+        )
+
+    def estimate_trade_rows(
+        self,
+        chain: Dict[str, Any],
+        target_day: date,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Optional[int], str]:
+        """
+        Estimates the number of trades a run will fetch, without fetching them.
+
+        With parameters and a digest query for the chain (see reconciliation.digest_queries), the hourly
+        trade counts of the window are summed, at the cost of a one-row-per-hour query. Otherwise, the
+        largest stored day of the planner.history_days days before target_day is scaled by
+        planner.history_headroom, so that a busier day than usual still fits.
+
+        Args:
+            chain (Dict[str, Any]): The chain, as returned by resolve_chains.
+            target_day (date): The day the run is for.
+            parameters (Optional[Dict[str, Any]]): The parameters of the trade query, if parameterised.
+
+        Returns:
+            Tuple[Optional[int], str]: The estimated number of trades, None if no source is available,
+            and the source of the estimate: 'count_query', 'history' or 'none'.
+        """
+        planner_config = self.config.get("planner", {})
+        digest_query = (
+            self.config.get("reconciliation", {})
+            .get("digest_queries", {})
+            .get(chain["name"])
+        )
+        if parameters is not None and digest_query is not None:
+            try:
+                digests = self.dune_fetcher.get_trade_digests(digest_query, parameters)
+                return int(digests["trade_count"].sum()), "count_query"
+            except Exception as e:
+                self.logger.warning(f"Count query {digest_query} failed: {e}")
+
+        history_days = planner_config.get("history_days", 7)
+        try:
+            counts = self.pgsql_provider.daily_trade_counts(
+                chain["name"],
+                token_pair_name(chain["currencies"]),
+                int((target_day - timedelta(days=history_days)).strftime("%Y%m%d")),
+                int((target_day - timedelta(days=1)).strftime("%Y%m%d")),
+            )
+        except Exception as e:
+            self.logger.warning(f"Could not read the recent trade counts: {e}")
+            counts = {}
+        if not counts:
+            return None, "none"
+        window_days = (
+            self.config.get("dune_api", {}).get("window_days", 1)
+            if parameters is not None
+            else 1
+        )
+        headroom = planner_config.get("history_headroom", 1.5)
+        return int(max(counts.values()) * window_days * headroom), "history"
+
+    def plan_run(
+        self,
+        chain: Dict[str, Any],
+        target_day: date,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> Optional[ExecutionPlan]:
+        """
+        Chooses how a run matches and loads its trades, from its estimated size and planner.memory_budget_mb.
 
-    def process(self):
-        query_id = self.config["dune_api"]["query_id"]
+        The budget is shared by the chains ingested concurrently. The plan overrides the writer and
+        sharded settings for the run; see planner.plan_execution.
 
-        trades_df, min_block_time, max_block_time = self.fetch_and_process_trades(
-            query_id
+        Args:
+            chain (Dict[str, Any]): The chain, as returned by resolve_chains.
+            target_day (date): The day the run is for.
+            parameters (Optional[Dict[str, Any]]): The parameters of the trade query, if parameterised.
+
+        Returns:
+            Optional[ExecutionPlan]: The plan, or None without a budget or an estimate, in which case
+            the configured settings are used.
+        """
+        planner_config = self.config.get("planner", {})
+        if not planner_config.get("memory_budget_mb"):
+            return None
+        estimated_rows, source = self.estimate_trade_rows(chain, target_day, parameters)
+        if estimated_rows is None:
+            self.logger.info(
+                f"No size estimate for {chain['name']}, running with the configured settings."
+            )
+            return None
+
+        writer_config = self.config.get("writer", {})
+        sharded_config = self.config.get("compute", {}).get("sharded") or {}
+        plan = plan_execution(
+            estimated_rows,
+            int(planner_config["memory_budget_mb"] * 1e6 / self._concurrent_chains),
+            estimate_source=source,
+            row_bytes=planner_config.get("row_bytes", 400),
+            working_factor=planner_config.get("working_factor", 3.0),
+            min_chunk_rows=planner_config.get("min_chunk_rows", 10_000),
+            writer_workers=writer_config.get("workers") or 2,
+            max_pending=writer_config.get("max_pending", 4),
+            cpu_count=sharded_config.get("workers") or os.cpu_count() or 1,
+            min_shard_rows=sharded_config.get("min_shard_rows", 250_000),
         )
-        price_df = self.fetch_historical_prices(min_block_time, max_block_time)
-        matched_df = self.match_and_process_data(trades_df, price_df)
-        average_improvement = calculate_average_price_improvement(matched_df)
-        self.save_to_database(matched_df, average_improvement)
+        self.logger.info(f"Run of {chain['name']} on {target_day}: {plan.describe()}")
+        if plan.estimated_peak_bytes > plan.budget_bytes:
+            self.logger.warning(
+                f"The run of {chain['name']} on {target_day} may exceed its memory budget."
+            )
+        return plan
+
+    def _plan_backend(self, plan: Optional[ExecutionPlan]) -> ComputeBackend:
+        if plan is None:
+            return self.backend
+        if plan.strategy != "sharded":
+            # the plan did not budget for the copies sent to worker processes
+            return (
+                get_backend("pandas")
+                if self.backend.name == "sharded"
+                else self.backend
+            )
+        options = self.config.get("compute", {}).get("sharded") or {}
+        return get_backend("sharded", {**options, "workers": plan.shard_workers})
+
+    def _close_plan_backend(self, backend: ComputeBackend) -> None:
+        # a backend built for the plan of a run starts its own process pool
+        if backend is not self.backend and isinstance(backend, ShardedBackend):
+            backend.close()
+
+    def process_chain(self, chain: Dict[str, Any], target_day: date) -> None:
+        """
+        Runs the fetch, price, match and load stages of a single chain for a target day.
+
+        With dune_api.parameterized set, the Dune query is run with the pair, tokens and the
+        dune_api.window_days days starting at target_day as parameters, and only the stored columns are
+        downloaded. Otherwise the latest results of the query are read.
+
+        With a checkpoint store, every stage output is persisted under the (query_id, target_day) run,
+        and a retried run skips the stages whose inputs did not change.
+
+        With writer.workers set, the trades are matched in chunks of writer.chunk_rows, and each chunk is
+        loaded by a BackgroundWriter while the next one is computed. A run planned as 'chunked' goes
+        through stream_to_database instead, so its matched trades are never held or checkpointed at once.
+
+        The run holds the advisory locks of the (chain, day) batches it loads throughout, every day of the
+        dune_api.window_days window for a parameterised query, so it never overlaps another run of the same
+        batches, such as a backfill worker or a reconciliation.
 
-    @staticmethod
-    def filter_weth_usdc(df: pd.DataFrame) -> pd.DataFrame:
+        Args:
+            chain (Dict[str, Any]): The chain, as returned by resolve_chains.
+            target_day (date): The day the run is for.
+
+        Raises:
+            BatchLockedException: If another run holds the lock of the batch.
+        """
+        batch_id = int(target_day.strftime("%Y%m%d"))
+        dune_config = self.config.get("dune_api", {})
+        days = (
+            dune_config.get("window_days", 1)
+            if dune_config.get("parameterized", False)
+            else 1
+        )
+        with self.pgsql_provider.batch_lock(chain["name"], batch_id, days) as acquired:
+            if not acquired:
+                raise BatchLockedException(
+                    f"Batch {batch_id} of {chain['name']}, or a later day of its window, is being "
+                    f"processed by another run."
+                )
+            self._process_locked_chain(chain, target_day)
+
+    def _process_locked_chain(self, chain: Dict[str, Any], target_day: date) -> None:
+        query_id = chain["query_id"]
+        sell_token = chain["currencies"]["currency_1"]
+        buy_token = chain["currencies"]["currency_2"]
+        run_key = f"query={query_id}/day={target_day.isoformat()}"
+        dune_config = self.config.get("dune_api", {})
+        parameters = None
+        trades_inputs: Tuple[Any, ...] = (query_id, target_day)
+        if dune_config.get("parameterized", False):
+            start_time = datetime.combine(target_day, time(), tzinfo=timezone.utc)
+            parameters = trade_query_parameters(
+                chain,
+                start_time,
+                start_time + timedelta(days=dune_config.get("window_days", 1)),
+            )
+            trades_inputs = (query_id, target_day, parameters)
+        plan = self.plan_run(chain, target_day, parameters)
+
+        def fetch_trades() -> Tuple[pd.DataFrame, Dict[str, Any]]:
+            trades_df, min_block_time, max_block_time = self.fetch_and_process_trades(
+                query_id, chain["name"], parameters, currencies=chain["currencies"]
+            )
+            return trades_df, {
+                "min_block_time": int(min_block_time),
+                "max_block_time": int(max_block_time),
+            }
+
+        trades_df, interval, trades_hash = self._run_stage(
+            run_key, "trades", trades_inputs, fetch_trades
+        )
+        min_block_time, max_block_time = (
+            interval["min_block_time"],
+            interval["max_block_time"],
+        )
+        price_df, _, prices_hash = self._run_stage(
+            run_key,
+            "prices",
+            (min_block_time, max_block_time, sell_token, buy_token),
+            lambda: (
+                self.fetch_historical_prices(
+                    min_block_time, max_block_time, sell_token, buy_token
+                ),
+                {},
+            ),
+        )
+        validation_config = self.config.get("validation", {})
+        valid_trades_df = self.validate_trades(trades_df, price_df, run_key)
+        writer = self._start_writer(plan)
+        try:
+            if plan is not None and plan.strategy == "chunked":
+                for stage, df in (("trades", trades_df), ("prices", price_df)):
+                    log_memory_report(self.logger, stage, df)
+                self.stream_to_database(
+                    valid_trades_df, price_df, writer, plan, chain["name"]
+                )
+                return
+            matched_df, _, _ = self._run_stage(
+                run_key,
+                "matched",
+                (
+                    trades_hash,
+                    prices_hash,
+                    CALCULATION_VERSION,
+                    validation_config,
+                    self.config.get("reference_price", {}),
+                ),
+                lambda: (
+                    self.match_and_process_data(
+                        valid_trades_df, price_df, writer, plan
+                    ),
+                    {},
+                ),
+            )
+            for stage, df in (
+                ("trades", trades_df),
+                ("prices", price_df),
+                ("matched", matched_df),
+            ):
+                log_memory_report(self.logger, stage, df)
+            self.save_to_database(matched_df, chain["name"], writer)
+        finally:
+            if writer is not None:
+                # stops the threads when the run failed before the writer was awaited
+                writer.close(raise_error=False)
+
+    def filter_weth_usdc(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Filter the DataFrame to only include rows where the tokens are either WETH or USDC.
         This ensures that only relevant trades involving these tokens are processed.
@@ -54,19 +408,28 @@ class Processor:
             pd.DataFrame: A filtered DataFrame containing only trades where either the 'buy_token' or 'sell_token'
                           is WETH or USDC.
         """
-        return df[
-            (df["buy_token"].str.lower().isin(["weth", "usdc"]))
-            & (df["sell_token"].str.lower().isin(["weth", "usdc"]))
-            ]
+        return self.backend.filter_tokens(df, ["weth", "usdc"])
 
     def fetch_and_process_trades(
-        self, query_id: int
+        self,
+        query_id: int,
+        chain: str = DEFAULT_CHAIN,
+        parameters: Optional[Dict[str, Any]] = None,
+        currencies: Optional[Dict[str, str]] = None,
     ) -> Tuple[pd.DataFrame, float, float]:
         """
         Fetches and processes trade data from a Dune Analytics query.
 
+        With parameters, the query filters and projects the trades at the source; the token filter
+        is still applied here, as a safety net against queries ignoring their parameters.
+
         Args:
             query_id (int): The ID of the Dune Analytics query.
+            chain (str): The chain the query reads trades from, stored in the 'chain' column. Default is 'ethereum'.
+            parameters (Optional[Dict[str, Any]]): The parameters of a parameterised query, as built by
+                trade_query_parameters. The latest results of the query are read if None.
+            currencies (Optional[Dict[str, str]]): The currencies of the chain; only trades between its
+                tokens are kept. Defaults to WETH and USDC.
 
         Returns:
             Tuple[[pd.DataFrame], [float], [float]]:
@@ -74,87 +437,361 @@ class Processor:
                 Returns (None, None, None) if an error occurs.
         """
 
-        trades_df, block_time_interval = (
-            self.dune_fetcher.get_query_results_as_dataframe(query_id)
-        )
+        if parameters is None:
+            trades_df, block_time_interval = (
+                self.dune_fetcher.get_query_results_as_dataframe(query_id)
+            )
+        else:
+            trades_df, block_time_interval = (
+                self.dune_fetcher.get_query_results_as_dataframe(
+                    query_id, parameters=parameters, columns=TRADE_QUERY_COLUMNS
+                )
+            )
         if trades_df is None:
             raise NoTradesException("No trades data fetched.")
 
-        trades_df = self.filter_weth_usdc(trades_df)
+        tokens = [
+            token.lower() for token in (currencies or DEFAULT_CURRENCIES).values()
+        ]
+        filtered_df = self.backend.filter_tokens(trades_df, tokens)
+        if parameters is not None and len(filtered_df) < len(trades_df):
+            self.logger.warning(
+                f"Query {query_id} returned {len(trades_df) - len(filtered_df)} trades outside of its "
+                f"token parameters."
+            )
+        trades_df = filtered_df.assign(chain=chain)
+        trades_df = apply_schema(trades_df, fetched_trade_schema(trades_df))
         min_block_time, max_block_time = block_time_interval
         self.logger.info(f"Block time interval: {min_block_time} to {max_block_time}")
 
         return trades_df, min_block_time, max_block_time
 
     def fetch_historical_prices(
-        self, min_block_time: float, max_block_time: float
+        self,
+        min_block_time: float,
+        max_block_time: float,
+        sell_token: str = "weth",
+        buy_token: str = "usdc",
     ) -> pd.DataFrame:
         """
-        Fetches historical prices for a default token pair over a given time range using the CoinGeckoClient.
+        Fetches historical prices for a token pair over a given time range from the configured price source.
 
         Args:
             min_block_time (float): The start of the time range, in UNIX timestamp format (seconds since epoch).
             max_block_time (float): The end of the time range, in UNIX timestamp format (seconds since epoch).
+            sell_token (str): The symbol of the sell token. Default is 'weth'.
+            buy_token (str): The symbol of the buy token. Default is 'usdc'.
 
         Returns:
             pd.DataFrame: A DataFrame containing the historical prices, or None if an error occurs.
         """
 
         price_df = self.coingecko_client.get_historical_prices(
-            min_block_time, max_block_time
+            min_block_time, max_block_time, sell_token, buy_token
         )
         if price_df is None:
             raise NoPricesException("No historical prices fetched.")
 
+        if self.price_store is not None:
+            _, coin_id = self.coingecko_client.resolve_coin(sell_token, buy_token)
+            self.price_store.append(
+                coin_id, price_df["block_timestamp"], price_df["price"]
+            )
+
         self.logger.info("Fetched historical prices done")
         return price_df
 
-    @staticmethod
+    def validate_trades(
+        self, trades_df: pd.DataFrame, price_df: pd.DataFrame, run_key: str
+    ) -> pd.DataFrame:
+        """
+        Runs the data-quality gate and quarantines the rejected trades.
+
+        Trades whose block_time could not be parsed reach the gate with a null block timestamp, and are
+        rejected under 'timestamp_out_of_bounds'.
+
+        Args:
+            trades_df (pd.DataFrame): The DataFrame containing trade data.
+            price_df (pd.DataFrame): The DataFrame containing historical price data.
+            run_key (str): The run the trades belong to, used to name the quarantine file.
+
+        Returns:
+            pd.DataFrame: The trades that passed every rule.
+
+        Raises:
+            NoTradesException: If every trade was rejected.
+        """
+        report = validate_trades(
+            trades_df, price_df, **self.config.get("validation", {})
+        )
+        for rule, count in report.counts.items():
+            if count:
+                self.logger.warning(
+                    f"Validation rule '{rule}' rejected {count} trades."
+                )
+        if self.quarantine is not None:
+            self.quarantine.write(report.rejected, run_key)
+        if report.accepted.empty:
+            raise NoTradesException("Every trade was rejected by validation.")
+        # every accepted trade has a block timestamp
+        return apply_schema(report.accepted, TRADE_SCHEMA)
+
     def match_and_process_data(
-        trades_df: pd.DataFrame, price_df: pd.DataFrame
+        self,
+        trades_df: pd.DataFrame,
+        price_df: pd.DataFrame,
+        writer: Optional[BackgroundWriter] = None,
+        plan: Optional[ExecutionPlan] = None,
     ) -> pd.DataFrame:
         """
         Matches and processes trade data with historical price data.
 
+        With a writer, the trades are processed in time-ordered chunks of writer.chunk_rows, and every
+        processed chunk is submitted to the writer before the next one is computed. Each trade is only
+        matched with prices, so the chunks add up to the same result as a single pass.
+
+        With a 'twap' or 'vwap' reference_price method, the as-of price of each trade is then replaced by
+        an average over a window around it, computed against every trade and price of the run.
+
+        With an execution plan, its chunk size and backend replace writer.chunk_rows and the configured
+        backend, and a backend built for the plan is shut down once the trades are matched.
+
         Args:
             trades_df (pd.DataFrame): The DataFrame containing trade data.
             price_df (pd.DataFrame): The DataFrame containing historical price data.
+            writer (Optional[BackgroundWriter]): The writer loading the processed chunks. Default is None.
+            plan (Optional[ExecutionPlan]): The plan of the run, see plan_run. Default is None.
 
         Returns:
             pd.DataFrame: A DataFrame containing the matched and processed data, or None if an error occurs.
         """
+        reference_prices = ReferencePriceEngine.from_config(
+            self.config.get("reference_price", {}), price_df, trades_df
+        )
+        backend = self._plan_backend(plan)
+        try:
+            if writer is None:
+                return self._match_chunk(trades_df, price_df, reference_prices, backend)
+
+            if plan is None:
+                chunk_rows = self.config.get("writer", {}).get("chunk_rows", 100_000)
+            else:
+                chunk_rows = plan.chunk_rows or max(len(trades_df), 1)
+            chunks = []
+            for chunk_df in self._matched_chunks(
+                trades_df, price_df, chunk_rows, reference_prices, backend
+            ):
+                writer.submit(
+                    chunk_df.assign(
+                        batch_id=generate_batch_ids(chunk_df["block_timestamp"])
+                    )
+                )
+                chunks.append(chunk_df)
+            return apply_schema(pd.concat(chunks, ignore_index=True), MATCHED_SCHEMA)
+        finally:
+            self._close_plan_backend(backend)
+
+    def _matched_chunks(
+        self,
+        trades_df: pd.DataFrame,
+        price_df: pd.DataFrame,
+        chunk_rows: int,
+        reference_prices: Optional[ReferencePriceEngine],
+        backend: ComputeBackend,
+    ) -> Iterator[pd.DataFrame]:
+        trades_df = trades_df.sort_values("block_timestamp", kind="stable")
+        for start in range(0, max(len(trades_df), 1), chunk_rows):
+            yield self._match_chunk(
+                trades_df.iloc[start : start + chunk_rows],
+                price_df,
+                reference_prices,
+                backend,
+            )
+
+    def stream_to_database(
+        self,
+        trades_df: pd.DataFrame,
+        price_df: pd.DataFrame,
+        writer: BackgroundWriter,
+        plan: ExecutionPlan,
+        chain: str = DEFAULT_CHAIN,
+    ) -> None:
+        """
+        Matches and loads the trades of a chunked run one chunk at a time, without keeping the matched trades.
+
+        Each chunk of plan.chunk_rows trades is matched, exported to the lake and submitted to the writer,
+        then dropped. Only the sum and count of the price improvements of every batch are kept, and the
+        averages are written once every chunk is committed, as in save_to_database.
 
-        matched_df = match_prices_with_trades(trades_df, price_df)
+        If the database fails, the chunks the writer could not load and every chunk matched afterwards are
+        kept until the end of the run, then every batch of the run is spooled once with its final average,
+        so that a replay completes the run. Chunks committed before the failure are not spooled again.
+
+        Args:
+            trades_df (pd.DataFrame): The DataFrame containing trade data.
+            price_df (pd.DataFrame): The DataFrame containing historical price data.
+            writer (BackgroundWriter): The writer loading the chunks.
+            plan (ExecutionPlan): The chunked plan of the run, see plan_run.
+            chain (str): The chain the trades were ingested from. Default is 'ethereum'.
+
+        Raises:
+            Exception: If there is an error saving data to the database and no spool is configured.
+        """
+        reference_prices = ReferencePriceEngine.from_config(
+            self.config.get("reference_price", {}), price_df, trades_df
+        )
+        backend = self._plan_backend(plan)
+        lake_writer = self.lake_sink.open_writer() if self.lake_sink else None
+        totals = pd.DataFrame(columns=["sum", "count"], dtype=float)
+        empty_df = None
+        dropped = []
+        try:
+            for chunk_df in self._matched_chunks(
+                trades_df,
+                price_df,
+                plan.chunk_rows or max(len(trades_df), 1),
+                reference_prices,
+                backend,
+            ):
+                chunk_df = chunk_df.assign(
+                    batch_id=generate_batch_ids(chunk_df["block_timestamp"])
+                )
+                empty_df = chunk_df.iloc[:0] if empty_df is None else empty_df
+                batches = chunk_df.groupby("batch_id", sort=True)
+                totals = totals.add(
+                    batches["price_improvement"].agg(["sum", "count"]), fill_value=0
+                )
+                if lake_writer is not None:
+                    for batch_id, batch_df in batches:
+                        lake_writer.write(batch_df, int(batch_id))
+                if not writer.submit(chunk_df):
+                    if self.spool is None:
+                        # the writer only drops a chunk once a load has failed, and close
+                        # raises that failure, which ends the run
+                        writer.close()
+                        raise RuntimeError("The background writer dropped a chunk.")
+                    # the database is down, the rest of the run is spooled once every
+                    # chunk is matched, with the final averages of its batches
+                    dropped.append(chunk_df)
+            if lake_writer is not None:
+                lake_writer.close()
+        except BaseException:
+            if lake_writer is not None:
+                lake_writer.abort()
+            raise
+        finally:
+            self._close_plan_backend(backend)
+
+        average_improvements = totals["sum"] / totals["count"]
+        self.logger.info(
+            f"Average price improvement per batch: {average_improvements.to_dict()}"
+        )
+        try:
+            writer.close()
+            for batch_id, average_improvement in average_improvements.items():
+                self.pgsql_provider.insert_batch_improvement(
+                    int(batch_id), float(average_improvement), chain=chain
+                )
+            self.logger.info("Data successfully saved to the database.")
+        except Exception as e:
+            self.logger.exception(f"Error saving data to the database: {e}")
+            if self.spool is None:
+                raise
+            unwritten = writer.unwritten() + dropped
+            unwritten_df = (
+                pd.concat(unwritten, ignore_index=True) if unwritten else empty_df
+            )
+            for batch_id, average_improvement in average_improvements.items():
+                # a batch whose trades are all stored only needs its average replayed
+                self.spool.spool(
+                    int(batch_id),
+                    unwritten_df[unwritten_df["batch_id"] == batch_id],
+                    float(average_improvement),
+                    chain=chain,
+                )
+
+    def _match_chunk(
+        self,
+        trades_df: pd.DataFrame,
+        price_df: pd.DataFrame,
+        reference_prices: Optional[ReferencePriceEngine] = None,
+        backend: Optional[ComputeBackend] = None,
+    ) -> pd.DataFrame:
+        matched_df = (backend or self.backend).match_and_calculate(trades_df, price_df)
 
         if matched_df is None:
             raise NoMatchedException("No matched process data")
 
-        matched_df = calculate_price_improvement(matched_df)
+        if reference_prices is not None:
+            matched_df = reference_prices.apply(matched_df)
+
         matched_df = remove_nan_price_improvement(matched_df)
 
-        return matched_df
+        return apply_schema(matched_df, MATCHED_SCHEMA)
 
     def save_to_database(
-        self, matched_df: pd.DataFrame, average_improvement: float
+        self,
+        matched_df: pd.DataFrame,
+        chain: str = DEFAULT_CHAIN,
+        writer: Optional[BackgroundWriter] = None,
     ) -> None:
         """
-        Saves the processed trade data and average price improvement to the database.
+        Saves the processed trades and the average price improvement of every day to the database.
+
+        Each trade is filed under the batch of its own UTC day, so a frame spanning midnight loads one
+        batch per day. The per-day averages and the per-day frames come from a single groupby, and the
+        trades of every day are inserted in one bulk load.
+
+        When a writer already received the trades, it is awaited instead of inserting them again, and
+        the averages are only written once every chunk is committed.
+
+        If the database is unavailable, each batch is written to the local spool instead, to be
+        replayed later, so the fetched and computed data is never lost. With a lake sink, the
+        matched trades are also exported to the Parquet lake.
 
         Args:
             matched_df (pd.DataFrame): The DataFrame containing matched and processed trade data.
-            average_improvement (float): The calculated average price improvement.
+            chain (str): The chain the trades were ingested from. Default is 'ethereum'.
+            writer (Optional[BackgroundWriter]): The writer the trades were submitted to. Default is None.
 
         Raises:
-            Exception: If there is an error saving data to the database.
+            Exception: If there is an error saving data to the database and no spool is configured.
         """
+        trades_df = matched_df.assign(
+            batch_id=generate_batch_ids(matched_df["block_timestamp"])
+        )
+        batches = trades_df.groupby("batch_id", sort=True)
+        average_improvements = batches["price_improvement"].mean()
+        self.logger.info(
+            f"Average price improvement per batch: {average_improvements.to_dict()}"
+        )
+        if self.lake_sink is not None:
+            for batch_id, batch_df in batches:
+                self.lake_sink.write_batch(batch_df, int(batch_id))
         try:
-            self.pgsql_provider.create_table_cow_swap_if_not_exists()
-            self.pgsql_provider.create_table_for_average_improvement()
-
-            trade_data_list = [row.to_dict() for _, row in matched_df.iterrows()]
-            batch_id = generate_batch_id(trade_data_list)
-            self.pgsql_provider.insert_trade_data_batch(trade_data_list)
-            self.pgsql_provider.insert_batch_improvement(batch_id, average_improvement)
+            if writer is not None and writer.submitted_rows:
+                writer.close()
+            else:
+                self.pgsql_provider.migrate()
+                # one call per month is enough, partitions are monthly
+                for batch_id in {
+                    batch_id // 100: batch_id for batch_id in average_improvements.index
+                }.values():
+                    self.pgsql_provider.create_upcoming_partitions(int(batch_id))
+                self.pgsql_provider.insert_trade_data_batch(trades_df)
+            for batch_id, average_improvement in average_improvements.items():
+                self.pgsql_provider.insert_batch_improvement(
+                    int(batch_id), float(average_improvement), chain=chain
+                )
             self.logger.info("Data successfully saved to the database.")
         except Exception as e:
             self.logger.exception(f"Error saving data to the database: {e}")
+            if self.spool is None:
+                raise
+            for batch_id, batch_df in batches:
+                self.spool.spool(
+                    int(batch_id),
+                    batch_df,
+                    float(average_improvements[batch_id]),
+                    chain=chain,
+                )
@@ -0,0 +1,68 @@
+import logging
+from typing import Any, Dict
+
+import numpy as np
+
+from cow_swap.chains import resolve_chains, token_pair_name
+from cow_swap.database.db_provider import batch_start_timestamp
+from cow_swap.price_sources.base import PriceSource
+from cow_swap.price_store import PriceTimeSeriesStore
+
+
+def recompute_history(
+    pgsql_provider: Any,
+    price_store: PriceTimeSeriesStore,
+    config: Dict[str, Any],
+    start_batch_id: int,
+    end_batch_id: int,
+) -> int:
+    """
+    Re-prices stored trades in the database, without refetching anything from Dune or the price APIs.
+
+    The local price history of every configured pair is first upserted into reference_prices, then the
+    trades, batch averages and rollups of the range are recomputed by set-based SQL, see
+    PostgreSQLProvider.recompute_price_improvements. Only the prices of the days of the range are sent,
+    plus the last one before them, which the first trades of the range are priced with.
+
+    Args:
+        pgsql_provider (PostgreSQLProvider): The provider of the database holding the trades.
+        price_store (PriceTimeSeriesStore): The local price history.
+        config (Dict[str, Any]): The loaded configuration, whose chains define the pairs.
+        start_batch_id (int): The first batch ID to recompute.
+        end_batch_id (int): The last batch ID to recompute, included.
+
+    Returns:
+        int: The number of re-priced trades.
+
+    Raises:
+        ValueError: If reference_price.method is not 'point', since the SQL only re-prices against the
+            as-of price and would overwrite the windowed improvements.
+    """
+    method = config.get("reference_price", {}).get("method", "point")
+    if method != "point":
+        raise ValueError(
+            f"Recompute only supports the point reference price, not {method!r}; "
+            "reprocess the days instead."
+        )
+    pgsql_provider.migrate()
+    start = batch_start_timestamp(start_batch_id)
+    end = batch_start_timestamp(end_batch_id) + 86400
+    pairs = {
+        token_pair_name(chain["currencies"]): chain["currencies"]
+        for chain in resolve_chains(config)
+    }
+    for token_pair, currencies in pairs.items():
+        coin = PriceSource.resolve_coin(
+            currencies["currency_1"], currencies["currency_2"]
+        )
+        if coin is None:
+            logging.warning(f"No price history known for {token_pair}, skipping.")
+            continue
+        timestamps, prices = price_store.arrays(coin[1])
+        lower = max(np.searchsorted(timestamps, start, side="right") - 1, 0)
+        upper = np.searchsorted(timestamps, end, side="left")
+        pgsql_provider.insert_reference_prices(
+            token_pair, timestamps[lower:upper], prices[lower:upper]
+        )
+
+    return pgsql_provider.recompute_price_improvements(start_batch_id, end_batch_id)
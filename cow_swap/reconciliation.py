@@ -0,0 +1,240 @@
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from cow_swap.chains import resolve_chains, token_pair_name, trade_query_parameters
+from cow_swap.database.db_provider import TRADE_COLUMNS
+from cow_swap.digests import (
+    digest_trades,
+    hour_ranges,
+    mismatched_hours,
+    subtract_digests,
+)
+from cow_swap.processor import NoTradesException, Processor
+from cow_swap.utils import generate_batch_ids
+
+
+class ReconciliationReport(NamedTuple):
+    """
+    The outcome of the reconciliation of a chain and day.
+
+    Attributes:
+        chain (str): The reconciled chain.
+        day (date): The reconciled UTC day.
+        mismatched_hours (List[int]): The start timestamps of the hours whose digests differed.
+        refilled_ranges (List[Tuple[int, int]]): The (start, exclusive end) ranges refetched and reloaded.
+        remaining_hours (List[int]): The hours still differing after the refill.
+    """
+
+    chain: str
+    day: date
+    mismatched_hours: List[int]
+    refilled_ranges: List[Tuple[int, int]]
+    remaining_hours: List[int]
+
+
+class Reconciler:
+    """
+    Verifies that the stored trades of a day match the source, and refetches only the hours that do not.
+
+    Each side is summarised by hourly digests: the number of trades and the sum of their key hashes, see
+    digests.trade_key_hash. The stored digests are computed inside PostgreSQL, and the source digests by
+    a Dune digest query, so a day that matches costs two small queries whatever its volume. Without a
+    digest query for a chain, the keys of the day are downloaded and digested locally instead. Trades
+    quarantined by validation are subtracted from the source, since they are rejected on purpose.
+
+    Mismatched hours are merged into contiguous ranges; each range is refetched, validated and matched
+    like a daily run, and replaces the stored trades of the range in one transaction. The batch average
+    and the rollups of the day are then recomputed from the stored trades.
+
+    Attributes:
+        processor (Processor): The processor whose clients and provider are used.
+        digest_queries (Dict[str, int]): The ID of the Dune digest query of each chain.
+    """
+
+    def __init__(
+        self, processor: Processor, digest_queries: Optional[Dict[str, int]] = None
+    ) -> None:
+        """
+        Initializes the Reconciler.
+
+        Args:
+            processor (Processor): The processor whose clients and provider are used.
+            digest_queries (Optional[Dict[str, int]]): The ID of the Dune digest query of each chain.
+        """
+        self.processor = processor
+        self.digest_queries = digest_queries or {}
+
+    @staticmethod
+    def _window(start: int, end: int) -> Tuple[datetime, datetime]:
+        return (
+            datetime.fromtimestamp(start, timezone.utc),
+            datetime.fromtimestamp(end, timezone.utc),
+        )
+
+    def _run_key(self, chain: Dict[str, Any], day: date) -> str:
+        return f"query={chain['query_id']}/day={day.isoformat()}"
+
+    def source_digests(self, chain: Dict[str, Any], day: date) -> pd.DataFrame:
+        """
+        Computes the hourly digests of the source trades of a day, minus the quarantined trades.
+
+        Args:
+            chain (Dict[str, Any]): The chain, as returned by resolve_chains.
+            day (date): The UTC day.
+
+        Returns:
+            pd.DataFrame: The digests the stored trades should have.
+        """
+        start = datetime.combine(day, time(), tzinfo=timezone.utc)
+        parameters = trade_query_parameters(chain, start, start + timedelta(days=1))
+        digest_query = self.digest_queries.get(chain["name"])
+        if digest_query is not None:
+            digests = self.processor.dune_fetcher.get_trade_digests(
+                digest_query, parameters
+            )
+        else:
+            try:
+                trades_df, _, _ = self.processor.fetch_and_process_trades(
+                    chain["query_id"],
+                    chain["name"],
+                    parameters,
+                    currencies=chain["currencies"],
+                )
+            except NoTradesException:
+                trades_df = None
+            digests = digest_trades(trades_df)
+
+        if self.processor.quarantine is not None:
+            rejected = self.processor.quarantine.read(
+                self._run_key(chain, day),
+                columns=["block_timestamp", "tx_hash", "evt_index"],
+            )
+            # a trade rejected by the daily run and by a refill is only subtracted once
+            rejected = rejected.drop_duplicates(["tx_hash", "evt_index"])
+            digests = subtract_digests(digests, digest_trades(rejected))
+        return digests
+
+    def _refill(self, chain: Dict[str, Any], day: date, start: int, end: int) -> None:
+        processor = self.processor
+        parameters = trade_query_parameters(chain, *self._window(start, end))
+        try:
+            trades_df, min_block_time, max_block_time = (
+                processor.fetch_and_process_trades(
+                    chain["query_id"],
+                    chain["name"],
+                    parameters,
+                    currencies=chain["currencies"],
+                )
+            )
+            price_df = processor.fetch_historical_prices(
+                min_block_time,
+                max_block_time,
+                chain["currencies"]["currency_1"],
+                chain["currencies"]["currency_2"],
+            )
+            valid_trades_df = processor.validate_trades(
+                trades_df, price_df, f"{self._run_key(chain, day)}/refill={start}"
+            )
+            matched_df = processor.match_and_process_data(valid_trades_df, price_df)
+            matched_df = matched_df.assign(
+                batch_id=generate_batch_ids(matched_df["block_timestamp"])
+            )
+        except NoTradesException:
+            # the source holds no trade to keep in the range, the stored ones are removed
+            matched_df = pd.DataFrame(columns=TRADE_COLUMNS)
+
+        processor.pgsql_provider.replace_trades(
+            matched_df,
+            chain["name"],
+            token_pair_name(chain["currencies"]),
+            start,
+            end,
+        )
+
+    def reconcile_day(
+        self, chain: Dict[str, Any], day: date, refill: bool = True
+    ) -> ReconciliationReport:
+        """
+        Compares the stored trades of a chain and day with the source, and refills the mismatched hours.
+
+        The refill holds the advisory lock of the batch, so it never overlaps a run of the same day.
+
+        Args:
+            chain (Dict[str, Any]): The chain, as returned by resolve_chains.
+            day (date): The UTC day.
+            refill (bool): Whether to refetch and reload the mismatched hours. Default is True.
+
+        Returns:
+            ReconciliationReport: The mismatched, refilled and remaining hours.
+        """
+        provider = self.processor.pgsql_provider
+        batch_id = int(day.strftime("%Y%m%d"))
+        token_pair = token_pair_name(chain["currencies"])
+
+        expected = self.source_digests(chain, day)
+        mismatched = mismatched_hours(
+            expected, provider.trade_digests(batch_id, chain["name"], token_pair)
+        )
+        if not mismatched or not refill:
+            return ReconciliationReport(chain["name"], day, mismatched, [], mismatched)
+
+        ranges = hour_ranges(mismatched)
+        with provider.batch_lock(chain["name"], batch_id) as acquired:
+            if not acquired:
+                logging.warning(
+                    f"Batch {batch_id} of {chain['name']} is locked by another run, not refilled."
+                )
+                return ReconciliationReport(
+                    chain["name"], day, mismatched, [], mismatched
+                )
+            # a day missing from the database may belong to a month without a partition yet
+            provider.create_upcoming_partitions(batch_id)
+            for start, end in ranges:
+                self._refill(chain, day, start, end)
+            provider.refresh_batch_improvements(batch_id, batch_id)
+            day_start = ranges[0][0] // 86400 * 86400
+            provider.rebuild_rollups(day_start, day_start + 86400)
+
+        # the refills may have quarantined more trades
+        remaining = mismatched_hours(
+            self.source_digests(chain, day),
+            provider.trade_digests(batch_id, chain["name"], token_pair),
+        )
+        logging.info(
+            f"Reconciled {chain['name']} on {day}: {len(mismatched)} mismatched hours refilled in "
+            f"{len(ranges)} ranges, {len(remaining)} still mismatched."
+        )
+        return ReconciliationReport(chain["name"], day, mismatched, ranges, remaining)
+
+    def reconcile(
+        self, start_day: date, end_day: date, refill: bool = True
+    ) -> List[ReconciliationReport]:
+        """
+        Reconciles every configured chain over a range of days.
+
+        Args:
+            start_day (date): The first day.
+            end_day (date): The last day, included.
+            refill (bool): Whether to refetch and reload the mismatched hours. Default is True.
+
+        Returns:
+            List[ReconciliationReport]: One report per chain and day.
+
+        Raises:
+            ValueError: If the Dune queries are not parameterised, since only those can fetch an hour range.
+        """
+        if not self.processor.config.get("dune_api", {}).get("parameterized", False):
+            raise ValueError(
+                "Reconciliation needs dune_api.parameterized to fetch hours."
+            )
+        self.processor.pgsql_provider.migrate()
+        reports = []
+        day = start_day
+        while day <= end_day:
+            for chain in resolve_chains(self.processor.config):
+                reports.append(self.reconcile_day(chain, day, refill))
+            day += timedelta(days=1)
+        return reports
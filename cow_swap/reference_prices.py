@@ -0,0 +1,286 @@
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cow_swap.price_calculation import (
+    _token_is,
+    calculate_price_improvement,
+    calculate_trade_prices,
+)
+
+REFERENCE_METHODS = ("point", "twap", "vwap")
+
+
+def _point_prices(
+    timestamps: np.ndarray, prices: np.ndarray, query: np.ndarray
+) -> np.ndarray:
+    # the backward as-of match of match_prices_with_trades
+    indices = np.searchsorted(timestamps, query, side="right") - 1
+    matched = np.full(len(query), np.nan)
+    matched[indices >= 0] = prices[indices[indices >= 0]]
+    return matched
+
+
+def time_weighted_prices(
+    timestamps: np.ndarray,
+    prices: np.ndarray,
+    query: np.ndarray,
+    window_before: int,
+    window_after: int,
+) -> np.ndarray:
+    """
+    Computes the time-weighted average price over a window around each query timestamp.
+
+    Each price holds from its timestamp until the next one, as in the backward as-of match, and the last
+    price holds after the end of the series. The integral of that step function is precomputed as a prefix
+    sum at every price timestamp, so each average costs two binary searches whatever the window width.
+    Windows starting before the first price are averaged over the part the series covers.
+
+    Args:
+        timestamps (np.ndarray): The sorted price timestamps, in UNIX seconds.
+        prices (np.ndarray): The prices, aligned with timestamps.
+        query (np.ndarray): The timestamps to average around, in any order.
+        window_before (int): The number of seconds of the window before each query timestamp.
+        window_after (int): The number of seconds of the window after each query timestamp.
+
+    Returns:
+        np.ndarray: The average prices, NaN where the window ends before the first price. With an empty
+        window, the as-of price.
+    """
+    query = np.asarray(query, dtype=np.int64)
+    if len(timestamps) == 0:
+        return np.full(len(query), np.nan)
+    if window_before + window_after <= 0:
+        return _point_prices(timestamps, prices, query)
+
+    # offsets from the first price keep the prefix sums small enough for float64
+    offsets = (np.asarray(timestamps, dtype=np.int64) - timestamps[0]).astype(
+        np.float64
+    )
+    prices = np.asarray(prices, dtype=np.float64)
+    cumulative = np.concatenate(([0.0], np.cumsum(prices[:-1] * np.diff(offsets))))
+
+    def integral(points: np.ndarray) -> np.ndarray:
+        indices = np.searchsorted(offsets, points, side="right") - 1
+        return cumulative[indices] + prices[indices] * (points - offsets[indices])
+
+    points = (query - timestamps[0]).astype(np.float64)
+    start = np.maximum(points - window_before, 0.0)
+    end = np.maximum(points + window_after, 0.0)
+    covered = end > start
+    start, end = start[covered], end[covered]
+    averages = np.full(len(query), np.nan)
+    averages[covered] = (integral(end) - integral(start)) / (end - start)
+    return averages
+
+
+def trade_volumes(
+    trades_df: pd.DataFrame, trade_price: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Converts the sold amount of each trade into WETH, the unit the reference price is quoted for.
+
+    Args:
+        trades_df (pd.DataFrame): Trade data with 'units_sold', 'sell_token', 'buy_token', 'buy_price' and
+            'sell_price' columns.
+        trade_price (Optional[np.ndarray]): The trade prices, if already computed.
+
+    Returns:
+        np.ndarray: The WETH volumes, 0 for trades whose volume is unknown.
+    """
+    units = trades_df["units_sold"].to_numpy(dtype=np.float64)
+    if trade_price is None:
+        trade_price = calculate_trade_prices(trades_df).to_numpy(dtype=np.float64)
+    sells_weth = _token_is(trades_df["sell_token"], "weth")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volumes = np.where(sells_weth, units, units / trade_price)
+    volumes[~np.isfinite(volumes) | (volumes < 0)] = 0.0
+    return volumes
+
+
+class ReferencePriceEngine:
+    """
+    Replaces the as-of reference price of each trade by an average over a window around its block timestamp.
+
+    'twap' averages the price series over time. 'vwap' averages the prices of the trades of the window,
+    weighted by their WETH volume and excluding the priced trade itself by default. Trades without any
+    other trade in their window fall back to the time-weighted average. Both are computed from prefix
+    sums over arrays sorted once, so pricing a trade costs a few binary searches, and chunks of trades
+    can be priced separately against the whole day.
+
+    Attributes:
+        method (str): 'twap' or 'vwap'.
+        window_before (int): The number of seconds of the window before each trade.
+        window_after (int): The number of seconds of the window after each trade.
+        exclude_self (bool): Whether a trade is left out of its own volume-weighted average.
+    """
+
+    def __init__(
+        self,
+        price_df: pd.DataFrame,
+        method: str = "twap",
+        window_before: int = 300,
+        window_after: int = 300,
+        trades_df: Optional[pd.DataFrame] = None,
+        exclude_self: bool = True,
+    ) -> None:
+        """
+        Initializes the ReferencePriceEngine and precomputes its prefix sums.
+
+        Args:
+            price_df (pd.DataFrame): Price data with 'block_timestamp' and 'price' columns.
+            method (str): 'twap' or 'vwap'. Default is 'twap'.
+            window_before (int): The number of seconds of the window before each trade. Default is 300.
+            window_after (int): The number of seconds of the window after each trade. Default is 300.
+            trades_df (Optional[pd.DataFrame]): Every trade of the run, required by 'vwap'.
+            exclude_self (bool): Whether a trade is left out of its own volume-weighted average. Default is True.
+
+        Raises:
+            ValueError: If the method is unknown, or 'vwap' is requested without trades.
+        """
+        if method not in ("twap", "vwap"):
+            raise ValueError(f"Unknown reference price method: {method}")
+        if method == "vwap" and trades_df is None:
+            raise ValueError("The vwap reference price needs the trades of the run.")
+        self.method = method
+        self.window_before = window_before
+        self.window_after = window_after
+        self.exclude_self = exclude_self
+
+        prices = price_df.sort_values("block_timestamp", kind="stable")
+        self._price_timestamps = prices["block_timestamp"].to_numpy(dtype=np.int64)
+        self._prices = prices["price"].to_numpy(dtype=np.float64)
+
+        if method == "vwap":
+            timestamps = trades_df["block_timestamp"].to_numpy(dtype=np.int64)
+            volumes, weighted = self._volume_terms(trades_df)
+            if len(timestamps) and not (np.diff(timestamps) >= 0).all():
+                order = np.argsort(timestamps, kind="stable")
+                timestamps, volumes, weighted = (
+                    timestamps[order],
+                    volumes[order],
+                    weighted[order],
+                )
+            self._trade_timestamps = timestamps
+            self._cumulative_volume = np.concatenate(([0.0], np.cumsum(volumes)))
+            self._cumulative_weighted = np.concatenate(([0.0], np.cumsum(weighted)))
+            self._cumulative_count = np.concatenate(
+                ([0], np.cumsum(volumes > 0, dtype=np.int64))
+            )
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+        price_df: pd.DataFrame,
+        trades_df: pd.DataFrame,
+    ) -> Optional["ReferencePriceEngine"]:
+        """
+        Builds the engine of the reference_price section of the configuration.
+
+        Args:
+            config (Dict[str, Any]): The reference_price section.
+            price_df (pd.DataFrame): Price data with 'block_timestamp' and 'price' columns.
+            trades_df (pd.DataFrame): Every trade of the run.
+
+        Returns:
+            Optional[ReferencePriceEngine]: The engine, or None for the default 'point' method.
+
+        Raises:
+            ValueError: If the method is unknown.
+        """
+        method = config.get("method", "point")
+        if method not in REFERENCE_METHODS:
+            raise ValueError(f"Unknown reference price method: {method}")
+        if method == "point":
+            return None
+        return cls(
+            price_df,
+            method=method,
+            window_before=config.get("window_before", 300),
+            window_after=config.get("window_after", 300),
+            trades_df=trades_df,
+            exclude_self=config.get("exclude_self", True),
+        )
+
+    @staticmethod
+    def _volume_terms(trades_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        trade_price = calculate_trade_prices(trades_df).to_numpy(dtype=np.float64)
+        volumes = trade_volumes(trades_df, trade_price)
+        volumes[np.isnan(trade_price)] = 0.0
+        return volumes, np.nan_to_num(trade_price) * volumes
+
+    def reference_prices(self, trades_df: pd.DataFrame) -> np.ndarray:
+        """
+        Computes the reference price of each trade.
+
+        Args:
+            trades_df (pd.DataFrame): Trades with a 'block_timestamp' column, plus the columns of trade_volumes
+                for 'vwap'. With 'vwap', they must be part of the trades the engine was built with.
+
+        Returns:
+            np.ndarray: The reference prices, aligned with the trades.
+        """
+        timestamps = trades_df["block_timestamp"].to_numpy(dtype=np.int64)
+        own_volume, own_weighted = (
+            self._volume_terms(trades_df)
+            if self.method == "vwap" and self.exclude_self
+            else (np.zeros(len(timestamps)), np.zeros(len(timestamps)))
+        )
+        # binary searches over sorted queries walk the arrays in order, far faster than random probes
+        order = None
+        if len(timestamps) and not (np.diff(timestamps) >= 0).all():
+            order = np.argsort(timestamps, kind="stable")
+            timestamps = timestamps[order]
+            own_volume, own_weighted = own_volume[order], own_weighted[order]
+
+        references = self._sorted_reference_prices(timestamps, own_volume, own_weighted)
+        if order is None:
+            return references
+        result = np.empty_like(references)
+        result[order] = references
+        return result
+
+    def _sorted_reference_prices(
+        self, timestamps: np.ndarray, own_volume: np.ndarray, own_weighted: np.ndarray
+    ) -> np.ndarray:
+        twap = time_weighted_prices(
+            self._price_timestamps,
+            self._prices,
+            timestamps,
+            self.window_before,
+            self.window_after,
+        )
+        if self.method == "twap":
+            return twap
+
+        lower = np.searchsorted(
+            self._trade_timestamps, timestamps - self.window_before, side="left"
+        )
+        upper = np.searchsorted(
+            self._trade_timestamps, timestamps + self.window_after, side="right"
+        )
+        volume = self._cumulative_volume[upper] - self._cumulative_volume[lower]
+        volume -= own_volume
+        weighted = self._cumulative_weighted[upper] - self._cumulative_weighted[lower]
+        weighted -= own_weighted
+        count = self._cumulative_count[upper] - self._cumulative_count[lower]
+        count -= own_volume > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vwap = weighted / volume
+        # the count guards against the rounding left by subtracting a trade from its own window
+        return np.where(count > 0, vwap, twap)
+
+    def apply(self, matched_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Replaces the 'price' of matched trades by their reference price and recomputes their improvement.
+
+        Args:
+            matched_df (pd.DataFrame): The output of ComputeBackend.match_and_calculate.
+
+        Returns:
+            pd.DataFrame: The trades with the new 'price', 'trade_price' and 'price_improvement' columns.
+        """
+        matched_df = matched_df.assign(price=self.reference_prices(matched_df))
+        return calculate_price_improvement(matched_df)
@@ -0,0 +1,128 @@
+import logging
+import sys
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Tokens, pairs and addresses only take a handful of distinct values per run, so they are stored
+# as categoricals (one small integer code per row) instead of one Python string per row.
+TRADE_SCHEMA: Dict[str, str] = {
+    "chain": "category",
+    "block_number": "int64",
+    "evt_index": "int64",
+    "sell_token_address": "category",
+    "sell_token": "category",
+    "buy_token": "category",
+    "token_pair": "category",
+    "buy_price": "float64",
+    "sell_price": "float64",
+    "units_sold": "float64",
+    "block_timestamp": "int64",
+}
+
+# fetched trades keep the rows whose block_time could not be parsed, with a null block timestamp, until
+# the validation gate rejects them
+FETCHED_TRADE_SCHEMA: Dict[str, str] = {**TRADE_SCHEMA, "block_timestamp": "Int64"}
+
+PRICE_SCHEMA: Dict[str, str] = {
+    "block_timestamp": "int64",
+    "price": "float64",
+}
+
+MATCHED_SCHEMA: Dict[str, str] = {
+    **TRADE_SCHEMA,
+    "batch_id": "int64",
+    "price": "float64",
+    "trade_price": "float64",
+    "price_improvement": "float64",
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Casts the columns of a DataFrame to the dtypes of a schema.
+
+    Columns missing from the DataFrame are ignored, and columns already of the right dtype are not copied.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to cast.
+        schema (Dict[str, str]): A mapping of column names to dtypes.
+
+    Returns:
+        pd.DataFrame: The DataFrame with the schema dtypes applied.
+    """
+    casts = {
+        column: dtype
+        for column, dtype in schema.items()
+        if column in df.columns and df[column].dtype != dtype
+    }
+    if not casts:
+        return df
+    return df.astype(casts)
+
+
+def fetched_trade_schema(trades_df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Returns the schema of fetched trades, with a nullable block timestamp if some are missing.
+
+    Args:
+        trades_df (pd.DataFrame): The fetched trades.
+
+    Returns:
+        Dict[str, str]: FETCHED_TRADE_SCHEMA if a block timestamp is null, TRADE_SCHEMA otherwise.
+    """
+    if (
+        "block_timestamp" in trades_df.columns
+        and trades_df["block_timestamp"].isna().any()
+    ):
+        return FETCHED_TRADE_SCHEMA
+    return TRADE_SCHEMA
+
+
+def _object_layout_bytes(column: pd.Series) -> int:
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return int(column.memory_usage(index=False, deep=True))
+    # what the column costs as one pointer plus one string object per row
+    category_sizes = np.array(
+        [sys.getsizeof(value) for value in column.cat.categories], dtype=np.int64
+    )
+    codes = column.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(category_sizes))
+    return int(8 * len(column) + counts @ category_sizes)
+
+
+def memory_report(df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Measures the memory used by a DataFrame and what it would use with object string columns.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to measure.
+
+    Returns:
+        Dict[str, int]: The 'bytes' currently used and the 'object_layout_bytes' of the same data
+        with every categorical column stored as Python strings.
+    """
+    return {
+        "bytes": int(df.memory_usage(index=False, deep=True).sum()),
+        "object_layout_bytes": sum(
+            _object_layout_bytes(df[column]) for column in df.columns
+        ),
+    }
+
+
+def log_memory_report(logger: logging.Logger, stage: str, df: pd.DataFrame) -> None:
+    """
+    Logs the memory report of a stage output.
+
+    Args:
+        logger (logging.Logger): The logger to write to.
+        stage (str): The name of the stage.
+        df (pd.DataFrame): The stage output.
+    """
+    report = memory_report(df)
+    saved = report["object_layout_bytes"] - report["bytes"]
+    logger.info(
+        f"Stage '{stage}': {len(df)} rows, {report['bytes'] / 1e6:.2f} MB "
+        f"({saved / 1e6:.2f} MB saved by the compact dtype layout)."
+    )
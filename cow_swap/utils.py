@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import logging
 import yaml
@@ -42,6 +43,22 @@ def convert_to_unix_timestamp(date_str: str) -> Optional[float]:
         return None
 
 
+def convert_to_unix_timestamps(date_strs: pd.Series) -> pd.Series:
+    """
+    Converts a column of date strings to UNIX timestamps in seconds, in a single vectorized pass.
+
+    Args:
+        date_strs (pd.Series): The date strings to convert, formatted as '%Y-%m-%d %H:%M:%S.%f UTC'.
+
+    Returns:
+        pd.Series: The UNIX timestamps in seconds, NaN where a date string could not be parsed.
+    """
+    dt = pd.to_datetime(
+        date_strs, format="%Y-%m-%d %H:%M:%S.%f UTC", utc=True, errors="coerce"
+    )
+    return (dt - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+
+
 def remove_nan_price_improvement(df: pd.DataFrame) -> pd.DataFrame:
     """
     Removes rows from a DataFrame where the 'price_improvement' column contains NaN values.
@@ -79,3 +96,28 @@ def generate_batch_id(
         trade_data["batch_id"] = batch_id
 
     return batch_id
+
+
+def generate_batch_ids(block_timestamps: pd.Series) -> pd.Series:
+    """
+    Derives the batch ID of every trade from its block timestamp, in a single vectorized pass.
+
+    Unlike generate_batch_id, each row gets the UTC day it belongs to, so a frame spanning midnight
+    is split into one batch per day.
+
+    Args:
+        block_timestamps (pd.Series): The UNIX block timestamps in seconds.
+
+    Returns:
+        pd.Series: The batch IDs in the format YYYYMMDD, aligned with the input.
+    """
+    days = block_timestamps.to_numpy(dtype=np.int64) // 86400
+    if len(days) == 0:
+        return pd.Series(days, index=block_timestamps.index, name="batch_id")
+    # a frame covers few days, so the date is formatted once per day and looked up by offset
+    first_day = days.min()
+    dates = pd.to_datetime(np.arange(first_day, days.max() + 1), unit="D")
+    lookup = (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy(np.int64)
+    return pd.Series(
+        lookup[days - first_day], index=block_timestamps.index, name="batch_id"
+    )
@@ -0,0 +1,110 @@
+import logging
+import time
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from cow_swap.price_calculation import calculate_trade_prices
+
+# rules are listed by precedence: a rejected row is tagged with the first rule it violates
+VALIDATION_RULES = (
+    "null_price",
+    "non_positive_price",
+    "timestamp_out_of_bounds",
+    "missing_reference_price",
+    "stale_reference_price",
+    "unsupported_pair",
+    "implausible_price_ratio",
+)
+
+
+class ValidationReport(NamedTuple):
+    """
+    The outcome of the data-quality gate.
+
+    Attributes:
+        accepted (pd.DataFrame): The trades that passed every rule.
+        rejected (pd.DataFrame): The other trades, with a 'reject_reason' column naming their first violated rule.
+        counts (Dict[str, int]): The number of trades violating each rule. A trade may count towards several rules.
+    """
+
+    accepted: pd.DataFrame
+    rejected: pd.DataFrame
+    counts: Dict[str, int]
+
+
+def validate_trades(
+    trades_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    max_staleness_seconds: int = 3600,
+    max_price_deviation: float = 0.5,
+    min_timestamp: Optional[int] = None,
+    max_future_seconds: int = 300,
+) -> ValidationReport:
+    """
+    Checks every trade against the data-quality rules in a single vectorized pass, before matching.
+
+    The reference price of a trade is the last price at or before its block timestamp, the one the
+    as-of join will match it with, found by a binary search over the sorted price timestamps.
+
+    Args:
+        trades_df (pd.DataFrame): Trade data with 'block_timestamp', 'buy_token', 'sell_token', 'buy_price'
+            and 'sell_price' columns.
+        price_df (pd.DataFrame): Price data with 'block_timestamp' and 'price' columns.
+        max_staleness_seconds (int): The maximum age of the reference price, in seconds. Default is 3600.
+        max_price_deviation (float): The maximum relative difference between the trade price and the reference
+            price. Default is 0.5.
+        min_timestamp (Optional[int]): The earliest accepted block timestamp. Unbounded if None.
+        max_future_seconds (int): How far past the current time a block timestamp may be, in seconds. Default is 300.
+
+    Returns:
+        ValidationReport: The accepted and rejected trades, and the per-rule counts.
+    """
+    buy_price = trades_df["buy_price"].to_numpy(dtype=np.float64)
+    sell_price = trades_df["sell_price"].to_numpy(dtype=np.float64)
+    # a block_time that could not be parsed is a null timestamp, outside of every bound
+    timestamps = trades_df["block_timestamp"].to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+
+    prices = price_df.sort_values("block_timestamp", kind="stable")
+    price_timestamps = prices["block_timestamp"].to_numpy(dtype=np.float64)
+    price_values = prices["price"].to_numpy(dtype=np.float64)
+    indices = np.searchsorted(price_timestamps, timestamps, side="right") - 1
+    has_reference = indices >= 0
+    reference_price = np.full(len(timestamps), np.nan)
+    reference_age = np.full(len(timestamps), np.nan)
+    reference_price[has_reference] = price_values[indices[has_reference]]
+    reference_age[has_reference] = (
+        timestamps[has_reference] - price_timestamps[indices[has_reference]]
+    )
+    trade_price = calculate_trade_prices(trades_df).to_numpy(dtype=np.float64)
+
+    null_price = np.isnan(buy_price) | np.isnan(sell_price)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lower = min_timestamp if min_timestamp is not None else 1
+        upper = time.time() + max_future_seconds
+        deviation = np.abs(trade_price / reference_price - 1)
+        masks = {
+            "null_price": null_price,
+            "non_positive_price": ~null_price & ((buy_price <= 0) | (sell_price <= 0)),
+            "timestamp_out_of_bounds": ~((timestamps >= lower) & (timestamps <= upper)),
+            "missing_reference_price": ~has_reference | ~(reference_price > 0),
+            "stale_reference_price": reference_age > max_staleness_seconds,
+            "unsupported_pair": np.isnan(trade_price) & ~null_price,
+            "implausible_price_ratio": deviation > max_price_deviation,
+        }
+
+    violations = np.column_stack([masks[rule] for rule in VALIDATION_RULES])
+    rejected = violations.any(axis=1)
+    counts = dict(zip(VALIDATION_RULES, violations.sum(axis=0).tolist()))
+
+    rejected_df = trades_df[rejected].assign(
+        reject_reason=np.array(VALIDATION_RULES)[violations[rejected].argmax(axis=1)]
+    )
+    logging.info(
+        f"Validation accepted {len(trades_df) - len(rejected_df)} of {len(trades_df)} trades, "
+        f"violations per rule: {counts}."
+    )
+    return ValidationReport(trades_df[~rejected], rejected_df, counts)
@@ -0,0 +1,189 @@
+import logging
+import os
+import socket
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from cow_swap.chains import resolve_chains, token_pair_name
+from cow_swap.database.db_provider import WorkUnit
+from cow_swap.processor import BatchLockedException
+
+
+def enqueue_backfill(
+    pgsql_provider: Any, config: Dict[str, Any], start_day: date, end_day: date
+) -> int:
+    """
+    Queues one work unit per configured chain and day of a range, for backfill workers to drain.
+
+    Args:
+        pgsql_provider (PostgreSQLProvider): The provider of the database holding the queue.
+        config (Dict[str, Any]): The loaded configuration, whose chains are queued.
+        start_day (date): The first day to ingest.
+        end_day (date): The last day to ingest, included.
+
+    Returns:
+        int: The number of units added; units already queued are skipped.
+
+    Raises:
+        ValueError: If the Dune queries are not parameterised, since only those can fetch a given day.
+    """
+    if not config.get("dune_api", {}).get("parameterized", False):
+        raise ValueError("Backfills need dune_api.parameterized to fetch past days.")
+    pgsql_provider.migrate()
+    days = [
+        start_day + timedelta(days=offset)
+        for offset in range((end_day - start_day).days + 1)
+    ]
+    return pgsql_provider.enqueue_work(
+        (chain["name"], token_pair_name(chain["currencies"]), day)
+        for day in days
+        for chain in resolve_chains(config)
+    )
+
+
+class WorkQueueWorker:
+    """
+    Drains the work_units queue, running the pipeline for one (chain, token pair, day) unit at a time.
+
+    Any number of workers, on any number of hosts, can drain the same queue: each unit is claimed by a
+    single worker for a lease, which a background thread renews every heartbeat_seconds. The units of a
+    worker that dies are claimed again once their lease expires. A failed unit is retried after
+    retry_delay_seconds, until max_attempts claims. A unit whose batch is locked by another run, such as
+    the daily DAG, is handed back without counting the attempt.
+
+    Attributes:
+        processor (Processor): The processor running the units.
+        pgsql_provider (PostgreSQLProvider): The provider of the database holding the queue.
+        worker_id (str): The ID recorded on the claimed units.
+        lease_seconds (int): The lease duration of a claim.
+        heartbeat_seconds (int): The interval between lease renewals.
+        max_attempts (int): The number of claims after which a unit is marked failed.
+        retry_delay_seconds (int): The delay before a failed or locked unit is claimed again.
+    """
+
+    def __init__(
+        self,
+        processor: Any,
+        pgsql_provider: Any,
+        worker_id: Optional[str] = None,
+        lease_seconds: int = 900,
+        heartbeat_seconds: int = 60,
+        max_attempts: int = 3,
+        retry_delay_seconds: int = 300,
+    ) -> None:
+        """
+        Initializes the WorkQueueWorker.
+
+        Args:
+            processor (Processor): The processor running the units.
+            pgsql_provider (PostgreSQLProvider): The provider of the database holding the queue.
+            worker_id (Optional[str]): The ID recorded on the claimed units. Defaults to '<host>-<pid>'.
+            lease_seconds (int): The lease duration of a claim. Default is 900.
+            heartbeat_seconds (int): The interval between lease renewals. Default is 60.
+            max_attempts (int): The number of claims after which a unit is marked failed. Default is 3.
+            retry_delay_seconds (int): The delay before a failed or locked unit is claimed again.
+                Default is 300.
+        """
+        self.processor = processor
+        self.pgsql_provider = pgsql_provider
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self._chains = {
+            (chain["name"], token_pair_name(chain["currencies"])): chain
+            for chain in resolve_chains(processor.config)
+        }
+
+    def _heartbeat(self, unit: WorkUnit, stop: threading.Event) -> None:
+        while not stop.wait(self.heartbeat_seconds):
+            try:
+                if not self.pgsql_provider.heartbeat_work(
+                    unit, self.worker_id, self.lease_seconds
+                ):
+                    logging.warning(f"Lost the lease of {unit}.")
+                    return
+            except Exception as e:
+                # the lease outlives a few missed beats
+                logging.warning(f"Heartbeat of {unit} failed: {e}")
+
+    def process_unit(self, unit: WorkUnit) -> bool:
+        """
+        Runs the pipeline for a claimed unit and records the outcome in the queue.
+
+        Args:
+            unit (WorkUnit): The claimed unit.
+
+        Returns:
+            bool: Whether the unit was processed.
+        """
+        chain = self._chains.get((unit.chain, unit.token_pair))
+        if chain is None:
+            self.pgsql_provider.fail_work(
+                unit,
+                self.worker_id,
+                "chain not configured",
+                self.max_attempts,
+                self.retry_delay_seconds,
+            )
+            return False
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(unit, stop),
+            name=f"heartbeat-{unit.chain}-{unit.day}",
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            self.processor.process_chain(chain, unit.day)
+        except BatchLockedException as e:
+            logging.info(f"Handing {unit} back: {e}")
+            self.pgsql_provider.release_work(
+                unit, self.worker_id, self.retry_delay_seconds
+            )
+            return False
+        except Exception as e:
+            logging.exception(f"Work unit {unit} failed: {e}")
+            self.pgsql_provider.fail_work(
+                unit,
+                self.worker_id,
+                str(e),
+                self.max_attempts,
+                self.retry_delay_seconds,
+            )
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+        self.pgsql_provider.complete_work(unit, self.worker_id)
+        return True
+
+    def run(self, max_units: Optional[int] = None) -> int:
+        """
+        Claims and processes units until none is claimable, or max_units were claimed.
+
+        Args:
+            max_units (Optional[int]): The maximum number of units to claim. Unlimited if None.
+
+        Returns:
+            int: The number of units processed successfully.
+        """
+        self.pgsql_provider.migrate()
+        claimed = processed = 0
+        while max_units is None or claimed < max_units:
+            unit = self.pgsql_provider.claim_work(
+                self.worker_id, self.lease_seconds, self.max_attempts
+            )
+            if unit is None:
+                break
+            claimed += 1
+            logging.info(f"Worker {self.worker_id} claimed {unit}.")
+            processed += self.process_unit(unit)
+        logging.info(
+            f"Worker {self.worker_id} processed {processed} of {claimed} claimed units."
+        )
+        return processed
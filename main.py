@@ -1,27 +1,129 @@
-from cow_swap.apis.api_client import CoinGeckoClient
+from datetime import date
+
+import psycopg2
+import requests
+
 from cow_swap.apis.dune_fetcher import DuneDataFetcher
+from cow_swap.chains import resolve_chains
+from cow_swap.checkpoint import CheckpointStore
 from cow_swap.database.db_provider import PostgreSQLProvider
+from cow_swap.database.parquet_sink import ParquetLakeSink
+from cow_swap.database.quarantine import QuarantineSink
+from cow_swap.database.spool import LocalSpool
+from cow_swap.price_sources import build_price_source
+from cow_swap.price_store import PriceTimeSeriesStore
 from cow_swap.processor import Processor
+from cow_swap.reconciliation import Reconciler
 from cow_swap.utils import setup_logging, load_config
+from cow_swap.work_queue import WorkQueueWorker
 
 
-def main() -> None:
-    logger = setup_logging()
-
-    config = load_config(logger)
-    provider = PostgreSQLProvider(**config["db_params"])
-    dune_client = DuneDataFetcher(config["dune_api"]["api_key"])
-    coingecko_client = CoinGeckoClient()
+def build_processor(config: dict, logger, provider: PostgreSQLProvider) -> Processor:
+    spool = LocalSpool(config.get("spool", {}).get("directory", "spool"))
+    try:
+        provider.migrate()
+        spool.replay(provider)
+    except psycopg2.Error:
+        logger.warning("Database unavailable at startup, results will be spooled.")
+    lake_sink = (
+        ParquetLakeSink(**config["lake"])
+        if config.get("lake", {}).get("root")
+        else None
+    )
+    dune_client = DuneDataFetcher(
+        config["dune_api"]["api_key"],
+        columnar=config["dune_api"].get("columnar", False),
+    )
+    price_store = PriceTimeSeriesStore(
+        config.get("price_store", {}).get("directory", "prices")
+    )
+    # one session (and connection pool) shared by the threads of every chain
+    chains = resolve_chains(config)
+    price_source = build_price_source(
+        config.get("prices", {}),
+        session=requests.Session(),
+        price_store=price_store,
+        max_concurrent_calls=min(
+            len(chains),
+            config.get("ingestion", {}).get("max_workers", len(chains)),
+        ),
+    )
 
-    processor = Processor(
+    return Processor(
         dune_fetcher=dune_client,
-        coingecko_client=coingecko_client,
+        coingecko_client=price_source,
         pgsql_provider=provider,
         config=config,
         logger=logger,
+        spool=spool,
+        checkpoints=CheckpointStore(
+            config.get("checkpoint", {}).get("directory", "checkpoints")
+        ),
+        lake_sink=lake_sink,
+        price_store=price_store,
+        quarantine=QuarantineSink(
+            config.get("quarantine", {}).get("directory", "quarantine")
+        ),
     )
 
-    processor.process()
+
+def main() -> None:
+    logger = setup_logging()
+
+    config = load_config(logger)
+    provider = PostgreSQLProvider(**config["db_params"])
+    processor = build_processor(config, logger, provider)
+
+    try:
+        processor.process()
+    finally:
+        provider.close()
+
+
+def run_worker() -> None:
+    logger = setup_logging()
+
+    config = load_config(logger)
+    provider = PostgreSQLProvider(**config["db_params"])
+    processor = build_processor(config, logger, provider)
+    worker = WorkQueueWorker(processor, provider, **config.get("work_queue", {}))
+
+    try:
+        worker.run()
+    finally:
+        provider.close()
+
+
+def run_reconciliation(start_day: str, end_day: str) -> int:
+    logger = setup_logging()
+
+    config = load_config(logger)
+    provider = PostgreSQLProvider(**config["db_params"])
+    processor = build_processor(config, logger, provider)
+    reconciler = Reconciler(processor, **config.get("reconciliation", {}))
+
+    try:
+        reports = reconciler.reconcile(
+            date.fromisoformat(start_day), date.fromisoformat(end_day)
+        )
+    finally:
+        provider.close()
+
+    unreconciled = 0
+    for report in reports:
+        summary = (
+            f"Reconciliation of {report.chain} on {report.day}: "
+            f"{len(report.mismatched_hours)} mismatched hours, "
+            f"{len(report.refilled_ranges)} ranges refilled, "
+            f"{len(report.remaining_hours)} hours still mismatched."
+        )
+        if report.remaining_hours:
+            unreconciled += 1
+            logger.warning(summary)
+        else:
+            logger.info(summary)
+    # a non-zero exit status fails the make target or task that ran the reconciliation
+    return 1 if unreconciled else 0
 
 
 if __name__ == "__main__":
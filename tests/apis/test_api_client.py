@@ -1,3 +1,4 @@
+import json
 import pandas as pd
 from unittest.mock import patch, MagicMock
 from cow_swap.apis.api_client import CoinGeckoClient
@@ -13,10 +14,10 @@ mock_response_data = {
 def test_get_historical_prices_success():
     client = CoinGeckoClient()
 
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = mock_response_data
+        mock_response.content = json.dumps(mock_response_data).encode()
         mock_get.return_value = mock_response
 
         min_block_time = 1625097600
@@ -44,7 +45,7 @@ def test_get_historical_prices_unsupported_token_combination():
 def test_get_historical_prices_api_failure():
     client = CoinGeckoClient()
 
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 500
         mock_get.return_value = mock_response
@@ -57,7 +58,19 @@ def test_get_historical_prices_api_failure():
 def test_get_historical_prices_exception_handling():
     client = CoinGeckoClient()
 
-    with patch("requests.get", side_effect=Exception("Test exception")):
+    with patch("requests.Session.get", side_effect=Exception("Test exception")):
         result = client.get_historical_prices(1625097600, 1625184000)
 
         assert result is None
+
+
+def test_get_historical_prices_uses_shared_session():
+    session = MagicMock()
+    session.get.return_value.status_code = 200
+    session.get.return_value.json.return_value = mock_response_data
+    client = CoinGeckoClient(session=session)
+
+    client.get_historical_prices(1625097600, 1625184000)
+    client.get_historical_prices(1625097600, 1625184000)
+
+    assert session.get.call_count == 2
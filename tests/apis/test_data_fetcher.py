@@ -1,6 +1,9 @@
 import pandas as pd
 from unittest.mock import patch
-from cow_swap.apis.dune_fetcher import DuneDataFetcher
+import io
+from datetime import datetime, timezone
+from dune_client.types import QueryParameter
+from cow_swap.apis.dune_fetcher import DuneDataFetcher, build_query_parameters
 from cow_swap.utils import convert_to_unix_timestamp
 
 
@@ -62,3 +65,138 @@ def test_get_query_results_as_dataframe_empty_results():
 
         assert df is None
         assert block_times is None
+
+
+def test_get_query_results_as_dataframe_applies_schema():
+    mock_rows = [
+        {
+            "block_time": "2023-08-21 12:34:56.789 UTC",
+            "buy_token": "WETH",
+            "token_pair": "USDC-WETH",
+            "block_number": 1,
+        },
+        {
+            "block_time": "not a date",
+            "buy_token": "USDC",
+            "token_pair": "USDC-WETH",
+            "block_number": 2,
+        },
+    ]
+
+    with patch("cow_swap.apis.dune_fetcher.DuneClient") as mock_dune_client:
+        mock_dune_instance = mock_dune_client.return_value
+        mock_dune_instance.get_latest_result.return_value.result.rows = mock_rows
+
+        fetcher = DuneDataFetcher(api_key="test_api_key")
+        df, block_times = fetcher.get_query_results_as_dataframe(query_id=123)
+
+        # the row with an invalid block_time is left to the validation gate
+        assert df["block_number"].tolist() == [1, 2]
+        assert isinstance(df["token_pair"].dtype, pd.CategoricalDtype)
+        assert df["block_timestamp"].dtype == "Int64"
+        assert df["block_timestamp"].isna().tolist() == [False, True]
+        assert block_times == (1692621296, 1692621296)
+
+
+def test_get_query_results_as_dataframe_with_parameters():
+    mock_rows = [{"block_time": "2023-08-21 12:34:56.789 UTC", "tx_hash": "0x1"}]
+
+    with patch("cow_swap.apis.dune_fetcher.DuneClient") as mock_dune_client:
+        mock_dune_instance = mock_dune_client.return_value
+        mock_dune_instance.run_query.return_value.result.rows = mock_rows
+
+        fetcher = DuneDataFetcher(api_key="test_api_key")
+        df, _ = fetcher.get_query_results_as_dataframe(
+            query_id=123,
+            parameters={"token_pair": "USDC-WETH"},
+            columns=("block_time", "tx_hash"),
+        )
+
+        query = mock_dune_instance.run_query.call_args.args[0]
+        assert query.query_id == 123
+        assert query.parameters() == [
+            QueryParameter.text_type("token_pair", "USDC-WETH")
+        ]
+        assert mock_dune_instance.run_query.call_args.kwargs["columns"] == [
+            "block_time",
+            "tx_hash",
+        ]
+        mock_dune_instance.get_latest_result.assert_not_called()
+        assert df["tx_hash"].tolist() == ["0x1"]
+
+
+def test_build_query_parameters():
+    start_time = datetime(2023, 8, 21, tzinfo=timezone.utc)
+
+    parameters = build_query_parameters(
+        {"tokens": ["weth", "usdc"], "start_time": start_time, "min_units": 5}
+    )
+
+    assert [parameter.to_dict() for parameter in parameters] == [
+        {"key": "tokens", "type": "text", "value": "weth,usdc"},
+        {"key": "start_time", "type": "datetime", "value": "2023-08-21 00:00:00"},
+        {"key": "min_units", "type": "number", "value": "5"},
+    ]
+
+
+def test_get_query_results_as_dataframe_columnar():
+    csv = (
+        b"block_time,tx_hash,evt_index,buy_price,token_pair\n"
+        b"2023-08-21 12:34:56.789 UTC,0x12,0,1.5,USDC-WETH\n"
+        b"2023-08-21 12:35:56.789 UTC,0x34,1,,USDC-WETH\n"
+    )
+
+    with patch("cow_swap.apis.dune_fetcher.DuneClient") as mock_dune_client:
+        mock_dune_instance = mock_dune_client.return_value
+        mock_dune_instance.download_csv.return_value.data = io.BytesIO(csv)
+
+        fetcher = DuneDataFetcher(api_key="test_api_key", columnar=True)
+        df, block_times = fetcher.get_query_results_as_dataframe(
+            query_id=123, columns=["block_time", "tx_hash"]
+        )
+
+        mock_dune_instance.download_csv.assert_called_once_with(
+            123, columns=["block_time", "tx_hash"]
+        )
+        mock_dune_instance.get_latest_result.assert_not_called()
+        # hashes stay text, even when they parse as hexadecimal numbers
+        assert df["tx_hash"].tolist() == ["0x12", "0x34"]
+        assert df["evt_index"].tolist() == [0, 1]
+        assert df["buy_price"].isna().tolist() == [False, True]
+        assert isinstance(df["token_pair"].dtype, pd.CategoricalDtype)
+        assert block_times == (1692621296, 1692621356)
+
+
+def test_get_query_results_as_dataframe_columnar_no_rows():
+    with patch("cow_swap.apis.dune_fetcher.DuneClient") as mock_dune_client:
+        mock_dune_instance = mock_dune_client.return_value
+        mock_dune_instance.download_csv.return_value.data = io.BytesIO(
+            b"block_time,tx_hash\n"
+        )
+
+        fetcher = DuneDataFetcher(api_key="test_api_key", columnar=True)
+
+        assert fetcher.get_query_results_as_dataframe(query_id=123) == (None, None)
+
+
+def test_get_trade_digests_columnar():
+    # sums of 60-bit hashes exceed int64, so the query returns them as text
+    csv = b"hour_start,trade_count,key_hash\n1672531200,2,36893488147419103232\n"
+
+    with patch("cow_swap.apis.dune_fetcher.DuneClient") as mock_dune_client:
+        mock_dune_instance = mock_dune_client.return_value
+        mock_dune_instance.run_query_csv.return_value.data = io.BytesIO(csv)
+
+        fetcher = DuneDataFetcher(api_key="test_api_key", columnar=True)
+        digests = fetcher.get_trade_digests(
+            456, {"token_pair": "USDC-WETH", "tokens": "usdc,weth"}
+        )
+
+        assert digests.index.tolist() == [1672531200]
+        assert digests["trade_count"].tolist() == [2]
+        assert digests["key_hash"].tolist() == [2**65]
+        assert mock_dune_instance.run_query_csv.call_args.kwargs["columns"] == [
+            "hour_start",
+            "trade_count",
+            "key_hash",
+        ]
@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import requests
+
+from cow_swap.apis.decoding import (
+    ACCEPT_ENCODING,
+    decode_pairs,
+    enable_compression,
+)
+
+
+def test_decode_pairs_scans_numbers():
+    payload = json.dumps(
+        {
+            "prices": [[1625097600000, 2000.5], [1625184000000, 2.1e3]],
+            "market_caps": [[1625097600000, 1.0]],
+        }
+    ).encode()
+
+    timestamps, prices = decode_pairs(payload, "prices")
+
+    assert timestamps.tolist() == [1625097600000, 1625184000000]
+    assert prices.tolist() == [2000.5, 2100.0]
+
+
+def test_decode_pairs_falls_back_to_json_parser():
+    payload = b'{"prices": [[1, null], [2, 3.5]]}'
+
+    timestamps, prices = decode_pairs(payload, "prices")
+
+    assert timestamps.tolist() == [1, 2]
+    assert np.isnan(prices[0]) and prices[1] == 3.5
+
+
+def test_decode_pairs_empty_or_missing():
+    for payload in (b'{"prices": []}', b'{"prices" : [ ]}', b'{"total_volumes": []}'):
+        timestamps, prices = decode_pairs(payload, "prices")
+        assert len(timestamps) == 0 and len(prices) == 0
+
+
+def test_enable_compression():
+    session = enable_compression(requests.Session())
+
+    assert session.headers["Accept-Encoding"] == ACCEPT_ENCODING
+    assert "gzip" in ACCEPT_ENCODING
@@ -0,0 +1,50 @@
+import json
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from cow_swap.apis.defillama_client import DefiLlamaClient
+
+
+def test_get_historical_prices_success():
+    session = MagicMock()
+    session.get.return_value.status_code = 200
+    session.get.return_value.content = json.dumps(
+        {
+            "coins": {
+                "coingecko:ethereum": {
+                    "prices": [
+                        {"timestamp": 1625097600, "price": 2000.0},
+                        {"timestamp": 1625097900, "price": 2001.123456789},
+                    ]
+                }
+            }
+        }
+    ).encode()
+    client = DefiLlamaClient(session=session)
+
+    result = client.get_historical_prices(1625097600, 1625097900)
+
+    pd.testing.assert_frame_equal(
+        result,
+        pd.DataFrame(
+            {
+                "block_timestamp": [1625097600, 1625097900],
+                "price": [2000.0, 2001.12345679],
+            }
+        ),
+    )
+    url = session.get.call_args.args[0]
+    assert url == "https://coins.llama.fi/chart/coingecko:ethereum"
+    assert session.get.call_args.kwargs["params"] == {
+        "start": 1625097600,
+        "span": 2,
+        "period": "5m",
+    }
+
+
+def test_get_historical_prices_api_failure():
+    session = MagicMock()
+    session.get.return_value.status_code = 429
+
+    assert DefiLlamaClient(session=session).get_historical_prices(1, 2) is None
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cow_swap.schema import PRICE_SCHEMA, TRADE_SCHEMA, apply_schema
+
+
+@pytest.fixture
+def trades_df():
+    rng = np.random.default_rng(7)
+    n = 5000
+    tokens = np.array(["WETH", "USDC", "weth", "usdc", "DAI"])
+    return apply_schema(
+        pd.DataFrame(
+            {
+                "buy_token": rng.choice(tokens, n),
+                "sell_token": rng.choice(tokens, n),
+                "token_pair": "USDC-WETH",
+                "buy_price": rng.uniform(0.0001, 4000, n),
+                "sell_price": rng.uniform(0.0001, 4000, n),
+                # repeated timestamps exercise the tie order of the as-of join
+                "block_timestamp": rng.integers(1672444800, 1672531200, n) // 10 * 10,
+                "tx_hash": [f"0x{i:04x}" for i in range(n)],
+            }
+        ),
+        TRADE_SCHEMA,
+    )
+
+
+@pytest.fixture
+def price_df():
+    timestamps = np.arange(1672444500, 1672531200, 300)
+    return apply_schema(
+        pd.DataFrame(
+            {
+                "block_timestamp": timestamps,
+                "price": np.linspace(1200, 1300, len(timestamps)),
+            }
+        ),
+        PRICE_SCHEMA,
+    )
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cow_swap.backends import PandasBackend, get_backend
+
+pytest.importorskip("polars")
+
+
+@pytest.fixture
+def backends():
+    return PandasBackend(), get_backend("polars")
+
+
+def test_filter_tokens_parity(backends, trades_df):
+    pandas_backend, polars_backend = backends
+    pd.testing.assert_frame_equal(
+        polars_backend.filter_tokens(trades_df, ["weth", "usdc"]),
+        pandas_backend.filter_tokens(trades_df, ["weth", "usdc"]),
+    )
+
+
+def test_match_prices_parity(backends, trades_df, price_df):
+    pandas_backend, polars_backend = backends
+    pd.testing.assert_frame_equal(
+        polars_backend.match_prices(trades_df.copy(), price_df),
+        pandas_backend.match_prices(trades_df.copy(), price_df),
+    )
+
+
+def test_price_improvement_parity(backends, trades_df, price_df):
+    pandas_backend, polars_backend = backends
+    matched_df = pandas_backend.match_prices(trades_df.copy(), price_df)
+
+    expected_df = pandas_backend.calculate_price_improvement(matched_df.copy())
+    result_df = polars_backend.calculate_price_improvement(matched_df.copy())
+
+    pd.testing.assert_frame_equal(result_df, expected_df)
+    assert polars_backend.average_improvement(result_df) == pytest.approx(
+        pandas_backend.average_improvement(expected_df), rel=1e-12
+    )
+
+
+def test_average_improvement_parity_empty(backends):
+    empty_df = pd.DataFrame({"price_improvement": pd.Series([], dtype="float64")})
+    assert all(np.isnan(backend.average_improvement(empty_df)) for backend in backends)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("spark")
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from cow_swap.backends import PandasBackend, ShardedBackend, get_backend
+
+
+@pytest.fixture(scope="module")
+def sharded_backends():
+    backends = {
+        shard_by: ShardedBackend(workers=2, shard_by=shard_by, min_shard_rows=1000)
+        for shard_by in ("time", "token_pair")
+    }
+    yield backends
+    for backend in backends.values():
+        backend.close()
+
+
+@pytest.mark.parametrize("shard_by", ["time", "token_pair"])
+def test_sharded_parity(sharded_backends, shard_by, trades_df, price_df):
+    trades_df = trades_df.assign(
+        token_pair=pd.Categorical(
+            trades_df["buy_token"].astype(str)
+            + "-"
+            + trades_df["sell_token"].astype(str)
+        )
+    )
+
+    expected_df = PandasBackend().match_and_calculate(trades_df.copy(), price_df)
+    result_df = sharded_backends[shard_by].match_and_calculate(
+        trades_df.copy(), price_df
+    )
+
+    pd.testing.assert_frame_equal(result_df, expected_df)
+
+
+def test_small_inputs_stay_in_process(trades_df, price_df):
+    backend = ShardedBackend(workers=2, min_shard_rows=len(trades_df))
+
+    backend.match_and_calculate(trades_df.copy(), price_df)
+
+    assert backend._executor is None
+
+
+def test_get_sharded_backend():
+    backend = get_backend("sharded", {"workers": 3, "shard_by": "token_pair"})
+
+    assert (backend.workers, backend.shard_by) == (3, "token_pair")
+    with pytest.raises(ValueError):
+        ShardedBackend(shard_by="block")
@@ -0,0 +1,89 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from cow_swap.database.background_writer import BackgroundWriter
+
+
+def _chunk(batch_id, rows=2):
+    return pd.DataFrame({"batch_id": [batch_id] * rows, "tx_hash": ["0x1"] * rows})
+
+
+def test_background_writer_loads_every_chunk():
+    provider = MagicMock()
+    writer = BackgroundWriter(provider, workers=2, max_pending=1)
+
+    for batch_id in (20230131, 20230201, 20230202):
+        writer.submit(_chunk(batch_id))
+    writer.close()
+
+    assert provider.insert_trade_data_batch.call_count == 3
+    assert writer.submitted_rows == 6
+    # one partition creation per month
+    assert sorted(
+        call.args[0] for call in provider.create_upcoming_partitions.call_args_list
+    ) in ([20230131, 20230201], [20230131, 20230202])
+
+
+def test_background_writer_applies_backpressure():
+    provider = MagicMock()
+    release = threading.Event()
+    provider.insert_trade_data_batch.side_effect = lambda df, **kwargs: release.wait()
+    writer = BackgroundWriter(provider, workers=1, max_pending=1)
+
+    writer.submit(_chunk(20230101))
+    writer.submit(_chunk(20230101))
+    blocked = threading.Thread(target=writer.submit, args=(_chunk(20230101),))
+    blocked.start()
+    blocked.join(timeout=0.2)
+
+    assert blocked.is_alive()
+    release.set()
+    blocked.join()
+    writer.close()
+    assert provider.insert_trade_data_batch.call_count == 3
+
+
+def test_background_writer_raises_first_error_on_close():
+    provider = MagicMock()
+    provider.insert_trade_data_batch.side_effect = Exception("db down")
+    writer = BackgroundWriter(provider, workers=1)
+
+    writer.submit(_chunk(20230101))
+    with pytest.raises(Exception, match="db down"):
+        writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(_chunk(20230101))
+    writer.close(raise_error=False)
+
+
+def test_background_writer_keeps_the_chunks_it_could_not_load():
+    provider = MagicMock()
+    provider.insert_trade_data_batch.side_effect = Exception("db down")
+    writer = BackgroundWriter(provider, workers=1)
+
+    assert writer.submit(_chunk(20230101, rows=3))
+    while not writer.failed:
+        time.sleep(0.01)
+
+    assert not writer.submit(_chunk(20230102))
+    writer.close(raise_error=False)
+    assert [len(chunk) for chunk in writer.unwritten()] == [3]
+
+
+def test_background_writers_share_one_rollup_lock():
+    provider = MagicMock()
+    writer = BackgroundWriter(provider, workers=2)
+
+    writer.submit(_chunk(20230101))
+    writer.submit(_chunk(20230101))
+    writer.close()
+
+    locks = {
+        id(call.kwargs["rollup_lock"])
+        for call in provider.insert_trade_data_batch.call_args_list
+    }
+    assert len(locks) == 1
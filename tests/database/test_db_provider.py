@@ -1,7 +1,37 @@
+import numpy as np
+import pandas as pd
 import pytest
+from datetime import date, datetime, timedelta, timezone
 from unittest.mock import patch, MagicMock
-from psycopg2 import extensions
-from cow_swap.database.db_provider import PostgreSQLProvider
+import psycopg2
+from psycopg2 import extensions, sql
+from cow_swap.database.db_provider import (
+    PostgreSQLProvider,
+    partition_bounds,
+    add_months,
+    batch_start_timestamp,
+    today_batch_id,
+    TRADE_COLUMNS,
+    TRADE_READ_COLUMNS,
+    WorkUnit,
+)
+from cow_swap.database.migrations import SCHEMA_VERSION
+
+
+class SydneyClock(datetime):
+    # 05:00 on January 2nd in Sydney, still January 1st in UTC
+    frozen = datetime(2023, 1, 2, 5, tzinfo=timezone(timedelta(hours=10)))
+
+    @classmethod
+    def now(cls, tz=None):
+        if tz is None:
+            return cls.frozen.replace(tzinfo=None)
+        return cls.frozen.astimezone(tz)
+
+
+def test_today_batch_id_is_the_utc_day():
+    with patch("cow_swap.database.db_provider.datetime", SydneyClock):
+        assert today_batch_id() == 20230101
 
 
 @pytest.fixture
@@ -14,6 +44,7 @@ def mock_connection():
         mock_cursor = MagicMock(spec=extensions.cursor)
 
         mock_cursor.mogrify.return_value = b"MOCKED SQL STATEMENT"
+        mock_cursor.connection.encoding = "UTF8"
 
         mock_cursor.__enter__.return_value = mock_cursor
         mock_cursor.__exit__.return_value = None
@@ -28,8 +59,29 @@ def mock_connection():
         yield mock_conn, mock_cursor
 
 
-def test_create_table_cow_swap_if_not_exists(mock_connection):
+def test_migrate_runs_once_per_process(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchone.side_effect = [(True,), (SCHEMA_VERSION,)]
+    provider = PostgreSQLProvider(
+        dbname="migrate_once_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+    assert provider.migrate() == SCHEMA_VERSION
+    assert provider.migrate() == SCHEMA_VERSION
+
+    # up to date: one catalog lookup and one version read, no DDL, no second round trip
+    assert mock_cursor.execute.call_count == 2
+    assert mock_conn.autocommit is False
+
+
+def test_execute_reraises_database_errors(mock_connection):
     mock_conn, mock_cursor = mock_connection
+    mock_cursor.execute.side_effect = psycopg2.OperationalError("server closed")
     provider = PostgreSQLProvider(
         dbname="test_db",
         user="user",
@@ -38,29 +90,24 @@ def test_create_table_cow_swap_if_not_exists(mock_connection):
         port=5432,
         batch_size=100,
     )
-    provider.create_table_cow_swap_if_not_exists()
-    mock_cursor.execute.assert_called_once_with("""
-            CREATE TABLE IF NOT EXISTS cow_swap_trades (
-                batch_id BIGINT NOT NULL,
-                block_number BIGINT NOT NULL,
-                block_time TIMESTAMP WITH TIME ZONE NOT NULL,
-                buy_price NUMERIC(18, 8),
-                buy_token VARCHAR(10) NOT NULL,
-                sell_price NUMERIC(18, 8),
-                sell_token VARCHAR(10) NOT NULL,
-                sell_token_address VARCHAR(50),
-                token_pair VARCHAR(20) NOT NULL,
-                units_sold NUMERIC(30, 10) NOT NULL,
-                block_timestamp BIGINT NOT NULL,
-                price NUMERIC(18, 8),
-                trade_price NUMERIC(18, 8),
-                price_improvement NUMERIC(18, 8),
-                PRIMARY KEY (batch_id, block_number)
-            );
-            """)
 
+    with pytest.raises(psycopg2.OperationalError):
+        provider.truncate_table()
+    mock_conn.close.assert_called_once()
 
-def test_create_table_for_average_improvement(mock_connection):
+
+def test_partition_bounds():
+    assert partition_bounds(20230815) == ("cow_swap_trades_p202308", 20230801, 20230901)
+    assert partition_bounds(20231231) == ("cow_swap_trades_p202312", 20231201, 20240101)
+
+
+def test_add_months():
+    assert add_months(20230815, 1) == 20230901
+    assert add_months(20231215, 1) == 20240101
+    assert add_months(20230115, -1) == 20221201
+
+
+def test_create_upcoming_partitions(mock_connection):
     mock_conn, mock_cursor = mock_connection
     provider = PostgreSQLProvider(
         dbname="test_db",
@@ -71,17 +118,166 @@ def test_create_table_for_average_improvement(mock_connection):
         batch_size=100,
     )
 
-    provider.create_table_for_average_improvement()
+    mock_cursor.fetchall.return_value = [("cow_swap_trades_p202312",)]
 
-    mock_cursor.execute.assert_called_once_with("""
-            CREATE TABLE IF NOT EXISTS batch_improvements (
-                batch_id BIGINT PRIMARY KEY,
-                average_improvement NUMERIC(18, 8) NOT NULL
-            );
-            """)
+    provider.create_upcoming_partitions(20231215, months_ahead=1)
+    provider.create_upcoming_partitions(20231220, months_ahead=1)
+
+    # one catalog listing, then DDL only for the missing month
+    assert mock_cursor.execute.call_count == 2
+    assert mock_cursor.execute.call_args.args[1] == (20240101, 20240201)
+
+
+def test_apply_retention(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = [
+        ("cow_swap_trades_p202305",),
+        ("cow_swap_trades_p202306",),
+        ("cow_swap_trades_p202307",),
+    ]
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+    expired = provider.apply_retention(keep_months=2, reference_batch_id=20230715)
+
+    assert expired == ["cow_swap_trades_p202305"]
+    # one listing query, then detach + drop for the single expired partition
+    assert mock_cursor.execute.call_count == 3
+
+
+def _trade_row(tx_hash, evt_index, price_improvement=5.0):
+    return {
+        "batch_id": 20230101,
+        "chain": "ethereum",
+        "tx_hash": tx_hash,
+        "evt_index": evt_index,
+        "block_number": 123,
+        "block_time": "2023-01-01 00:00:00+00",
+        "buy_price": 100.0,
+        "buy_token": "WETH",
+        "sell_price": 200.0,
+        "sell_token": "USDC",
+        "sell_token_address": "0xAddress",
+        "token_pair": "WETH/USDC",
+        "units_sold": 1.0,
+        "block_timestamp": 1672444800,
+        "price": 100.0,
+        "trade_price": 105.0,
+        "price_improvement": price_improvement,
+    }
 
 
 def test_insert_trade_data_batch(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = []
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+    trades_df = pd.DataFrame([_trade_row("0xaa", 1)])
+
+    provider.insert_trade_data_batch(trades_df)
+
+    # key prefilter query, then a single multi-row insert
+    assert mock_cursor.execute.call_count == 2
+    assert mock_cursor.mogrify.call_count == 1
+
+
+def test_insert_trade_data_batch_merges_rollups(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    # known-key prefilter, then the keys returned by the insert
+    mock_cursor.fetchall.side_effect = [[], [(20230101, "0xaa", 1)]]
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+    trades_df = pd.DataFrame([_trade_row("0xaa", 1), _trade_row("0xbb", 1)])
+
+    provider.insert_trade_data_batch(trades_df)
+
+    statements = [call.args[0] for call in mock_cursor.execute.call_args_list]
+    assert len(statements) == 4
+    assert b"trade_rollups_hourly" in statements[2]
+    assert b"trade_rollups_daily" in statements[3]
+    # only the row the server actually inserted feeds the rollups
+    assert mock_cursor.mogrify.call_count == 2 + 1 + 1
+    assert mock_conn.autocommit is False
+
+
+def test_rebuild_rollups(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+    provider.rebuild_rollups(1672444900, 1672448400)
+
+    delete_call, insert_call = mock_cursor.execute.call_args_list[:2]
+    assert delete_call.args[1] == (1672444800, 1672531200)
+    assert insert_call.args[1] == {
+        "bucket": 3600,
+        "start": 1672444800,
+        "end": 1672531200,
+    }
+    assert mock_cursor.execute.call_count == 4
+
+
+def test_batch_start_timestamp():
+    assert batch_start_timestamp(20230101) == 1672531200
+    assert batch_start_timestamp(20231231) == 1703980800
+
+
+def test_recompute_price_improvements(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+    mock_cursor.fetchall.return_value = [
+        ("cow_swap_trades_p202301",),
+        ("cow_swap_trades_p202303",),
+    ]
+    mock_cursor.rowcount = 10
+
+    updated = provider.recompute_price_improvements(20230115, 20230310)
+
+    statements = [call.args for call in mock_cursor.execute.call_args_list]
+    repricings = [args for args in statements if "LATERAL" in str(args[0])]
+    # one update per existing partition of the range, clipped to the range
+    assert [args[1] for args in repricings] == [
+        {"start": 20230115, "end": 20230201},
+        {"start": 20230301, "end": 20230311},
+    ]
+    refresh = next(args for args in statements if "batch_improvements" in str(args[0]))
+    assert refresh[1] == (20230115, 20230310)
+    assert updated == 20
+    assert mock_conn.autocommit is False
+
+
+def test_insert_reference_prices(mock_connection):
     mock_conn, mock_cursor = mock_connection
     provider = PostgreSQLProvider(
         dbname="test_db",
@@ -91,26 +287,71 @@ def test_insert_trade_data_batch(mock_connection):
         port=5432,
         batch_size=100,
     )
-    trade_data_list = [
-        {
-            "batch_id": 1,
-            "block_number": 123,
-            "block_time": "2023-01-01 00:00:00+00",
-            "buy_price": 100.0,
-            "buy_token": "WETH",
-            "sell_price": 200.0,
-            "sell_token": "USDC",
-            "sell_token_address": "0xAddress",
-            "token_pair": "WETH/USDC",
-            "units_sold": 1.0,
-            "block_timestamp": 1672444800,
-            "price": 100.0,
-            "trade_price": 105.0,
-            "price_improvement": 5.0,
-        }
+
+    with patch("cow_swap.database.db_provider.extras.execute_values") as execute_values:
+        sent = provider.insert_reference_prices(
+            "USDC-WETH", np.array([1, 2]), np.array([100.0, 101.0])
+        )
+
+    assert sent == 2
+    assert list(execute_values.call_args.args[2]) == [
+        ("USDC-WETH", 1, 100.0),
+        ("USDC-WETH", 2, 101.0),
     ]
 
-    provider.insert_trade_data_batch(trade_data_list)
+
+def test_remove_known_trades(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = [(20230101, "0xaa", 1)]
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+    trades_df = pd.DataFrame(
+        [
+            _trade_row("0xaa", 1),
+            _trade_row("0xaa", 2, price_improvement=1.0),
+            _trade_row("0xaa", 2, price_improvement=2.0),
+            _trade_row("0xbb", 1),
+        ]
+    )
+
+    new_trades_df = provider.remove_known_trades(trades_df)
+
+    assert list(zip(new_trades_df["tx_hash"], new_trades_df["evt_index"])) == [
+        ("0xaa", 2),
+        ("0xbb", 1),
+    ]
+    # only the keys of the frame are looked up, not every key of its batch
+    query, params = mock_cursor.execute.call_args.args
+    assert "unnest" in query
+    assert params == (
+        [20230101, 20230101, 20230101],
+        ["0xaa", "0xaa", "0xbb"],
+        [1, 2, 1],
+        [20230101],
+    )
+    assert new_trades_df["price_improvement"].tolist() == [2.0, 5.0]
+
+
+def test_insert_trade_data_batch_all_known(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = [(20230101, "0xaa", 1)]
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+    provider.insert_trade_data_batch(pd.DataFrame([_trade_row("0xaa", 1)]))
+
     mock_cursor.execute.assert_called_once()
 
 
@@ -124,15 +365,17 @@ def test_insert_batch_improvement(mock_connection):
         port=5432,
         batch_size=100,
     )
-    provider.insert_batch_improvement(batch_id=1, average_improvement=5.0)
+    provider.insert_batch_improvement(
+        batch_id=1, average_improvement=5.0, chain="gnosis"
+    )
     mock_cursor.execute.assert_called_once_with(
         """
-            INSERT INTO batch_improvements (batch_id, average_improvement)
-            VALUES (%s, %s)
-            ON CONFLICT (batch_id) DO UPDATE 
+            INSERT INTO batch_improvements (batch_id, chain, average_improvement)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (chain, batch_id) DO UPDATE 
             SET average_improvement = EXCLUDED.average_improvement;
             """,
-        (1, 5.0),
+        (1, "gnosis", 5.0),
     )
 
 
@@ -148,3 +391,330 @@ def test_truncate_table(mock_connection):
     )
     provider.truncate_table()
     mock_cursor.execute.assert_called_once_with("TRUNCATE TABLE cow_swap_trades;")
+
+
+def _stored_trade(batch_id, tx_hash):
+    row = _trade_row(tx_hash, 0)
+    row["batch_id"] = batch_id
+    row["block_time"] = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    return tuple(row[column] for column in TRADE_READ_COLUMNS)
+
+
+def test_stream_trades(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchmany.side_effect = [
+        [_stored_trade(20230101, "0xaa"), _stored_trade(20230101, "0xbb")],
+        [_stored_trade(20230101, "0xcc")],
+        [],
+    ]
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+        itersize=2,
+    )
+
+    chunks = list(provider.stream_trades(token_pair="WETH/USDC", start_timestamp=0))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[0]["block_timestamp"].dtype == "int64"
+    assert chunks[0]["price_improvement"].dtype == "float64"
+    assert mock_conn.cursor.call_args.kwargs["name"].startswith("cow_swap_")
+    assert mock_cursor.itersize == 2
+    assert mock_cursor.execute.call_args.args[1] == (0, "WETH/USDC")
+    mock_conn.close.assert_called_once()
+
+
+def test_get_batch_trades_caches_closed_batches(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchmany.side_effect = lambda size: next(pages)
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+    pages = iter([[_stored_trade(20230101, "0xaa")], []])
+    first = provider.get_batch_trades(20230101)
+    first.loc[0, "price"] = -1.0
+    second = provider.get_batch_trades(20230101)
+
+    assert mock_cursor.execute.call_count == 1
+    assert second.loc[0, "price"] == 100.0
+
+    provider.clear_read_cache()
+    pages = iter([[], []])
+    assert provider.get_batch_trades(20230101).empty
+    assert mock_cursor.execute.call_count == 2
+
+
+def test_fetch_batch_improvements(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = [
+        (20230101, "ethereum", 1.5),
+        (20230102, "ethereum", -0.5),
+    ]
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+    improvements = provider.fetch_batch_improvements(20230101, 20230131)
+
+    assert improvements["batch_id"].tolist() == [20230101, 20230102]
+    assert improvements["average_improvement"].dtype == "float64"
+
+
+def test_insert_trade_data_batch_defaults_chain(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = []
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+    row = _trade_row("0xaa", 1)
+    del row["chain"]
+
+    with patch(
+        "cow_swap.database.db_provider.extras.execute_values", return_value=[]
+    ) as execute_values:
+        provider.insert_trade_data_batch(pd.DataFrame([row]))
+
+    assert list(execute_values.call_args.args[2]) == [
+        tuple(_trade_row("0xaa", 1)[column] for column in TRADE_COLUMNS)
+    ]
+
+
+def test_pooled_connections_are_reused(mock_connection):
+    with patch(
+        "cow_swap.database.db_provider.pool.ThreadedConnectionPool"
+    ) as mock_pool_class:
+        mock_pool = mock_pool_class.return_value
+        mock_pool.getconn.return_value = mock_connection[0]
+        mock_connection[0].closed = 0
+        provider = PostgreSQLProvider(
+            dbname="test_db",
+            user="user",
+            password="pass",
+            host="localhost",
+            port=5432,
+            batch_size=100,
+            pool_size=4,
+        )
+
+        provider.truncate_table()
+        provider.truncate_table()
+        provider.close()
+
+    mock_pool_class.assert_called_once_with(
+        1,
+        4,
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+    )
+    assert mock_pool.putconn.call_count == 2
+    mock_connection[0].close.assert_not_called()
+    mock_pool.closeall.assert_called_once()
+
+
+def test_stream_after_execute_on_a_pooled_connection(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    modes = []
+
+    def cursor(name=None):
+        modes.append((name is not None, mock_conn.autocommit))
+        return mock_cursor
+
+    mock_conn.cursor.side_effect = cursor
+    mock_cursor.fetchmany.side_effect = [[(1,)], []]
+    with patch(
+        "cow_swap.database.db_provider.pool.ThreadedConnectionPool"
+    ) as mock_pool_class:
+        mock_pool_class.return_value.getconn.return_value = mock_conn
+        mock_conn.closed = 0
+        provider = PostgreSQLProvider(
+            dbname="test_db",
+            user="user",
+            password="pass",
+            host="localhost",
+            port=5432,
+            batch_size=100,
+            pool_size=4,
+        )
+
+        provider.truncate_table()
+        rows = list(provider.stream(sql.SQL("SELECT 1"), ()))
+
+    assert rows == [[(1,)]]
+    # the connection left in autocommit by execute is back in a transaction for the named cursor
+    assert modes == [(False, True), (True, False)]
+
+
+def test_listen_opens_a_dedicated_connection(mock_connection):
+    provider = PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+        pool_size=4,
+    )
+
+    listener = provider.listen()
+
+    assert listener.connection is mock_connection[0]
+    # LISTEN is bound to its session, so it never borrows a pooled connection
+    assert provider._pool is None
+    assert "batch_completed" in repr(mock_connection[1].execute.call_args.args[0])
+
+
+def _provider():
+    return PostgreSQLProvider(
+        dbname="test_db",
+        user="user",
+        password="pass",
+        host="localhost",
+        port=5432,
+        batch_size=100,
+    )
+
+
+def test_batch_lock(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchone.return_value = (False,)
+
+    with _provider().batch_lock("ethereum", 20230101) as acquired:
+        assert acquired is False
+        mock_conn.close.assert_not_called()
+
+    mock_cursor.execute.assert_called_once_with(
+        "SELECT pg_try_advisory_lock(hashtext(%s), %s);", ("ethereum", 20230101)
+    )
+    # the lock is released with its session
+    mock_conn.close.assert_called_once()
+
+
+def test_batch_lock_of_several_days(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    # the second day, across the month boundary, is held by another run
+    mock_cursor.fetchone.side_effect = [(True,), (False,), (True,)]
+
+    with _provider().batch_lock("ethereum", 20230131, days=3) as acquired:
+        assert acquired is False
+
+    assert [call.args[1] for call in mock_cursor.execute.call_args_list] == [
+        ("ethereum", 20230131),
+        ("ethereum", 20230201),
+    ]
+    # closing the session also releases the lock already taken on the first day
+    mock_conn.close.assert_called_once()
+
+
+def test_batch_lock_without_database():
+    with patch(
+        "cow_swap.database.db_provider.psycopg2.connect",
+        side_effect=psycopg2.OperationalError("connection refused"),
+    ):
+        with _provider().batch_lock("ethereum", 20230101) as acquired:
+            assert acquired is True
+
+
+def test_claim_work(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.fetchone.return_value = ("ethereum", "USDC-WETH", date(2023, 1, 1), 2)
+
+    unit = _provider().claim_work("worker-1", lease_seconds=60, max_attempts=3)
+
+    assert unit == WorkUnit("ethereum", "USDC-WETH", date(2023, 1, 1), 2)
+    claim = mock_cursor.execute.call_args_list[-1]
+    assert "FOR UPDATE SKIP LOCKED" in claim.args[0]
+    assert claim.args[1] == {"worker": "worker-1", "lease": 60, "max_attempts": 3}
+    assert mock_conn.autocommit is False
+
+    mock_cursor.fetchone.return_value = None
+    assert _provider().claim_work("worker-1", 60, 3) is None
+
+
+def test_work_updates_require_the_lease(mock_connection):
+    _, mock_cursor = mock_connection
+    unit = WorkUnit("ethereum", "USDC-WETH", date(2023, 1, 1), 3)
+    provider = _provider()
+
+    mock_cursor.rowcount = 1
+    assert provider.fail_work(unit, "worker-1", "boom", 3, 60)
+    query, params = mock_cursor.execute.call_args.args
+    assert "worker = %(worker)s" in query and "'failed'" in query
+    assert params["worker"] == "worker-1" and params["error"] == "boom"
+
+    mock_cursor.rowcount = 0
+    assert not provider.heartbeat_work(unit, "worker-1", 60)
+
+
+def test_trade_digests(mock_connection):
+    _, mock_cursor = mock_connection
+    mock_cursor.__iter__.return_value = iter(
+        [(1672531200, 2, 300), (1672534800, 1, 2**60 - 1)]
+    )
+
+    digests = _provider().trade_digests(20230101, "ethereum", "USDC-WETH")
+
+    query, params = mock_cursor.execute.call_args.args
+    assert "GROUP BY 1" in query and "md5(lower(tx_hash)" in query
+    assert params == (20230101, "ethereum", "USDC-WETH")
+    assert digests.index.tolist() == [1672531200, 1672534800]
+    assert digests["trade_count"].tolist() == [2, 1]
+    assert digests["key_hash"].tolist() == [300, 2**60 - 1]
+
+
+def test_replace_trades(mock_connection):
+    mock_conn, mock_cursor = mock_connection
+    mock_cursor.rowcount = 3
+    trades_df = pd.DataFrame([_trade_row("0xaa", 1)])
+
+    with patch("cow_swap.database.db_provider.extras.execute_values") as execute_values:
+        deleted = _provider().replace_trades(
+            trades_df, "ethereum", "WETH/USDC", 1672444800, 1672448400
+        )
+
+    assert deleted == 3
+    query, params = mock_cursor.execute.call_args.args
+    assert query.strip().startswith("DELETE FROM cow_swap_trades")
+    assert params["start_batch"] == params["end_batch"] == 20221231
+    assert (params["start"], params["end"]) == (1672444800, 1672448400)
+    assert list(execute_values.call_args.args[2]) == [
+        tuple(_trade_row("0xaa", 1)[column] for column in TRADE_COLUMNS)
+    ]
+    assert mock_conn.autocommit is False
+
+
+def test_daily_trade_counts(mock_connection):
+    _, mock_cursor = mock_connection
+    mock_cursor.fetchall.return_value = [(20230101, 120), (20230102, 80)]
+
+    counts = _provider().daily_trade_counts("ethereum", "USDC-WETH", 20230101, 20230107)
+
+    assert counts == {20230101: 120, 20230102: 80}
+    assert mock_cursor.execute.call_args.args[1] == (
+        20230101,
+        20230107,
+        "ethereum",
+        "USDC-WETH",
+    )
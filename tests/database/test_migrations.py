@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+from cow_swap.database.migrations import (
+    MIGRATIONS,
+    SCHEMA_VERSION,
+    apply_migrations,
+    get_schema_version,
+    pending_migrations,
+)
+
+
+def test_migrations_are_ordered():
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+    assert SCHEMA_VERSION == versions[-1]
+
+
+def test_get_schema_version_unversioned_database():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (False,)
+
+    assert get_schema_version(cursor) == 0
+    cursor.execute.assert_called_once()
+
+
+def test_pending_migrations():
+    assert pending_migrations(0) == MIGRATIONS
+    assert pending_migrations(SCHEMA_VERSION) == []
+    assert [m.version for m in pending_migrations(1)] == [
+        m.version for m in MIGRATIONS[1:]
+    ]
+
+
+def test_apply_migrations_from_scratch():
+    cursor = MagicMock()
+    # version probe, then re-read under the lock
+    cursor.fetchone.side_effect = [(False,), (True,), (0,)]
+
+    assert apply_migrations(cursor) == SCHEMA_VERSION
+
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert "pg_advisory_xact_lock" in statements[1]
+    assert "CREATE TABLE IF NOT EXISTS schema_migrations" in statements[2]
+    for migration in MIGRATIONS:
+        assert migration.statements in statements
+    recorded = [
+        call.args[1]
+        for call in cursor.execute.call_args_list
+        if call.args[0].startswith("INSERT INTO schema_migrations")
+    ]
+    assert recorded == [(m.version, m.description) for m in MIGRATIONS]
+
+
+def test_apply_migrations_up_to_date():
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [(True,), (SCHEMA_VERSION,)]
+
+    assert apply_migrations(cursor) == SCHEMA_VERSION
+    assert cursor.execute.call_count == 2
+
+
+def test_first_migration_copies_the_legacy_trades():
+    statements = MIGRATIONS[0].statements
+
+    assert "RENAME TO cow_swap_trades_legacy" in statements
+    # the legacy months get their partitions before the rows are copied into them
+    assert statements.index("PARTITION OF cow_swap_trades") < statements.index(
+        "INSERT INTO cow_swap_trades"
+    )
+    assert "'legacy:' || block_number, 0, block_number" in statements
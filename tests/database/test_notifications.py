@@ -0,0 +1,118 @@
+import asyncio
+import json
+import socket
+from unittest.mock import MagicMock, patch
+
+from psycopg2 import sql
+from psycopg2.extensions import Notify
+
+from cow_swap.database.notifications import (
+    BatchEvent,
+    BatchListener,
+    parse_batch_event,
+)
+
+
+def _payload(batch_id=20230101, average=0.5, row_count=3):
+    return json.dumps(
+        {
+            "batch_id": batch_id,
+            "chain": "ethereum",
+            "average_improvement": average,
+            "row_count": row_count,
+        }
+    )
+
+
+def _listener(connection):
+    with patch("psycopg2.connect", return_value=connection) as connect:
+        listener = BatchListener(dbname="test_db", host="localhost")
+    connect.assert_called_once_with(dbname="test_db", host="localhost")
+    return listener
+
+
+def test_parse_batch_event():
+    assert parse_batch_event(_payload()) == BatchEvent(20230101, "ethereum", 0.5, 3)
+    assert parse_batch_event(_payload(average=None)).average_improvement is None
+
+
+def test_listener_listens_on_the_batch_channel():
+    connection = MagicMock()
+    _listener(connection)
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.execute.assert_called_once_with(
+        sql.SQL("LISTEN {}").format(sql.Identifier("batch_completed"))
+    )
+
+
+def _poll_from(reader, connection, payload):
+    # each byte written to the socket stands for one notification received by the connection
+    reader.setblocking(False)
+
+    def poll():
+        try:
+            data = reader.recv(16)
+        except BlockingIOError:
+            return
+        connection.notifies.extend(Notify(1, "batch_completed", payload) for _ in data)
+
+    return poll
+
+
+def test_listener_waits_for_events():
+    reader, writer = socket.socketpair()
+    connection = MagicMock()
+    connection.fileno.return_value = reader.fileno()
+    connection.notifies = []
+    connection.poll.side_effect = _poll_from(reader, connection, _payload())
+    listener = _listener(connection)
+
+    try:
+        assert listener.wait(timeout=0) == []
+        writer.send(b"xx")
+        assert (
+            listener.wait(timeout=1) == [BatchEvent(20230101, "ethereum", 0.5, 3)] * 2
+        )
+        assert list(listener.events(timeout=0)) == []
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_listener_skips_malformed_payloads():
+    reader, writer = socket.socketpair()
+    connection = MagicMock()
+    connection.fileno.return_value = reader.fileno()
+    connection.notifies = []
+    connection.poll.side_effect = _poll_from(reader, connection, "{")
+    listener = _listener(connection)
+
+    try:
+        writer.send(b"x")
+        assert listener.wait(timeout=1) == []
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_listener_events_async():
+    reader, writer = socket.socketpair()
+    connection = MagicMock()
+    connection.fileno.return_value = reader.fileno()
+    connection.notifies = []
+    connection.poll.side_effect = _poll_from(reader, connection, _payload())
+    listener = _listener(connection)
+
+    async def first_event():
+        events = listener.events_async()
+        asyncio.get_running_loop().call_later(0.05, writer.send, b"x")
+        try:
+            return await asyncio.wait_for(events.__anext__(), timeout=2)
+        finally:
+            await events.aclose()
+
+    try:
+        assert asyncio.run(first_event()) == BatchEvent(20230101, "ethereum", 0.5, 3)
+    finally:
+        reader.close()
+        writer.close()
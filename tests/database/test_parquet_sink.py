@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cow_swap.database.parquet_sink import ParquetLakeSink, read_lake
+
+
+@pytest.fixture
+def matched_df():
+    return pd.DataFrame(
+        {
+            "token_pair": ["USDC-WETH", "USDC-WETH", "WETH/DAI", "USDC-WETH"],
+            "block_timestamp": [1672617600, 1672531300, 1672531200, 1672531200],
+            "price_improvement": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+
+def test_write_batch_partitions_by_pair_and_date(tmp_path, matched_df):
+    sink = ParquetLakeSink(str(tmp_path), row_group_size=1)
+
+    written = sink.write_batch(matched_df, 20230101)
+
+    relative = sorted(os.path.relpath(path, tmp_path) for path in written)
+    assert relative == [
+        "token_pair=USDC-WETH/date=2023-01-01/part-20230101.parquet",
+        "token_pair=USDC-WETH/date=2023-01-02/part-20230101.parquet",
+        "token_pair=WETH%2FDAI/date=2023-01-01/part-20230101.parquet",
+    ]
+    assert not list(tmp_path.rglob(".tmp-*"))
+
+
+def test_write_batch_is_idempotent(tmp_path, matched_df):
+    sink = ParquetLakeSink(str(tmp_path))
+    sink.write_batch(matched_df, 20230101)
+    sink.write_batch(matched_df, 20230101)
+
+    assert len(read_lake(str(tmp_path))) == len(matched_df)
+
+
+def test_read_lake_pushdown(tmp_path, matched_df):
+    ParquetLakeSink(str(tmp_path), row_group_size=1).write_batch(matched_df, 20230101)
+
+    df = read_lake(
+        str(tmp_path),
+        columns=["block_timestamp", "price_improvement"],
+        filters=[
+            ("token_pair", "=", "USDC-WETH"),
+            ("date", "=", "2023-01-01"),
+            ("price_improvement", ">", 2.5),
+        ],
+    )
+
+    assert df.to_dict("list") == {
+        "block_timestamp": [1672531200],
+        "price_improvement": [4.0],
+    }
+
+
+def test_read_lake_decodes_partition_values(tmp_path, matched_df):
+    ParquetLakeSink(str(tmp_path)).write_batch(matched_df, 20230101)
+
+    df = read_lake(str(tmp_path), filters=[("token_pair", "=", "WETH/DAI")])
+
+    assert df["price_improvement"].tolist() == [3.0]
+
+
+def test_write_batch_keeps_chains_apart(tmp_path, matched_df):
+    sink = ParquetLakeSink(str(tmp_path))
+    sink.write_batch(matched_df.assign(chain="ethereum"), 20230101)
+    sink.write_batch(matched_df.assign(chain="gnosis"), 20230101)
+
+    df = read_lake(str(tmp_path), filters=[("chain", "=", "gnosis")])
+
+    assert len(read_lake(str(tmp_path))) == 2 * len(matched_df)
+    assert sorted(df["price_improvement"]) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_lake_writer_appends_chunks_to_the_batch_files(tmp_path, matched_df):
+    sink = ParquetLakeSink(str(tmp_path))
+    ordered_df = matched_df.sort_values("block_timestamp", kind="stable")
+    writer = sink.open_writer()
+
+    writer.write(ordered_df.iloc[:2], 20230101)
+    writer.write(ordered_df.iloc[2:], 20230101)
+    assert not list(tmp_path.rglob("part-*"))
+    written = writer.close()
+
+    relative = sorted(os.path.relpath(path, tmp_path) for path in written)
+    assert relative == [
+        "token_pair=USDC-WETH/date=2023-01-01/part-20230101.parquet",
+        "token_pair=USDC-WETH/date=2023-01-02/part-20230101.parquet",
+        "token_pair=WETH%2FDAI/date=2023-01-01/part-20230101.parquet",
+    ]
+    assert pd.read_parquet(written[0])["price_improvement"].tolist() == [4.0, 2.0]
+    assert not list(tmp_path.rglob(".tmp-*"))
+
+
+def test_lake_writer_abort_keeps_the_previous_files(tmp_path, matched_df):
+    sink = ParquetLakeSink(str(tmp_path))
+    sink.write_batch(matched_df, 20230101)
+    writer = sink.open_writer()
+
+    writer.write(matched_df.iloc[:1], 20230101)
+    writer.abort()
+
+    assert len(read_lake(str(tmp_path))) == len(matched_df)
+    assert not list(tmp_path.rglob(".tmp-*"))
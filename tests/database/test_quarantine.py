@@ -0,0 +1,37 @@
+import pandas as pd
+
+from cow_swap.database.quarantine import QuarantineSink
+
+
+def test_write_replaces_previous_attempt(tmp_path):
+    sink = QuarantineSink(str(tmp_path))
+    rejected_df = pd.DataFrame({"tx_hash": ["0xaa"], "reject_reason": ["null_price"]})
+
+    path = sink.write(rejected_df, "query=1/day=2021-01-01")
+    sink.write(rejected_df, "query=1/day=2021-01-01")
+
+    pd.testing.assert_frame_equal(pd.read_parquet(path), rejected_df)
+    assert len(list(tmp_path.rglob("*.parquet*"))) == 1
+
+    assert sink.write(rejected_df.iloc[:0], "query=1/day=2021-01-01") is None
+    assert not list(tmp_path.rglob("*.parquet*"))
+
+
+def test_read_concatenates_every_run_under_a_prefix(tmp_path):
+    sink = QuarantineSink(str(tmp_path))
+    sink.write(
+        pd.DataFrame({"tx_hash": ["0xaa"], "evt_index": [0]}), "query=1/day=2021-01-01"
+    )
+    sink.write(
+        pd.DataFrame({"tx_hash": ["0xbb"], "evt_index": [1]}),
+        "query=1/day=2021-01-01/refill=1609459200",
+    )
+    sink.write(
+        pd.DataFrame({"tx_hash": ["0xcc"], "evt_index": [2]}), "query=1/day=2021-01-02"
+    )
+
+    rejected_df = sink.read("query=1/day=2021-01-01", columns=["tx_hash"])
+
+    assert sorted(rejected_df["tx_hash"]) == ["0xaa", "0xbb"]
+    assert list(rejected_df.columns) == ["tx_hash"]
+    assert sink.read("query=2").empty
@@ -0,0 +1,94 @@
+import json
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from cow_swap.database.spool import LocalSpool
+
+
+@pytest.fixture
+def trades_df():
+    return pd.DataFrame(
+        {
+            "batch_id": [20230102, 20230102],
+            "tx_hash": ["0xaa", "0xbb"],
+            "evt_index": [1, 2],
+            "price_improvement": [1.5, -0.5],
+        }
+    )
+
+
+def test_spool_and_read_back(tmp_path, trades_df):
+    spool = LocalSpool(str(tmp_path))
+
+    spool.spool(20230102, trades_df.iloc[:1], 1.5)
+    spool.spool(20230102, trades_df.iloc[1:], 0.5)
+
+    assert spool.pending_batches() == [20230102]
+    manifest = spool.read_manifest(20230102)
+    assert [segment["rows"] for segment in manifest["segments"]] == [1, 1]
+    assert manifest["average_improvements"] == {"ethereum": 0.5}
+    pd.testing.assert_frame_equal(spool.read_batch(20230102), trades_df)
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_replay_loads_batches_in_order(tmp_path, trades_df):
+    spool = LocalSpool(str(tmp_path))
+    spool.spool(20230103, trades_df.assign(batch_id=20230103), 2.0)
+    spool.spool(20230102, trades_df, 1.0)
+    provider = MagicMock()
+
+    assert spool.replay(provider) == [20230102, 20230103]
+
+    assert [call.args for call in provider.insert_batch_improvement.call_args_list] == [
+        (20230102, 1.0, "ethereum"),
+        (20230103, 2.0, "ethereum"),
+    ]
+    assert spool.pending_batches() == []
+
+
+def test_replay_loads_improvement_of_each_chain(tmp_path, trades_df):
+    spool = LocalSpool(str(tmp_path))
+    spool.spool(20230102, trades_df.assign(chain="ethereum"), 1.0)
+    spool.spool(20230102, trades_df.assign(chain="gnosis"), 3.0, chain="gnosis")
+    provider = MagicMock()
+
+    spool.replay(provider)
+
+    assert [call.args for call in provider.insert_batch_improvement.call_args_list] == [
+        (20230102, 1.0, "ethereum"),
+        (20230102, 3.0, "gnosis"),
+    ]
+    assert provider.insert_trade_data_batch.call_args.args[0]["chain"].tolist() == [
+        "ethereum",
+        "ethereum",
+        "gnosis",
+        "gnosis",
+    ]
+
+
+def test_replay_reads_single_chain_manifests(tmp_path, trades_df):
+    spool = LocalSpool(str(tmp_path))
+    spool.spool(20230102, trades_df, 1.0)
+    manifest_path = tmp_path / "batch=20230102" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest["average_improvement"] = manifest.pop("average_improvements")["ethereum"]
+    manifest_path.write_text(json.dumps(manifest))
+    provider = MagicMock()
+
+    spool.replay(provider)
+
+    provider.insert_batch_improvement.assert_called_once_with(20230102, 1.0, "ethereum")
+
+
+def test_replay_keeps_batch_on_failure(tmp_path, trades_df):
+    spool = LocalSpool(str(tmp_path))
+    spool.spool(20230102, trades_df, 1.0)
+    provider = MagicMock()
+    provider.insert_trade_data_batch.side_effect = RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        spool.replay(provider)
+
+    assert spool.pending_batches() == [20230102]
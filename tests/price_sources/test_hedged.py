@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from cow_swap.price_sources import HedgedPriceSource, PriceSource, median_prices
+
+
+class StandInSource(PriceSource):
+    def __init__(self, name, prices=None, delay=0.0, error=None):
+        self.name = name
+        self.prices = prices
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def get_historical_prices(
+        self, min_block_time, max_block_time, sell_token="weth", buy_token="usdc"
+    ):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        if self.prices is None:
+            return None
+        return pd.DataFrame({"block_timestamp": [100, 200], "price": self.prices})
+
+
+def test_fast_primary_is_not_hedged():
+    primary = StandInSource("primary", [1.0, 2.0])
+    secondary = StandInSource("secondary", [9.0, 9.0])
+
+    df = HedgedPriceSource([primary, secondary], hedge_after=1.0).get_historical_prices(
+        100, 200
+    )
+
+    assert df["price"].tolist() == [1.0, 2.0]
+    assert secondary.calls == 0
+
+
+def test_slow_primary_is_hedged():
+    primary = StandInSource("primary", [1.0, 2.0], delay=1.0)
+    secondary = StandInSource("secondary", [3.0, 4.0])
+
+    started = time.monotonic()
+    df = HedgedPriceSource(
+        [primary, secondary], hedge_after=0.05
+    ).get_historical_prices(100, 200)
+
+    assert df["price"].tolist() == [3.0, 4.0]
+    assert time.monotonic() - started < 0.5
+
+
+def test_failed_source_falls_through_immediately():
+    primary = StandInSource("primary", error=RuntimeError("rate limited"))
+    empty = StandInSource("empty")
+    tertiary = StandInSource("tertiary", [5.0, 6.0])
+
+    started = time.monotonic()
+    df = HedgedPriceSource(
+        [primary, empty, tertiary], hedge_after=5.0
+    ).get_historical_prices(100, 200)
+
+    assert df["price"].tolist() == [5.0, 6.0]
+    assert time.monotonic() - started < 1.0
+
+
+def test_no_answer_returns_none():
+    source = HedgedPriceSource(
+        [StandInSource("slow", [1.0, 2.0], delay=1.0)], timeout=0.05
+    )
+
+    assert source.get_historical_prices(100, 200) is None
+
+
+def test_median_outvotes_bad_provider():
+    sources = [
+        StandInSource("a", [1.0, 2.0]),
+        StandInSource("b", [1.2, 2.2], delay=0.02),
+        StandInSource("bad", [100.0, 200.0], delay=0.04),
+    ]
+
+    df = HedgedPriceSource(
+        sources, hedge_after=0.01, reconcile="median", quorum=3
+    ).get_historical_prices(100, 200)
+
+    assert df["price"].tolist() == [1.2, 2.2]
+
+
+def test_concurrent_calls_do_not_queue_behind_each_other():
+    sources = [
+        StandInSource("primary", [1.0, 2.0], delay=0.3),
+        StandInSource("secondary", [1.0, 2.0], delay=0.3),
+    ]
+    hedged = HedgedPriceSource(
+        sources, hedge_after=0.0, reconcile="median", max_concurrent_calls=2
+    )
+    callers = [
+        threading.Thread(target=hedged.get_historical_prices, args=(0, 300))
+        for _ in range(2)
+    ]
+
+    started = time.monotonic()
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    # each call gets a worker per source, so both calls take one source delay
+    assert time.monotonic() - started < 0.5
+    assert [source.calls for source in sources] == [2, 2]
+
+
+def test_median_prices_aligns_timestamps():
+    first = pd.DataFrame({"block_timestamp": [100, 200], "price": [1.0, 2.0]})
+    other = pd.DataFrame({"block_timestamp": [150, 90], "price": [4.0, 3.0]})
+
+    df = median_prices([first, other])
+
+    assert df["block_timestamp"].tolist() == [100, 200]
+    assert df["price"].tolist() == [2.0, 3.0]
+
+
+def test_unknown_reconcile_mode():
+    with pytest.raises(ValueError):
+        HedgedPriceSource([StandInSource("a")], reconcile="mean")
@@ -0,0 +1,26 @@
+from cow_swap.price_sources import StoredPriceSource
+from cow_swap.price_store import PriceTimeSeriesStore
+
+
+def test_stored_source_serves_covered_ranges(tmp_path):
+    store = PriceTimeSeriesStore(str(tmp_path))
+    store.append("ethereum", [900, 1200, 1500, 1800], [1.0, 2.0, 3.0, 4.0])
+    source = StoredPriceSource(store, max_gap_seconds=600)
+
+    df = source.get_historical_prices(1000, 1700)
+
+    assert df["block_timestamp"].tolist() == [900, 1200, 1500]
+
+
+def test_stored_source_rejects_uncovered_ranges(tmp_path):
+    store = PriceTimeSeriesStore(str(tmp_path))
+    store.append("ethereum", [900, 1200, 3000], [1.0, 2.0, 3.0])
+    source = StoredPriceSource(store, max_gap_seconds=600)
+
+    # starts before the history
+    assert source.get_historical_prices(800, 1200) is None
+    # a gap longer than max_gap_seconds
+    assert source.get_historical_prices(1000, 3000) is None
+    # ends after the history
+    assert source.get_historical_prices(1000, 2000) is None
+    assert source.get_historical_prices(1000, 1100, "btc", "eth") is None
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from cow_swap.chains import resolve_chains, trade_query_parameters
+
+
+def test_resolve_chains_defaults_to_ethereum():
+    chains = resolve_chains({"dune_api": {"query_id": 123}})
+
+    assert chains == [
+        {
+            "name": "ethereum",
+            "query_id": 123,
+            "currencies": {"currency_1": "weth", "currency_2": "usdc"},
+        }
+    ]
+
+
+def test_resolve_chains_overrides_currencies():
+    chains = resolve_chains(
+        {
+            "currencies": {"currency_1": "weth", "currency_2": "usdc"},
+            "chains": [
+                {"name": "ethereum", "query_id": 1},
+                {"name": "gnosis", "query_id": 2, "currencies": {"currency_2": "usdc"}},
+            ],
+        }
+    )
+
+    assert [chain["query_id"] for chain in chains] == [1, 2]
+    assert chains[1]["currencies"] == {"currency_1": "weth", "currency_2": "usdc"}
+
+
+def test_resolve_chains_rejects_duplicates():
+    with pytest.raises(ValueError):
+        resolve_chains(
+            {
+                "chains": [
+                    {"name": "gnosis", "query_id": 1},
+                    {"name": "gnosis", "query_id": 2},
+                ]
+            }
+        )
+
+
+def test_trade_query_parameters():
+    chain = resolve_chains({"dune_api": {"query_id": 1}})[0]
+    start_time = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+    parameters = trade_query_parameters(
+        chain, start_time, start_time + timedelta(days=1)
+    )
+
+    assert parameters == {
+        "token_pair": "USDC-WETH",
+        "tokens": ["weth", "usdc"],
+        "start_time": start_time,
+        "end_time": datetime(2021, 1, 2, tzinfo=timezone.utc),
+    }
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from cow_swap.checkpoint import CheckpointStore, hash_frame, hash_inputs
+
+
+def test_hash_frame_ignores_index():
+    df = pd.DataFrame({"price": [1.0, 2.0]})
+    assert hash_frame(df) == hash_frame(df.set_axis([10, 11]))
+    assert hash_frame(df) != hash_frame(df.assign(price=[1.0, 3.0]))
+
+
+def test_hash_inputs_is_stable():
+    assert hash_inputs(123, "2023-01-01") == hash_inputs(123, "2023-01-01")
+    assert hash_inputs(123, "2023-01-01") != hash_inputs(123, "2023-01-02")
+
+
+def test_run_stage_resumes_with_same_inputs(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    df = pd.DataFrame({"block_timestamp": [1, 2], "price": [10.0, 11.0]})
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return df, {"rows": 2}
+
+    first = store.run_stage("query=1/day=2023-01-01", "prices", (1, 2), compute)
+    second = store.run_stage("query=1/day=2023-01-01", "prices", (1, 2), compute)
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(second[0], df)
+    assert second[1] == {"rows": 2}
+    assert second[2] == first[2] == hash_frame(df)
+
+
+def test_run_stage_recomputes_on_changed_inputs(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({"price": [float(len(calls))]}), {}
+
+    store.run_stage("run", "matched", ("a",), compute)
+    df, _, _ = store.run_stage("run", "matched", ("b",), compute)
+
+    assert len(calls) == 2
+    assert df["price"].tolist() == [2.0]
+
+
+def test_load_rejects_corrupted_checkpoint(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.save("run", "trades", "hash", pd.DataFrame({"a": [1]}), {})
+
+    with open(tmp_path / "run" / "trades.parquet", "ab") as file:
+        file.write(b"garbage")
+
+    assert store.load("run", "trades", "hash") is None
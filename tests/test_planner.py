@@ -0,0 +1,50 @@
+from cow_swap.planner import plan_execution
+
+
+def test_small_runs_are_matched_in_memory():
+    plan = plan_execution(1_000, budget_bytes=10**8, row_bytes=100)
+
+    assert plan.strategy == "in_memory"
+    assert (plan.chunk_rows, plan.writer_workers, plan.shard_workers) == (None, 0, 0)
+    # four resident frames plus three frames of working memory
+    assert plan.estimated_peak_bytes == 700_000
+
+
+def test_large_runs_are_sharded_when_they_fit():
+    plan = plan_execution(
+        1_000_000,
+        budget_bytes=10**9,
+        row_bytes=100,
+        cpu_count=8,
+        min_shard_rows=250_000,
+    )
+
+    assert plan.strategy == "sharded"
+    assert plan.shard_workers == 4
+
+    assert plan_execution(1_000_000, 10**9, row_bytes=100).strategy == "in_memory"
+
+
+def test_runs_over_budget_are_chunked():
+    plan = plan_execution(
+        1_000_000,
+        budget_bytes=34 * 10**7,
+        row_bytes=100,
+        working_factor=3.0,
+        max_pending=2,
+        writer_workers=3,
+        min_chunk_rows=1_000,
+    )
+
+    assert plan.strategy == "chunked"
+    # 200 MB resident leaves 140 MB for chunks costing 700 bytes per trade
+    assert plan.chunk_rows == 200_000
+    assert plan.writer_workers == 2
+    assert plan.estimated_peak_bytes <= plan.budget_bytes
+
+    starved = plan_execution(
+        1_000_000, budget_bytes=10**8, row_bytes=100, min_chunk_rows=1_000
+    )
+    assert starved.chunk_rows == 1_000
+    assert starved.estimated_peak_bytes > starved.budget_bytes
+    assert "chunked plan for ~1000000 trades" in starved.describe()
@@ -6,6 +6,7 @@ from cow_swap.price_calculation import (
     calculate_trade_price,
     calculate_price_improvement,
     calculate_average_price_improvement,
+    calculate_rollup_deltas,
 )
 
 
@@ -87,3 +88,32 @@ def test_calculate_average_price_improvement():
     nan_df = pd.DataFrame({"price_improvement": [float("nan"), float("nan")]})
     result_nan = calculate_average_price_improvement(nan_df)
     assert math.isnan(result_nan)
+
+
+def test_calculate_rollup_deltas():
+    df = pd.DataFrame(
+        {
+            "block_timestamp": [1672444800, 1672445000, 1672448400, 1672444900],
+            "token_pair": ["USDC-WETH", "USDC-WETH", "USDC-WETH", "DAI-WETH"],
+            "units_sold": [1.0, 3.0, 2.0, 1.0],
+            "trade_price": [100.0, 104.0, 110.0, 90.0],
+            "price_improvement": [2.0, -1.0, 4.0, 0.5],
+        }
+    )
+
+    deltas = calculate_rollup_deltas(df, 3600)
+
+    expected_df = pd.DataFrame(
+        {
+            "bucket_start": [1672444800, 1672444800, 1672448400],
+            "token_pair": ["DAI-WETH", "USDC-WETH", "USDC-WETH"],
+            "trade_count": [1, 2, 1],
+            "improvement_sum": [0.5, 1.0, 4.0],
+            "volume_sum": [1.0, 4.0, 2.0],
+            "weighted_improvement_sum": [0.5, -1.0, 8.0],
+            "weighted_price_sum": [90.0, 412.0, 220.0],
+            "min_improvement": [0.5, -1.0, 4.0],
+            "max_improvement": [0.5, 2.0, 4.0],
+        }
+    )
+    pd.testing.assert_frame_equal(deltas, expected_df, check_dtype=False)
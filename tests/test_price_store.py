@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pytest
+
+from cow_swap.price_store import PriceTimeSeriesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceTimeSeriesStore(str(tmp_path))
+
+
+def test_empty_coin(store):
+    timestamps, prices = store.arrays("ethereum")
+    assert len(timestamps) == 0 and len(prices) == 0
+    assert store.lookup("ethereum", 100) is None
+    assert np.isnan(store.lookup_many("ethereum", np.array([100]))).all()
+
+
+def test_append_skips_known_timestamps(store):
+    assert store.append("ethereum", [100, 200, 200], [1.0, 2.0, 2.5]) == 2
+    assert store.append("ethereum", [200, 300], [9.0, 3.0]) == 1
+
+    timestamps, prices = store.arrays("ethereum")
+    np.testing.assert_array_equal(timestamps, [100, 200, 300])
+    np.testing.assert_array_equal(prices, [1.0, 2.5, 3.0])
+
+
+def test_backfill_is_merged_in_order(store):
+    store.append("ethereum", [300, 400], [3.0, 4.0])
+    assert store.append("ethereum", [350, 100], [3.5, 1.0]) == 2
+
+    timestamps, prices = store.arrays("ethereum")
+    np.testing.assert_array_equal(timestamps, [100, 300, 350, 400])
+    np.testing.assert_array_equal(prices, [1.0, 3.0, 3.5, 4.0])
+
+
+def test_lookup_returns_last_price_before_timestamp(store):
+    store.append("ethereum", [100, 200, 300], [1.0, 2.0, 3.0])
+
+    assert store.lookup("ethereum", 99) is None
+    assert store.lookup("ethereum", 200) == 2.0
+    assert store.lookup("ethereum", 299) == 2.0
+    np.testing.assert_array_equal(
+        store.lookup_many("ethereum", np.array([50, 150, 1000])), [np.nan, 1.0, 3.0]
+    )
+
+
+def test_range_is_inclusive(store):
+    store.append("ethereum", [100, 200, 300, 400], [1.0, 2.0, 3.0, 4.0])
+
+    timestamps, prices = store.range("ethereum", 200, 300)
+    np.testing.assert_array_equal(timestamps, [200, 300])
+    np.testing.assert_array_equal(prices, [2.0, 3.0])
+    assert list(store.range_frame("ethereum", 0, 150)["price"]) == [1.0]
+
+
+def test_arrays_wait_for_a_rewrite_in_progress(store):
+    store.append("ethereum", [300, 400], [3.0, 4.0])
+    mapped = []
+
+    with store._lock("ethereum"):
+        reader = threading.Thread(
+            target=lambda: mapped.append(store.arrays("ethereum"))
+        )
+        reader.start()
+        reader.join(timeout=0.2)
+        # a reader never maps one file of the old pair next to one of the new pair
+        assert reader.is_alive()
+    reader.join()
+
+    timestamps, prices = mapped[0]
+    np.testing.assert_array_equal(timestamps, [300, 400])
+    np.testing.assert_array_equal(prices, [3.0, 4.0])
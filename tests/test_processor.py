@@ -1,13 +1,18 @@
+from datetime import date
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
 import pytest
+from cow_swap.apis.dune_fetcher import TRADE_QUERY_COLUMNS, DuneDataFetcher
+from cow_swap.backends import ShardedBackend
+from cow_swap.checkpoint import CheckpointStore
 from cow_swap.utils import generate_batch_id
 from cow_swap.processor import (
     Processor,
     NoTradesException,
     NoPricesException,
     NoMatchedException,
+    BatchLockedException,
 )
 
 
@@ -72,6 +77,86 @@ def test_fetch_and_process_trades_success(processor, mock_dune_fetcher):
     assert max_block_time == 1609459260
 
 
+def test_fetch_and_process_trades_keeps_the_chain_tokens(processor, mock_dune_fetcher):
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "buy_token": ["WETH", "DAI", "USDC"],
+                "sell_token": ["DAI", "WETH", "WETH"],
+                "block_time": ["2021-01-01 00:00:00"] * 3,
+            }
+        ),
+        (1609459200, 1609459200),
+    )
+
+    trades_df, _, _ = processor.fetch_and_process_trades(
+        123, "gnosis", currencies={"currency_1": "WETH", "currency_2": "DAI"}
+    )
+
+    assert trades_df["buy_token"].tolist() == ["WETH", "DAI"]
+
+
+def test_process_skips_a_batch_locked_by_another_run(
+    processor, mock_dune_fetcher, mock_pgsql_provider
+):
+    mock_pgsql_provider.batch_lock.return_value.__enter__.return_value = False
+
+    with pytest.raises(BatchLockedException):
+        processor.process(target_day=date(2021, 1, 1))
+
+    mock_pgsql_provider.batch_lock.assert_called_once_with("ethereum", 20210101, 1)
+    mock_dune_fetcher.get_query_results_as_dataframe.assert_not_called()
+
+
+def test_process_locks_every_day_of_its_window(
+    processor, mock_dune_fetcher, mock_pgsql_provider
+):
+    processor.config = {
+        "dune_api": {"query_id": 123, "parameterized": True, "window_days": 3}
+    }
+    mock_pgsql_provider.batch_lock.return_value.__enter__.return_value = False
+
+    with pytest.raises(BatchLockedException):
+        processor.process(target_day=date(2021, 1, 1))
+
+    mock_pgsql_provider.batch_lock.assert_called_once_with("ethereum", 20210101, 3)
+
+
+def test_process_runs_parameterised_query(
+    processor, mock_dune_fetcher, mock_coingecko_client, mock_pgsql_provider
+):
+    processor.config = {"dune_api": {"query_id": 123, "parameterized": True}}
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "block_time": ["2021-01-01 00:00:30.000 UTC"] * 2,
+                "buy_token": ["WETH", "DAI"],
+                "sell_token": ["USDC", "USDC"],
+                "buy_price": [101.0, 1.0],
+                "sell_price": [1.0, 1.0],
+                "block_timestamp": [1609459230] * 2,
+            }
+        ),
+        (1609459230, 1609459230),
+    )
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+
+    processor.process(target_day=date(2021, 1, 1))
+
+    call = mock_dune_fetcher.get_query_results_as_dataframe.call_args
+    assert call.args == (123,)
+    assert call.kwargs["columns"] == TRADE_QUERY_COLUMNS
+    parameters = call.kwargs["parameters"]
+    assert parameters["token_pair"] == "USDC-WETH"
+    assert parameters["start_time"].isoformat() == "2021-01-01T00:00:00+00:00"
+    assert parameters["end_time"].isoformat() == "2021-01-02T00:00:00+00:00"
+    # the client-side filter still drops what the query should not have returned
+    saved_df = mock_pgsql_provider.insert_trade_data_batch.call_args.args[0]
+    assert saved_df["buy_token"].tolist() == ["WETH"]
+
+
 def test_fetch_and_process_trades_no_trades(processor, mock_dune_fetcher):
     mock_dune_fetcher.get_query_results_as_dataframe.return_value = (None, None)
 
@@ -138,7 +223,7 @@ def test_match_and_process_data_no_match(processor):
     )
 
     with patch(
-        "cow_swap.processor.match_prices_with_trades", return_value=None
+        "cow_swap.backends.pandas_backend.match_prices_with_trades", return_value=None
     ) as mock_match:
         print(f"mock_match called: {mock_match.called}")
         try:
@@ -148,6 +233,236 @@ def test_match_and_process_data_no_match(processor):
             pass
 
 
+def test_match_and_process_data_with_time_weighted_reference(processor):
+    processor.config["reference_price"] = {
+        "method": "twap",
+        "window_before": 30,
+        "window_after": 30,
+    }
+    trades_df = pd.DataFrame(
+        {
+            "buy_token": ["weth", "weth"],
+            "sell_token": ["usdc", "usdc"],
+            "block_timestamp": [1609459200, 1609459260],
+            "buy_price": [100.0, 100.0],
+            "sell_price": [1.0, 1.0],
+        }
+    )
+    price_df = pd.DataFrame(
+        {"block_timestamp": [1609459200, 1609459260], "price": [100.0, 102.0]}
+    )
+
+    matched_df = processor.match_and_process_data(trades_df, price_df)
+
+    # the first window is only covered after its first price, the second straddles the price change
+    assert matched_df["price"].tolist() == [100.0, 101.0]
+    processor.config["reference_price"]["window_before"] = 60
+    matched_df = processor.match_and_process_data(trades_df, price_df)
+    assert matched_df["price"].tolist() == pytest.approx([100.0, 100.0 * 2 / 3 + 34.0])
+    assert matched_df["price_improvement"].tolist() == [
+        100.0 - price for price in matched_df["price"]
+    ]
+
+
+@pytest.fixture
+def matched_df():
+    return pd.DataFrame(
+        {
+            "block_time": ["2021-01-01 00:00:00.000 UTC", "2021-01-01 00:01:00.000 UTC"],
+            "block_timestamp": [1609459200, 1609459260],
+            "price_improvement": [1.0, 2.0],
+        }
+    )
+
+
+def test_save_to_database_success(processor, mock_pgsql_provider, matched_df):
+    processor.save_to_database(matched_df)
+
+    mock_pgsql_provider.create_upcoming_partitions.assert_called_once_with(20210101)
+    saved_df = mock_pgsql_provider.insert_trade_data_batch.call_args.args[0]
+    assert saved_df["batch_id"].tolist() == [20210101, 20210101]
+    mock_pgsql_provider.insert_batch_improvement.assert_called_once_with(
+        20210101, 1.5, chain="ethereum"
+    )
+
+
+def test_save_to_database_splits_batches_per_day(processor, mock_pgsql_provider):
+    processor.spool = MagicMock()
+    mock_pgsql_provider.insert_trade_data_batch.side_effect = Exception("db down")
+    matched_df = pd.DataFrame(
+        {
+            "block_timestamp": [1609459140, 1609459260, 1609459320],
+            "price_improvement": [1.0, 2.0, 4.0],
+        }
+    )
+
+    processor.save_to_database(matched_df, chain="gnosis")
+
+    saved_df = mock_pgsql_provider.insert_trade_data_batch.call_args.args[0]
+    assert saved_df["batch_id"].tolist() == [20201231, 20210101, 20210101]
+    mock_pgsql_provider.create_upcoming_partitions.assert_any_call(20201231)
+    mock_pgsql_provider.create_upcoming_partitions.assert_any_call(20210101)
+    spooled = [
+        (call.args[0], len(call.args[1]), call.args[2], call.kwargs["chain"])
+        for call in processor.spool.spool.call_args_list
+    ]
+    assert spooled == [(20201231, 1, 1.0, "gnosis"), (20210101, 2, 3.0, "gnosis")]
+
+
+def test_save_to_database_exports_to_lake(processor, matched_df):
+    processor.lake_sink = MagicMock()
+
+    processor.save_to_database(matched_df)
+
+    exported_df, batch_id = processor.lake_sink.write_batch.call_args.args
+    assert batch_id == 20210101
+    assert exported_df["batch_id"].tolist() == [20210101, 20210101]
+
+
+def test_save_to_database_spools_on_failure(processor, mock_pgsql_provider, matched_df):
+    processor.spool = MagicMock()
+    mock_pgsql_provider.insert_trade_data_batch.side_effect = Exception("db down")
+
+    processor.save_to_database(matched_df)
+
+    batch_id, spooled_df, average_improvement = processor.spool.spool.call_args.args
+    assert batch_id == 20210101
+    assert len(spooled_df) == 2
+    assert average_improvement == 1.5
+
+
+def test_process_overlaps_compute_with_background_writes(
+    processor, mock_dune_fetcher, mock_coingecko_client, mock_pgsql_provider
+):
+    processor.config = {
+        "dune_api": {"query_id": 123},
+        "writer": {"workers": 1, "chunk_rows": 2},
+    }
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "block_time": ["2021-01-01 00:00:30.000 UTC"] * 5,
+                "buy_token": ["WETH"] * 5,
+                "sell_token": ["USDC"] * 5,
+                "buy_price": [101.0, 102.0, 103.0, 104.0, 105.0],
+                "sell_price": [1.0] * 5,
+                "block_timestamp": list(range(1609459230, 1609459235)),
+            }
+        ),
+        (1609459230, 1609459234),
+    )
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+    calls = []
+    mock_pgsql_provider.insert_trade_data_batch.side_effect = (
+        lambda df, **kwargs: calls.append(("trades", len(df)))
+    )
+    mock_pgsql_provider.insert_batch_improvement.side_effect = (
+        lambda *args, **kwargs: calls.append(("improvement", args[1]))
+    )
+
+    processor.process(target_day=date(2021, 1, 1))
+
+    # three chunks, then the aggregate of the whole day once they are all committed
+    assert calls == [("trades", 2), ("trades", 2), ("trades", 1), ("improvement", 3.0)]
+
+
+def test_save_to_database_raises_without_spool(
+    processor, mock_pgsql_provider, matched_df
+):
+    mock_pgsql_provider.migrate.side_effect = Exception("db down")
+
+    with pytest.raises(Exception, match="db down"):
+        processor.save_to_database(matched_df)
+
+
+def test_process_resumes_from_checkpoints(
+    tmp_path,
+    processor,
+    mock_dune_fetcher,
+    mock_coingecko_client,
+    mock_pgsql_provider,
+):
+    processor.checkpoints = CheckpointStore(str(tmp_path))
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "block_time": ["2021-01-01 00:00:30.000 UTC"],
+                "buy_token": ["WETH"],
+                "sell_token": ["USDC"],
+                "buy_price": [101.0],
+                "sell_price": [1.0],
+                "block_timestamp": [1609459230],
+            }
+        ),
+        (1609459230, 1609459230),
+    )
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+    processor.process(target_day=date(2021, 1, 1))
+
+    # a retry must not hit the APIs again
+    mock_dune_fetcher.get_query_results_as_dataframe.side_effect = Exception("down")
+    mock_coingecko_client.get_historical_prices.side_effect = Exception("down")
+    processor.process(target_day=date(2021, 1, 1))
+
+    assert mock_dune_fetcher.get_query_results_as_dataframe.call_count == 1
+    assert mock_coingecko_client.get_historical_prices.call_count == 1
+    assert [
+        call.args[1] for call in mock_pgsql_provider.insert_batch_improvement.call_args_list
+    ] == [1.0, 1.0]
+
+
+def test_process_ingests_every_chain(
+    processor, mock_dune_fetcher, mock_coingecko_client, mock_pgsql_provider
+):
+    processor.config = {
+        "chains": [
+            {"name": "ethereum", "query_id": 1},
+            {"name": "gnosis", "query_id": 2},
+            {"name": "arbitrum", "query_id": 3},
+        ],
+        "ingestion": {"max_workers": 2},
+    }
+
+    def fetch_trades(query_id):
+        if query_id == 3:
+            raise Exception("dune down")
+        return (
+            pd.DataFrame(
+                {
+                    "block_time": ["2021-01-01 00:00:30.000 UTC"],
+                    "buy_token": ["WETH"],
+                    "sell_token": ["USDC"],
+                    "buy_price": [101.0],
+                    "sell_price": [1.0],
+                    "block_timestamp": [1609459230],
+                }
+            ),
+            (1609459230, 1609459230),
+        )
+
+    mock_dune_fetcher.get_query_results_as_dataframe.side_effect = fetch_trades
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+
+    with pytest.raises(Exception, match="dune down"):
+        processor.process(target_day=date(2021, 1, 1))
+
+    saved = {
+        call.args[0]["chain"].iloc[0]
+        for call in mock_pgsql_provider.insert_trade_data_batch.call_args_list
+    }
+    assert saved == {"ethereum", "gnosis"}
+    assert sorted(
+        call.kwargs["chain"]
+        for call in mock_pgsql_provider.insert_batch_improvement.call_args_list
+    ) == ["ethereum", "gnosis"]
+
+
 def save_to_database(
     self, matched_df: pd.DataFrame, average_improvement: float
 ) -> None:
@@ -163,3 +478,210 @@ def save_to_database(
         self.logger.info("Data successfully saved to the database.")
     except Exception as e:
         self.logger.exception(f"Error saving data to the database: {e}")
+
+
+def test_validate_trades_quarantines_rejected_rows(processor):
+    processor.quarantine = MagicMock()
+    trades_df = pd.DataFrame(
+        {
+            "block_timestamp": [1609459230, 1609459230],
+            "buy_token": ["WETH", "WETH"],
+            "sell_token": ["USDC", "USDC"],
+            "buy_price": [101.0, None],
+            "sell_price": [1.0, 1.0],
+        }
+    )
+    price_df = pd.DataFrame({"block_timestamp": [1609459200], "price": [100.0]})
+
+    accepted_df = processor.validate_trades(trades_df, price_df, "query=1/day=2021-01-01")
+
+    assert accepted_df.index.tolist() == [0]
+    rejected_df, run_key = processor.quarantine.write.call_args.args
+    assert rejected_df["reject_reason"].tolist() == ["null_price"]
+    assert run_key == "query=1/day=2021-01-01"
+
+    with pytest.raises(NoTradesException):
+        processor.validate_trades(trades_df.iloc[1:], price_df, "query=1/day=2021-01-01")
+
+
+def test_unparseable_block_time_is_quarantined(processor):
+    rows = [
+        {
+            "block_time": block_time,
+            "buy_token": "WETH",
+            "sell_token": "USDC",
+            "buy_price": 101.0,
+            "sell_price": 1.0,
+        }
+        for block_time in ("2021-01-01 00:00:30.000 UTC", "2021-01-01T00:00:31Z")
+    ]
+    processor.quarantine = MagicMock()
+    price_df = pd.DataFrame({"block_timestamp": [1609459200], "price": [100.0]})
+
+    with patch("cow_swap.apis.dune_fetcher.DuneClient") as mock_dune_client:
+        latest_result = mock_dune_client.return_value.get_latest_result.return_value
+        latest_result.result.rows = rows
+        processor.dune_fetcher = DuneDataFetcher(api_key="test_api_key")
+        trades_df, _, _ = processor.fetch_and_process_trades(123)
+
+    accepted_df = processor.validate_trades(
+        trades_df, price_df, "query=123/day=2021-01-01"
+    )
+
+    assert accepted_df["block_timestamp"].tolist() == [1609459230]
+    assert accepted_df["block_timestamp"].dtype == "int64"
+    rejected_df, _ = processor.quarantine.write.call_args.args
+    assert rejected_df["block_time"].tolist() == ["2021-01-01T00:00:31Z"]
+    assert rejected_df["reject_reason"].tolist() == ["timestamp_out_of_bounds"]
+
+
+def test_process_follows_the_memory_plan(
+    processor, mock_dune_fetcher, mock_coingecko_client, mock_pgsql_provider
+):
+    processor.config = {
+        "dune_api": {"query_id": 123},
+        "writer": {"workers": 0},
+        "planner": {"memory_budget_mb": 0.003, "row_bytes": 100, "min_chunk_rows": 1},
+    }
+    mock_pgsql_provider.daily_trade_counts.return_value = {20201231: 4, 20201230: 5}
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "block_time": ["2021-01-01 00:00:30.000 UTC"] * 5,
+                "buy_token": ["WETH"] * 5,
+                "sell_token": ["USDC"] * 5,
+                "buy_price": [101.0, 102.0, 103.0, 104.0, 105.0],
+                "sell_price": [1.0] * 5,
+                "block_timestamp": list(range(1609459230, 1609459235)),
+            }
+        ),
+        (1609459230, 1609459234),
+    )
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+    inserted = []
+    mock_pgsql_provider.insert_trade_data_batch.side_effect = lambda df, **kwargs: (
+        inserted.append(len(df))
+    )
+
+    processor.process(target_day=date(2021, 1, 1))
+
+    # the busiest recent day, with headroom, does not fit the budget in one pass
+    mock_pgsql_provider.daily_trade_counts.assert_called_once_with(
+        "ethereum", "USDC-WETH", 20201225, 20201231
+    )
+    assert inserted == [1] * 5
+    assert "chunked plan for ~7 trades (history)" in str(
+        processor.logger.info.call_args_list
+    )
+    # the average comes from the running sums of the chunks
+    mock_pgsql_provider.insert_batch_improvement.assert_called_once_with(
+        20210101, 3.0, chain="ethereum"
+    )
+
+
+def test_chunked_run_spools_what_the_database_did_not_load(
+    processor, mock_dune_fetcher, mock_coingecko_client, mock_pgsql_provider
+):
+    processor.config = {
+        "dune_api": {"query_id": 123},
+        "planner": {"memory_budget_mb": 0.003, "row_bytes": 100, "min_chunk_rows": 1},
+    }
+    processor.spool = MagicMock()
+    mock_pgsql_provider.daily_trade_counts.return_value = {20201231: 5}
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "block_time": ["2021-01-01 00:00:30.000 UTC"] * 5,
+                "buy_token": ["WETH"] * 5,
+                "sell_token": ["USDC"] * 5,
+                "buy_price": [101.0, 102.0, 103.0, 104.0, 105.0],
+                "sell_price": [1.0] * 5,
+                "block_timestamp": list(range(1609459230, 1609459235)),
+            }
+        ),
+        (1609459230, 1609459234),
+    )
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+    # the first chunk is committed, then the database goes down
+    mock_pgsql_provider.insert_trade_data_batch.side_effect = [None] + [
+        Exception("db down")
+    ] * 4
+
+    processor.process(target_day=date(2021, 1, 1))
+
+    # the batch is spooled once, with the rows the database did not load and its final average
+    processor.spool.spool.assert_called_once()
+    batch_id, trades_df, average_improvement = processor.spool.spool.call_args.args
+    assert (batch_id, len(trades_df), average_improvement) == (20210101, 4, 3.0)
+    mock_pgsql_provider.insert_batch_improvement.assert_not_called()
+
+
+def test_chunked_run_without_spool_raises_the_database_error(
+    processor, mock_dune_fetcher, mock_coingecko_client, mock_pgsql_provider
+):
+    processor.config = {
+        "dune_api": {"query_id": 123},
+        "planner": {"memory_budget_mb": 0.003, "row_bytes": 100, "min_chunk_rows": 1},
+    }
+    mock_pgsql_provider.daily_trade_counts.return_value = {20201231: 5}
+    mock_dune_fetcher.get_query_results_as_dataframe.return_value = (
+        pd.DataFrame(
+            {
+                "block_time": ["2021-01-01 00:00:30.000 UTC"] * 5,
+                "buy_token": ["WETH"] * 5,
+                "sell_token": ["USDC"] * 5,
+                "buy_price": [101.0, 102.0, 103.0, 104.0, 105.0],
+                "sell_price": [1.0] * 5,
+                "block_timestamp": list(range(1609459230, 1609459235)),
+            }
+        ),
+        (1609459230, 1609459234),
+    )
+    mock_coingecko_client.get_historical_prices.return_value = pd.DataFrame(
+        {"block_timestamp": [1609459200], "price": [100.0]}
+    )
+    mock_pgsql_provider.insert_trade_data_batch.side_effect = Exception("db down")
+
+    with pytest.raises(Exception, match="db down"):
+        processor.process(target_day=date(2021, 1, 1))
+
+    mock_pgsql_provider.insert_batch_improvement.assert_not_called()
+
+def test_match_and_process_data_closes_the_backend_of_its_plan(processor):
+    backend = MagicMock(spec=ShardedBackend)
+    backend.match_and_calculate.return_value = None
+    trades_df = pd.DataFrame({"block_timestamp": [1609459200]})
+    price_df = pd.DataFrame({"block_timestamp": [1609459200], "price": [100.0]})
+
+    with patch.object(processor, "_plan_backend", return_value=backend):
+        with pytest.raises(NoMatchedException):
+            processor.match_and_process_data(trades_df, price_df, plan=MagicMock())
+
+    backend.close.assert_called_once()
+
+
+def test_estimate_trade_rows_prefers_the_count_query(
+    processor, mock_dune_fetcher, mock_pgsql_provider
+):
+    processor.config["reconciliation"] = {"digest_queries": {"ethereum": 99}}
+    mock_dune_fetcher.get_trade_digests.return_value = pd.DataFrame(
+        {"trade_count": [120, 80]}
+    )
+    chain = {
+        "name": "ethereum",
+        "currencies": {"currency_1": "weth", "currency_2": "usdc"},
+    }
+
+    assert processor.estimate_trade_rows(chain, date(2021, 1, 1), {"x": 1}) == (
+        200,
+        "count_query",
+    )
+    mock_pgsql_provider.daily_trade_counts.assert_not_called()
+
+    # the latest results of a query cannot be counted without downloading them
+    mock_pgsql_provider.daily_trade_counts.return_value = {}
+    assert processor.estimate_trade_rows(chain, date(2021, 1, 1)) == (None, "none")
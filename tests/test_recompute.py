@@ -0,0 +1,67 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from cow_swap.price_store import PriceTimeSeriesStore
+from cow_swap.recompute import recompute_history
+
+JANUARY = 1672531200  # 2023-01-01 00:00:00 UTC
+
+
+def test_recompute_history_loads_reference_prices_first(tmp_path):
+    store = PriceTimeSeriesStore(str(tmp_path))
+    store.append(
+        "ethereum",
+        np.array([JANUARY + 100, JANUARY + 200]),
+        np.array([1500.0, 1510.0]),
+    )
+    provider = MagicMock()
+    provider.recompute_price_improvements.return_value = 42
+    config = {
+        "chains": [
+            {"name": "ethereum", "query_id": 1},
+            {"name": "gnosis", "query_id": 2},
+        ]
+    }
+
+    assert recompute_history(provider, store, config, 20230101, 20230131) == 42
+
+    # both chains trade the same pair, its history is sent once
+    (token_pair, timestamps, prices), _ = provider.insert_reference_prices.call_args
+    assert provider.insert_reference_prices.call_count == 1
+    assert token_pair == "USDC-WETH"
+    assert timestamps.tolist() == [JANUARY + 100, JANUARY + 200]
+    assert prices.tolist() == [1500.0, 1510.0]
+    provider.recompute_price_improvements.assert_called_once_with(20230101, 20230131)
+
+
+def test_recompute_history_only_sends_the_prices_of_the_range(tmp_path):
+    store = PriceTimeSeriesStore(str(tmp_path))
+    store.append(
+        "ethereum",
+        np.array([JANUARY - 7200, JANUARY - 3600, JANUARY + 60, JANUARY + 86400]),
+        np.array([1490.0, 1495.0, 1500.0, 1510.0]),
+    )
+    provider = MagicMock()
+
+    recompute_history(
+        provider, store, {"dune_api": {"query_id": 1}}, 20230101, 20230101
+    )
+
+    # the last price before the range prices its first trades
+    _, timestamps, prices = provider.insert_reference_prices.call_args.args
+    assert timestamps.tolist() == [JANUARY - 3600, JANUARY + 60]
+    assert prices.tolist() == [1495.0, 1500.0]
+
+
+def test_recompute_history_rejects_windowed_reference_prices(tmp_path):
+    provider = MagicMock()
+    config = {"reference_price": {"method": "twap"}}
+
+    with pytest.raises(ValueError, match="twap"):
+        recompute_history(
+            provider, PriceTimeSeriesStore(str(tmp_path)), config, 20230101, 20230131
+        )
+
+    provider.recompute_price_improvements.assert_not_called()
@@ -0,0 +1,190 @@
+from contextlib import nullcontext
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from cow_swap.digests import (
+    digest_frame,
+    digest_trades,
+    hour_ranges,
+    mismatched_hours,
+    subtract_digests,
+    trade_key_hash,
+)
+from cow_swap.processor import NoTradesException
+from cow_swap.reconciliation import Reconciler
+
+DAY_START = 1672531200  # 2023-01-01 00:00:00 UTC
+
+CHAIN = {
+    "name": "ethereum",
+    "query_id": 1,
+    "currencies": {"currency_1": "weth", "currency_2": "usdc"},
+}
+
+CONFIG = {
+    "dune_api": {"parameterized": True},
+    "chains": [{"name": "ethereum", "query_id": 1}],
+}
+
+
+def _trades(keys):
+    return pd.DataFrame(
+        {
+            "block_timestamp": [timestamp for timestamp, _, _ in keys],
+            "tx_hash": [tx_hash for _, tx_hash, _ in keys],
+            "evt_index": [evt_index for _, _, evt_index in keys],
+        }
+    )
+
+
+def test_trade_key_hash():
+    # md5('0xab:1') starts with 823ceee0e970e74
+    assert trade_key_hash("0xAB", 1) == int("823ceee0e970e74", 16)
+    assert trade_key_hash("0xab", 1) < 2**60
+
+
+def test_digests_are_additive():
+    trades_df = _trades(
+        [
+            (DAY_START + 10, "0xaa", 0),
+            (DAY_START + 20, "0xbb", 1),
+            (DAY_START + 3600, "0xcc", 0),
+        ]
+    )
+
+    digests = digest_trades(trades_df)
+
+    assert digests.index.tolist() == [DAY_START, DAY_START + 3600]
+    assert digests["trade_count"].tolist() == [2, 1]
+    assert digests["key_hash"].iloc[0] == trade_key_hash("0xaa", 0) + trade_key_hash(
+        "0xbb", 1
+    )
+    # the order of the trades does not matter
+    assert mismatched_hours(digests, digest_trades(trades_df.iloc[::-1])) == []
+
+    remaining = subtract_digests(digests, digest_trades(trades_df.iloc[2:]))
+    assert mismatched_hours(remaining, digest_trades(trades_df.iloc[:2])) == []
+
+
+def test_mismatched_hours_and_ranges():
+    expected = digest_frame(
+        [(DAY_START, 2, 10), (DAY_START + 3600, 1, 5), (DAY_START + 7200, 1, 7)]
+    )
+    # a trade swapped for another in the first hour, the second hour missing and an extra hour
+    stored = digest_frame(
+        [(DAY_START, 2, 11), (DAY_START + 7200, 1, 7), (DAY_START + 5 * 3600, 1, 3)]
+    )
+
+    hours = mismatched_hours(expected, stored)
+
+    assert hours == [DAY_START, DAY_START + 3600, DAY_START + 5 * 3600]
+    assert hour_ranges(hours) == [
+        (DAY_START, DAY_START + 7200),
+        (DAY_START + 5 * 3600, DAY_START + 6 * 3600),
+    ]
+
+
+def _processor(stored_digests):
+    processor = MagicMock(config=CONFIG, quarantine=None)
+    provider = processor.pgsql_provider
+    provider.trade_digests.side_effect = stored_digests
+    provider.batch_lock.return_value = nullcontext(True)
+    return processor
+
+
+def test_reconcile_day_refills_only_mismatched_hours():
+    source = digest_frame([(DAY_START, 1, 10), (DAY_START + 3600, 2, 20)])
+    processor = _processor(
+        [digest_frame([(DAY_START, 1, 10), (DAY_START + 3600, 1, 8)]), source]
+    )
+    processor.dune_fetcher.get_trade_digests.return_value = source
+    processor.fetch_and_process_trades.return_value = (
+        "trades",
+        DAY_START + 3600,
+        DAY_START + 7199,
+    )
+    processor.match_and_process_data.return_value = pd.DataFrame(
+        {"block_timestamp": [DAY_START + 3600, DAY_START + 3700]}
+    )
+    reconciler = Reconciler(processor, digest_queries={"ethereum": 99})
+
+    report = reconciler.reconcile_day(CHAIN, date(2023, 1, 1))
+
+    assert report.mismatched_hours == [DAY_START + 3600]
+    assert report.refilled_ranges == [(DAY_START + 3600, DAY_START + 7200)]
+    assert report.remaining_hours == []
+    digest_query, parameters = processor.dune_fetcher.get_trade_digests.call_args.args
+    assert digest_query == 99
+    assert parameters["start_time"] == datetime(2023, 1, 1, tzinfo=timezone.utc)
+    # only the mismatched hour is refetched
+    _, _, parameters = processor.fetch_and_process_trades.call_args.args
+    assert parameters["start_time"] == datetime(2023, 1, 1, 1, tzinfo=timezone.utc)
+    assert processor.fetch_and_process_trades.call_args.kwargs == {
+        "currencies": CHAIN["currencies"]
+    }
+    assert parameters["end_time"] == datetime(2023, 1, 1, 2, tzinfo=timezone.utc)
+    assert (
+        processor.validate_trades.call_args.args[2]
+        == f"query=1/day=2023-01-01/refill={DAY_START + 3600}"
+    )
+    replaced_df, *arguments = processor.pgsql_provider.replace_trades.call_args.args
+    assert replaced_df["batch_id"].tolist() == [20230101, 20230101]
+    assert arguments == ["ethereum", "USDC-WETH", DAY_START + 3600, DAY_START + 7200]
+    processor.pgsql_provider.refresh_batch_improvements.assert_called_once_with(
+        20230101, 20230101
+    )
+    # the partition of the day exists before any trade is reloaded
+    calls = [name for name, _, _ in processor.pgsql_provider.mock_calls]
+    assert calls.index("create_upcoming_partitions") < calls.index("replace_trades")
+    processor.pgsql_provider.rebuild_rollups.assert_called_once_with(
+        DAY_START, DAY_START + 86400
+    )
+
+
+def test_reconcile_day_subtracts_quarantined_trades():
+    kept = (DAY_START + 10, "0xaa", 0)
+    rejected = (DAY_START + 20, "0xbb", 1)
+    processor = _processor([digest_trades(_trades([kept]))])
+    processor.fetch_and_process_trades.return_value = (
+        _trades([kept, rejected]),
+        DAY_START,
+        DAY_START + 20,
+    )
+    processor.quarantine = MagicMock()
+    processor.quarantine.read.return_value = _trades([rejected, rejected])
+    reconciler = Reconciler(processor)
+
+    report = reconciler.reconcile_day(CHAIN, date(2023, 1, 1))
+
+    assert report.mismatched_hours == []
+    processor.quarantine.read.assert_called_once_with(
+        "query=1/day=2023-01-01", columns=["block_timestamp", "tx_hash", "evt_index"]
+    )
+    processor.pgsql_provider.replace_trades.assert_not_called()
+
+
+def test_refill_of_a_range_without_trades_empties_it():
+    processor = _processor([digest_frame([(DAY_START, 1, 10)]), digest_frame([])])
+    processor.fetch_and_process_trades.side_effect = [
+        (None, None, None),
+        NoTradesException("No trades data fetched."),
+        (None, None, None),
+    ]
+    reconciler = Reconciler(processor)
+
+    report = reconciler.reconcile_day(CHAIN, date(2023, 1, 1))
+
+    assert report.refilled_ranges == [(DAY_START, DAY_START + 3600)]
+    assert report.remaining_hours == []
+    replaced_df = processor.pgsql_provider.replace_trades.call_args.args[0]
+    assert replaced_df.empty
+
+
+def test_reconcile_requires_parameterized_queries():
+    processor = MagicMock(config={})
+
+    with pytest.raises(ValueError):
+        Reconciler(processor).reconcile(date(2023, 1, 1), date(2023, 1, 2))
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cow_swap.reference_prices import (
+    ReferencePriceEngine,
+    time_weighted_prices,
+    trade_volumes,
+)
+
+TIMESTAMPS = np.array([100, 200, 300, 400])
+PRICES = np.array([10.0, 20.0, 30.0, 40.0])
+
+
+def _naive_twap(query, before, after):
+    # one second steps of the price holding at each second of the window
+    seconds = np.arange(max(query - before, TIMESTAMPS[0]), query + after)
+    indices = np.searchsorted(TIMESTAMPS, seconds, side="right") - 1
+    return PRICES[indices].mean() if len(seconds) else np.nan
+
+
+def test_time_weighted_prices_match_a_naive_average():
+    query = np.array([50, 100, 150, 250, 399, 450, 1000])
+    for before, after in ((0, 50), (50, 50), (150, 0), (30, 500)):
+        expected = [_naive_twap(t, before, after) for t in query]
+        np.testing.assert_allclose(
+            time_weighted_prices(TIMESTAMPS, PRICES, query, before, after), expected
+        )
+
+
+def test_time_weighted_prices_empty_window_is_the_as_of_price():
+    result = time_weighted_prices(TIMESTAMPS, PRICES, np.array([99, 100, 250]), 0, 0)
+    np.testing.assert_array_equal(result, [np.nan, 10.0, 20.0])
+
+
+def _trades(timestamps, weth_prices, units, sells_weth):
+    return pd.DataFrame(
+        {
+            "block_timestamp": timestamps,
+            "sell_token": ["WETH" if s else "USDC" for s in sells_weth],
+            "buy_token": ["USDC" if s else "WETH" for s in sells_weth],
+            "sell_price": [p if s else 1.0 for p, s in zip(weth_prices, sells_weth)],
+            "buy_price": [1.0 if s else p for p, s in zip(weth_prices, sells_weth)],
+            "units_sold": units,
+        }
+    )
+
+
+def test_trade_volumes_are_in_weth():
+    trades = _trades(
+        [1, 2, 3], [2000.0, 2000.0, 2000.0], [2.0, 4000.0, -1.0], [True, False, True]
+    )
+    np.testing.assert_allclose(trade_volumes(trades), [2.0, 2.0, 0.0])
+
+
+def test_vwap_excludes_the_priced_trade():
+    trades = _trades(
+        [100, 110, 120, 1000],
+        [2000.0, 2100.0, 2400.0, 3000.0],
+        [1.0, 2.0 * 2100.0, 1.0, 1.0],
+        [True, False, True, True],
+    )
+    price_df = pd.DataFrame({"block_timestamp": [0], "price": [1500.0]})
+    engine = ReferencePriceEngine(
+        price_df, method="vwap", window_before=60, window_after=60, trades_df=trades
+    )
+
+    np.testing.assert_allclose(
+        engine.reference_prices(trades),
+        [
+            (2 * 2100.0 + 2400.0) / 3,
+            (2000.0 + 2400.0) / 2,
+            (2000.0 + 2 * 2100.0) / 3,
+            # alone in its window, falls back to the time-weighted average
+            1500.0,
+        ],
+    )
+    reversed_trades = trades.iloc[::-1]
+    np.testing.assert_allclose(
+        engine.reference_prices(reversed_trades),
+        engine.reference_prices(trades)[::-1],
+    )
+    # a chunk is priced against every trade of the run
+    np.testing.assert_allclose(
+        engine.reference_prices(trades.iloc[[2]]), [(2000.0 + 2 * 2100.0) / 3]
+    )
+
+
+def test_apply_recomputes_the_improvement():
+    trades = _trades([100, 300], [2000.0, 2000.0], [1.0, 1.0], [False, False])
+    matched = trades.assign(price=[10.0, 20.0])
+    engine = ReferencePriceEngine(
+        pd.DataFrame({"block_timestamp": TIMESTAMPS, "price": PRICES * 100}),
+        window_before=50,
+        window_after=50,
+    )
+
+    result = engine.apply(matched)
+
+    np.testing.assert_allclose(result["price"], [1000.0, 2500.0])
+    np.testing.assert_allclose(result["price_improvement"], [1000.0, -500.0])
+
+
+def test_from_config():
+    price_df = pd.DataFrame({"block_timestamp": TIMESTAMPS, "price": PRICES})
+    assert ReferencePriceEngine.from_config({}, price_df, None) is None
+    engine = ReferencePriceEngine.from_config(
+        {"method": "twap", "window_before": 10, "window_after": 0}, price_df, None
+    )
+    assert (engine.method, engine.window_before, engine.window_after) == ("twap", 10, 0)
+    with pytest.raises(ValueError):
+        ReferencePriceEngine.from_config({"method": "median"}, price_df, None)
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from cow_swap.price_calculation import match_prices_with_trades
+from cow_swap.schema import (
+    PRICE_SCHEMA,
+    TRADE_SCHEMA,
+    apply_schema,
+    log_memory_report,
+    memory_report,
+)
+
+
+def _trades(n):
+    return pd.DataFrame(
+        {
+            "block_number": [100 + i for i in range(n)],
+            "buy_token": ["WETH", "USDC"] * (n // 2),
+            "sell_token": ["USDC", "WETH"] * (n // 2),
+            "token_pair": ["USDC-WETH"] * n,
+            "buy_price": [100.0] * n,
+            "block_timestamp": [1672444800.0 + i for i in range(n)],
+        }
+    )
+
+
+def test_apply_schema():
+    df = apply_schema(_trades(4), TRADE_SCHEMA)
+
+    assert isinstance(df["token_pair"].dtype, pd.CategoricalDtype)
+    assert df["block_timestamp"].dtype == "int64"
+    assert df["block_number"].dtype == "int64"
+    assert df["buy_price"].dtype == "float64"
+
+
+def test_apply_schema_is_noop_when_already_typed():
+    df = apply_schema(_trades(2), TRADE_SCHEMA)
+    assert apply_schema(df, TRADE_SCHEMA) is df
+
+
+def test_schema_survives_merge_asof():
+    trades_df = apply_schema(_trades(4), TRADE_SCHEMA)
+    price_df = apply_schema(
+        pd.DataFrame({"block_timestamp": [1672444800], "price": [100.0]}), PRICE_SCHEMA
+    )
+
+    merged_df = match_prices_with_trades(trades_df, price_df)
+
+    assert isinstance(merged_df["buy_token"].dtype, pd.CategoricalDtype)
+    assert merged_df["block_timestamp"].dtype == "int64"
+    assert merged_df["price"].dtype == "float64"
+
+
+def test_memory_report_shows_savings():
+    df = apply_schema(_trades(1000), TRADE_SCHEMA)
+
+    report = memory_report(df)
+
+    assert report["bytes"] < report["object_layout_bytes"]
+    untyped = df.astype(
+        {"buy_token": object, "sell_token": object, "token_pair": object}
+    )
+    assert report["object_layout_bytes"] == memory_report(untyped)["bytes"]
+
+
+def test_log_memory_report():
+    logger = MagicMock()
+    log_memory_report(logger, "trades", apply_schema(_trades(2), TRADE_SCHEMA))
+    assert "Stage 'trades': 2 rows" in logger.info.call_args.args[0]
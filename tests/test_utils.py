@@ -3,8 +3,10 @@ import pandas as pd
 from datetime import datetime, timezone
 from cow_swap.utils import (
     convert_to_unix_timestamp,
+    convert_to_unix_timestamps,
     remove_nan_price_improvement,
     generate_batch_id,
+    generate_batch_ids,
 )
 
 
@@ -22,6 +24,18 @@ def test_convert_to_unix_timestamp():
     assert convert_to_unix_timestamp(wrong_format_str) is None
 
 
+def test_convert_to_unix_timestamps():
+    date_strs = pd.Series(
+        ["2023-08-21 12:34:56.789 UTC", "invalid date", "2023-08-22 00:00:00.000 UTC"]
+    )
+
+    timestamps = convert_to_unix_timestamps(date_strs)
+
+    assert timestamps[0] == convert_to_unix_timestamp(date_strs[0])
+    assert pd.isna(timestamps[1])
+    assert timestamps[2] == convert_to_unix_timestamp(date_strs[2])
+
+
 def test_remove_nan_price_improvement():
     data = {
         "price_improvement": [1.5, None, 2.5, None],
@@ -55,3 +69,13 @@ def test_generate_batch_id():
     incomplete_trade_data_list = [{"some_other_key": "2023-08-21 12:34:56.789 UTC"}]
     with pytest.raises(ValueError):
         generate_batch_id(incomplete_trade_data_list)
+
+
+def test_generate_batch_ids():
+    block_timestamps = pd.Series([1692662399, 1692576000, 1692662400], index=[5, 6, 7])
+
+    batch_ids = generate_batch_ids(block_timestamps)
+
+    assert batch_ids.tolist() == [20230821, 20230821, 20230822]
+    assert batch_ids.index.tolist() == [5, 6, 7]
+    assert generate_batch_ids(pd.Series([], dtype="int64")).empty
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from cow_swap.validation import VALIDATION_RULES, validate_trades
+
+
+def _trades(**overrides):
+    row = {
+        "block_timestamp": 1609459230,
+        "buy_token": "WETH",
+        "sell_token": "USDC",
+        "buy_price": 101.0,
+        "sell_price": 1.0,
+    }
+    return {**row, **overrides}
+
+
+def test_validate_trades_tags_first_violated_rule():
+    trades_df = pd.DataFrame(
+        [
+            _trades(),
+            _trades(buy_price=np.nan),
+            _trades(sell_price=-1.0),
+            _trades(block_timestamp=4102444800),
+            _trades(block_timestamp=1609459100),
+            _trades(block_timestamp=1609470000),
+            _trades(buy_token="DAI", sell_token="USDT"),
+            _trades(buy_price=1000.0),
+        ]
+    )
+    price_df = pd.DataFrame({"block_timestamp": [1609459200], "price": [100.0]})
+
+    report = validate_trades(trades_df, price_df, max_staleness_seconds=3600)
+
+    assert report.accepted.index.tolist() == [0]
+    assert report.rejected["reject_reason"].tolist() == list(VALIDATION_RULES)
+    assert report.counts == {
+        "null_price": 1,
+        "non_positive_price": 1,
+        "timestamp_out_of_bounds": 1,
+        "missing_reference_price": 1,
+        # the far-future trade is also matched with a stale price
+        "stale_reference_price": 2,
+        "unsupported_pair": 1,
+        # rows without a trade price or a reference price have no ratio to check
+        "implausible_price_ratio": 1,
+    }
+
+
+def test_validate_trades_without_prices():
+    report = validate_trades(
+        pd.DataFrame([_trades()]),
+        pd.DataFrame({"block_timestamp": [], "price": []}),
+    )
+
+    assert report.accepted.empty
+    assert report.rejected["reject_reason"].tolist() == ["missing_reference_price"]
@@ -0,0 +1,73 @@
+import time
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from cow_swap.database.db_provider import WorkUnit
+from cow_swap.processor import BatchLockedException
+from cow_swap.work_queue import WorkQueueWorker, enqueue_backfill
+
+CONFIG = {
+    "dune_api": {"parameterized": True},
+    "chains": [
+        {"name": "ethereum", "query_id": 1},
+        {"name": "gnosis", "query_id": 2},
+    ],
+}
+
+
+def _unit(day, chain="ethereum"):
+    return WorkUnit(chain, "USDC-WETH", day, 1)
+
+
+def test_enqueue_backfill_queues_every_chain_and_day():
+    provider = MagicMock()
+    provider.enqueue_work.side_effect = lambda units: len(list(units))
+
+    assert enqueue_backfill(provider, CONFIG, date(2023, 1, 1), date(2023, 1, 3)) == 6
+
+    with pytest.raises(ValueError):
+        enqueue_backfill(provider, {}, date(2023, 1, 1), date(2023, 1, 3))
+
+
+def test_worker_drains_the_queue():
+    units = [
+        _unit(date(2023, 1, 1)),
+        _unit(date(2023, 1, 2)),
+        _unit(date(2023, 1, 3), chain="gnosis"),
+    ]
+    provider = MagicMock()
+    provider.claim_work.side_effect = units + [None]
+    processor = MagicMock(config=CONFIG)
+    processor.process_chain.side_effect = [
+        None,
+        Exception("dune timeout"),
+        BatchLockedException("locked"),
+    ]
+    worker = WorkQueueWorker(processor, provider, worker_id="worker-1")
+
+    assert worker.run() == 1
+
+    provider.claim_work.assert_called_with("worker-1", 900, 3)
+    chain, day = processor.process_chain.call_args_list[2].args
+    assert (chain["name"], day) == ("gnosis", date(2023, 1, 3))
+    provider.complete_work.assert_called_once_with(units[0], "worker-1")
+    provider.fail_work.assert_called_once_with(
+        units[1], "worker-1", "dune timeout", 3, 300
+    )
+    # a locked batch is handed back without counting the attempt
+    provider.release_work.assert_called_once_with(units[2], "worker-1", 300)
+
+
+def test_worker_heartbeats_long_units():
+    provider = MagicMock()
+    provider.claim_work.side_effect = [_unit(date(2023, 1, 1)), None]
+    processor = MagicMock(config=CONFIG)
+    worker = WorkQueueWorker(
+        processor, provider, worker_id="worker-1", heartbeat_seconds=0.01
+    )
+    processor.process_chain.side_effect = lambda chain, day: time.sleep(0.1)
+
+    assert worker.run(max_units=1) == 1
+    assert provider.heartbeat_work.call_count >= 2